@@ -0,0 +1,352 @@
+"""
+End-to-end load and latency benchmark for /chat and /chat/stream.
+
+Serves the FastAPI app with uvicorn on a local port, backed by the stub
+provider (OpenAI or Gemini API shape, both with --fallback) with a
+configurable latency, slow tail and error rate, and replays the Uzbek question mix at a configurable concurrency once per
+assistant version. The mix is skewed like real traffic (a few questions
+dominate) and --unique makes a share of the questions novel so some requests
+always reach the LLM. Caches and latency histograms are reset between runs.
+
+Per run it reports p50/p95/p99 latency (for version 2 also until all audio is
+downloaded, as a browser would), requests/s, exact/semantic/audio cache hit
+rates, upstream calls, hedged requests and fallbacks, process CPU and RSS,
+and the per-stage p95 from /api/cache/stats. App, stubs and client share one process, so CPU covers all
+of them. Without torch, or with --fake-tts, a stand-in synthesizer sleeps
+--tts-latency per batch, which still exercises batching, caching and
+encoding.
+
+--components adds quick in-process microbenchmarks of retrieval,
+transliteration and audio encoding; embedding_benchmark,
+transliteration_benchmark and tts_benchmark are the detailed suites.
+--json writes the results for comparing two revisions.
+
+Usage (from backend/):
+    python -m benchmarks.e2e_benchmark --requests 200 --concurrency 20 --versions 1 2
+    python -m benchmarks.e2e_benchmark --provider gemini --stream --llm-latency 0.8
+    python -m benchmarks.e2e_benchmark --fallback --llm-tail-rate 0.05 --llm-tail-latency 5
+"""
+import argparse
+import asyncio
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import random
+import resource
+import time
+
+import httpx
+import numpy as np
+
+from benchmarks.questions import QUESTIONS
+from benchmarks.stub_llm import ANSWER, StubServer, create_app
+
+
+def _percentile(values: list, q: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))]
+
+
+def _rss_mb() -> float:
+    """Current resident set size (Linux), else the peak"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _question_mix(count: int, unique: float, seed: int) -> list:
+    """Zipf-skewed sample of QUESTIONS; a `unique` share gets a suffix that defeats every cache"""
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(len(QUESTIONS))]
+    mix = rng.choices(QUESTIONS, weights=weights, k=count)
+    return [f"{q} ({i})" if rng.random() < unique else q for i, q in enumerate(mix)]
+
+
+def _fake_infer(delay: float):
+    """Stand-in for the VITS forward pass: blocks the TTS thread, returns a tone per character"""
+    def infer(texts):
+        time.sleep(delay)
+        return [np.sin(2 * np.pi * 220 * np.arange(len(text) * 960) / 16000).astype(np.float32)
+                for text in texts]  # ~60 ms of audio per character
+    return infer
+
+
+def _use_fake_tts(tts_service, delay: float):
+    """Replace only model loading and inference; batching, PCM caching and encoding stay real"""
+    tts_service._load_model = lambda: None
+    tts_service.model = tts_service.tokenizer = object()
+    tts_service.model_status = "ready"
+    tts_service._infer = _fake_infer(delay)
+
+
+async def _fetch_audio(client: httpx.AsyncClient, urls: list):
+    for url in urls:
+        (await client.get(url)).raise_for_status()
+
+
+async def _chat(client: httpx.AsyncClient, question: str, version: int) -> dict:
+    started = time.perf_counter()
+    response = await client.post("/chat", json={"message": question, "version": version})
+    response.raise_for_status()
+    timing = {"response": time.perf_counter() - started, "degradation": response.json().get("degradation")}
+    url = response.json().get("audio_url")
+    if url:
+        await _fetch_audio(client, [url])
+        timing["audio"] = time.perf_counter() - started
+    return timing
+
+
+async def _chat_stream(client: httpx.AsyncClient, question: str, version: int) -> dict:
+    started = time.perf_counter()
+    timing, urls = {}, []
+    async with client.stream("POST", "/chat/stream", json={"message": question, "version": version}) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if not line.startswith("data: "):
+                continue
+            event = json.loads(line[6:])
+            if event["type"] == "text":
+                timing.setdefault("first_text", time.perf_counter() - started)
+            elif event["type"] == "audio" and event.get("audio_url"):
+                urls.append(event["audio_url"])
+            elif event["type"] == "done":
+                timing["degradation"] = event.get("degradation")
+    timing["response"] = time.perf_counter() - started
+    if urls:
+        await _fetch_audio(client, urls)
+        timing["audio"] = time.perf_counter() - started
+    return timing
+
+
+def _reset_state():
+    from main import cache_service, semantic_cache, tts_service
+    from services.metrics import metrics
+
+    cache_service.clear()
+    semantic_cache.clear()
+    tts_service.audio_cache.clear()
+    metrics.stages.clear()
+    metrics.requests.clear()
+
+
+def _snapshot(stub: StubServer) -> dict:
+    from main import cache_service, llm_service, semantic_cache, tts_service
+
+    audio = tts_service.audio_cache.stats
+    return {
+        "routing": dict(llm_service.router.stats),
+        "exact": (cache_service.stats["hits"], cache_service.stats["misses"]),
+        "semantic": (semantic_cache.stats["hits"], semantic_cache.stats["misses"]),
+        "audio": (audio["hits"] + audio["disk_hits"], audio["misses"]),
+        "calls": dict(stub.app.state.calls),
+    }
+
+
+def _hit_rate(before: tuple, after: tuple) -> str:
+    hits, misses = after[0] - before[0], after[1] - before[1]
+    return f"{hits / (hits + misses) * 100:.0f}%" if hits + misses else "-"
+
+
+async def _run(base_url: str, stub: StubServer, questions: list, version: int, args) -> dict:
+    _reset_state()
+    request = _chat_stream if args.stream else _chat
+    semaphore = asyncio.Semaphore(args.concurrency)
+    timings, errors, refused = [], 0, 0
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120,
+                                 limits=httpx.Limits(max_connections=args.concurrency)) as client:
+        async def one(question: str):
+            nonlocal errors, refused
+            async with semaphore:
+                try:
+                    timings.append(await request(client, question, version))
+                except httpx.HTTPStatusError as e:
+                    if e.response.status_code in (429, 503):
+                        refused += 1  # admission control, not a failure
+                    else:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+
+        before, cpu, rss = _snapshot(stub), _cpu_seconds(), _rss_mb()
+        started = time.perf_counter()
+        await asyncio.gather(*(one(q) for q in questions))
+        wall = time.perf_counter() - started
+        after = _snapshot(stub)
+        stages = (await client.get("/api/cache/stats")).json()["latency"]["stages"]
+
+    result = {
+        "endpoint": "/chat/stream" if args.stream else "/chat",
+        "version": version,
+        "requests": len(questions),
+        "errors": errors,
+        "wall_seconds": round(wall, 3),
+        "requests_per_second": round(len(questions) / wall, 1),
+        "cache_hit_rate": {name: _hit_rate(before[name], after[name]) for name in ("exact", "semantic", "audio")},
+        "upstream_calls": {name: after["calls"][name] - before["calls"][name] for name in after["calls"]},
+        "llm_routing": {name: after["routing"][name] - before["routing"][name]
+                        for name in ("hedged", "hedge_wins", "fallbacks", "failures")},
+        "admission": {
+            "refused": refused,
+            **{level: sum(t.get("degradation") == level for t in timings) for level in ("text_only", "shedding")},
+        },
+        "cpu_percent": round((_cpu_seconds() - cpu) / wall * 100, 1),
+        "rss_mb": round(_rss_mb(), 1),
+        "rss_growth_mb": round(_rss_mb() - rss, 1),
+        "stage_p95_ms": {stage: summary["p95_ms"] for stage, summary in sorted(stages.items())},
+    }
+    for metric in ("first_text", "response", "audio"):
+        values = [t[metric] for t in timings if metric in t]
+        if values:
+            result[f"{metric}_ms"] = {f"p{int(q * 100)}": round(_percentile(values, q) * 1000, 1)
+                                      for q in (0.5, 0.95, 0.99)}
+    return result
+
+
+def _print_run(result: dict):
+    print(f"\n{result['endpoint']} version {result['version']}: {result['requests']} requests, "
+          f"{result['errors']} errors, {result['wall_seconds']} s")
+    for metric in ("first_text", "response", "audio"):
+        if f"{metric}_ms" in result:
+            p = result[f"{metric}_ms"]
+            print(f"  {metric + ' latency':<22}: p50 {p['p50']} ms  p95 {p['p95']} ms  p99 {p['p99']} ms")
+    print(f"  {'throughput':<22}: {result['requests_per_second']} req/s")
+    print(f"  {'cache hit rate':<22}: " + "  ".join(f"{k} {v}" for k, v in result["cache_hit_rate"].items()))
+    print(f"  {'upstream calls':<22}: " + "  ".join(f"{k} {v}" for k, v in result["upstream_calls"].items()))
+    print(f"  {'llm routing':<22}: " + "  ".join(f"{k} {v}" for k, v in result["llm_routing"].items()))
+    print(f"  {'admission':<22}: " + "  ".join(f"{k} {v}" for k, v in result["admission"].items()))
+    print(f"  {'process':<22}: CPU {result['cpu_percent']}%  RSS {result['rss_mb']} MB "
+          f"(+{result['rss_growth_mb']} MB)")
+    print(f"  {'stage p95 (ms)':<22}: " + "  ".join(f"{k} {v}" for k, v in result["stage_p95_ms"].items()))
+
+
+def _time_us(fn, repeats: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - started) / repeats * 1e6
+
+
+async def _components(repeats: int) -> dict:
+    """Per-call cost of the CPU-bound pieces of the request path, in microseconds"""
+    from services.audio_codec import encode_audio
+    from services.fact_store import fact_store
+    from services.rag_service import rag_service
+    from services.text_utils import split_sentences
+    from services.transliteration import transliterate_to_cyrillic, transliterate_to_latin
+
+    embeddings = [await rag_service.embed_query(q) for q in QUESTIONS]
+    cyrillic = transliterate_to_cyrillic(ANSWER)
+    pcm = (_fake_infer(0)([ANSWER])[0] * 32767).astype(np.int16).tobytes()
+    return {
+        "retrieval_hybrid_us": _time_us(lambda: [rag_service.search(q, e) for q, e in zip(QUESTIONS, embeddings)],
+                                        repeats) / len(QUESTIONS),
+        "retrieval_lexical_us": _time_us(lambda: [rag_service.search(q) for q in QUESTIONS], repeats) / len(QUESTIONS),
+        "fact_match_us": _time_us(lambda: [fact_store.match(q) for q in QUESTIONS], repeats) / len(QUESTIONS),
+        "to_cyrillic_answer_us": _time_us(lambda: transliterate_to_cyrillic(ANSWER), repeats),
+        "to_latin_answer_us": _time_us(lambda: transliterate_to_latin(cyrillic), repeats),
+        "split_sentences_us": _time_us(lambda: split_sentences(ANSWER), repeats),
+        "encode_wav_us": _time_us(lambda: encode_audio(pcm, 16000, "wav"), repeats),
+        "encode_ulaw_us": _time_us(lambda: encode_audio(pcm, 16000, "ulaw"), repeats),
+    }
+
+
+async def main(args):
+    stub_app = create_app(latency=args.llm_latency, token_delay=args.token_delay, tail_latency=args.llm_tail_latency,
+                          tail_rate=args.llm_tail_rate, error_rate=args.llm_error_rate, seed=args.seed)
+    with StubServer(stub_app) as stub:
+        other = "gemini" if args.provider == "openai" else "openai"
+        os.environ.update({
+            # One stub serves both API shapes
+            "LLM_PROVIDER": args.provider,
+            "LLM_FALLBACK_PROVIDERS": other if args.fallback else "",
+            "LLM_API_KEY": "stub",
+            "LLM_BASE_URL": f"{stub.url}/v1",  # OpenAI embeddings
+            "OPENAI_API_KEY": "stub",
+            "OPENAI_BASE_URL": f"{stub.url}/v1",
+            "GEMINI_API_KEY": "stub",
+            "GEMINI_BASE_URL": stub.url,
+            "LLM_HEDGE": "false" if args.no_hedge else "true",
+            "RATE_LIMIT_PER_MINUTE": str(args.rate_limit),  # every simulated user shares one address
+            "EMBEDDING_STORE_DIR": "",  # measure the request path, not the disk store
+            "WARMUP_ON_STARTUP": "false",
+            "TTS_PRELOAD": "false",
+        })
+        from main import app, llm_service, tts_service  # imported after env so services pick up the stub
+
+        if not llm_service.router.available:
+            raise SystemExit(f"{args.provider} client is not installed; the stub would never be called")
+
+        if args.fake_tts:
+            _use_fake_tts(tts_service, args.tts_latency)
+
+        quiet = contextlib.redirect_stdout(io.StringIO()) if not args.verbose else contextlib.nullcontext()
+        results = {"config": vars(args), "runs": []}
+        with StubServer(app) as server, quiet:
+            async with httpx.AsyncClient(base_url=server.url, timeout=120) as client:
+                await client.post("/chat", json={"message": "warmup", "version": 1})  # knowledge base embeddings
+            questions = _question_mix(args.requests, args.unique, args.seed)
+            for version in args.versions:
+                results["runs"].append(await _run(server.url, stub, questions, version, args))
+            if args.components:
+                results["components"] = await _components(args.component_repeats)
+
+    print(f"provider {args.provider}{' + ' + other if args.fallback else ''} "
+          f"(stub latency {args.llm_latency * 1000:.0f} ms, {args.llm_tail_rate * 100:.0f}% at "
+          f"{args.llm_tail_latency * 1000:.0f} ms, {args.llm_error_rate * 100:.0f}% errors), "
+          f"hedging {'off' if args.no_hedge else 'on'}, "
+          f"concurrency {args.concurrency}, {args.unique * 100:.0f}% novel questions"
+          + (", fake TTS" if args.fake_tts else ""))
+    for result in results["runs"]:
+        _print_run(result)
+    if "components" in results:
+        print("\ncomponents (per call)")
+        for name, value in results["components"].items():
+            print(f"  {name:<22}: {value:.1f} us")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--provider", choices=["openai", "gemini"], default="openai")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--versions", type=int, nargs="+", default=[1, 2], choices=[1, 2])
+    parser.add_argument("--stream", action="store_true", help="use /chat/stream instead of /chat")
+    parser.add_argument("--unique", type=float, default=0.2, help="share of questions never seen before")
+    parser.add_argument("--fallback", action="store_true", help="configure the other provider as a fallback")
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--llm-tail-latency", type=float, default=0.0, help="latency of the slow share of calls")
+    parser.add_argument("--llm-tail-rate", type=float, default=0.0, help="share of LLM calls that are slow")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="share of LLM calls that fail with 503")
+    parser.add_argument("--no-hedge", action="store_true", help="disable hedged LLM requests")
+    parser.add_argument("--rate-limit", type=float, default=0, help="per-client requests per minute (0 = off)")
+    parser.add_argument("--token-delay", type=float, default=0.01)
+    parser.add_argument("--fake-tts", action="store_true", help="stand-in synthesizer instead of VITS")
+    parser.add_argument("--tts-latency", type=float, default=0.15, help="seconds per fake TTS batch")
+    parser.add_argument("--components", action="store_true", help="also run component microbenchmarks")
+    parser.add_argument("--component-repeats", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--verbose", action="store_true", help="keep the app's log output")
+    args = parser.parse_args()
+    if importlib.util.find_spec("torch") is None:
+        args.fake_tts = True
+    asyncio.run(main(args))
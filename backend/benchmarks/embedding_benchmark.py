@@ -0,0 +1,76 @@
+"""
+Retrieval latency and top-k agreement: local hashing embeddings vs OpenAI.
+
+The local backend is timed end to end (query embedding + top-k search).
+The OpenAI backend uses the real API when LLM_API_KEY is set, or the local
+stub server with --stub (agreement against the stub is only a smoke test).
+
+Usage (from backend/):
+    python -m benchmarks.embedding_benchmark --stub
+    LLM_API_KEY=sk-... python -m benchmarks.embedding_benchmark
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+os.environ["EMBEDDING_STORE_DIR"] = ""  # measure embedding, not the disk store
+
+from benchmarks.questions import QUESTIONS
+from benchmarks.stub_llm import StubServer, create_app
+from services.embedding_backends import AsyncOpenAI, HashingEmbeddingBackend, OpenAIEmbeddingBackend
+from services.rag_service import RAGService
+
+
+async def _time_retrieval(rag: RAGService, top_k: int, repeat: int):
+    await rag.initialize_embeddings()
+    timings, results = [], {}
+    for _ in range(repeat):
+        for question in QUESTIONS:
+            started = time.perf_counter()
+            embedding = await rag.embed_query(question)
+            results[question] = rag.search(question, embedding, top_k)
+            timings.append(time.perf_counter() - started)
+    return timings, results
+
+
+def _report(label: str, timings: list):
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{label:<10} mean {statistics.mean(timings) * 1000:8.3f} ms   p95 {p95 * 1000:8.3f} ms")
+
+
+async def main(args):
+    local = RAGService(backend=HashingEmbeddingBackend())
+    local_timings, local_results = await _time_retrieval(local, args.top_k, args.repeat)
+    _report("local", local_timings)
+
+    if args.stub:
+        stub = StubServer(create_app(latency=args.stub_latency)).__enter__()
+        client = AsyncOpenAI(api_key="stub", base_url=f"{stub.url}/v1")
+    elif os.getenv("LLM_API_KEY") and AsyncOpenAI:
+        client = AsyncOpenAI(api_key=os.getenv("LLM_API_KEY"), base_url=os.getenv("LLM_BASE_URL"))
+    else:
+        print("openai     skipped (set LLM_API_KEY or pass --stub)")
+        return
+
+    remote = RAGService(backend=OpenAIEmbeddingBackend(client, os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")))
+    remote_timings, remote_results = await _time_retrieval(remote, args.top_k, 1)
+    _report("openai", remote_timings)
+
+    top1 = sum(local_results[q][0] == remote_results[q][0] for q in QUESTIONS) / len(QUESTIONS)
+    overlap = statistics.mean(
+        len(set(local_results[q]) & set(remote_results[q])) / args.top_k for q in QUESTIONS
+    )
+    print(f"top-1 agreement {top1 * 100:.1f}%   top-{args.top_k} overlap {overlap * 100:.1f}%")
+    print(f"speedup {statistics.mean(remote_timings) / statistics.mean(local_timings):.0f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--stub", action="store_true", help="use the local stub server instead of OpenAI")
+    parser.add_argument("--stub-latency", type=float, default=0.1)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,91 @@
+"""
+Concurrency benchmark for the async /chat request path.
+
+Runs the FastAPI app in-process against a local stub OpenAI server and
+compares one-at-a-time requests with concurrent ones. With a blocking
+request path the concurrent run would take as long as the sequential
+estimate; with the async path it approaches a single LLM round trip.
+A final burst sends one uncached question many times at once to show
+how many upstream calls single-flight coalescing saves.
+
+Usage (from backend/):
+    python -m benchmarks.load_benchmark --requests 50 --concurrency 25 --llm-latency 0.5
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import httpx
+
+from benchmarks.stub_llm import StubServer, create_app
+
+
+async def _run(client: httpx.AsyncClient, count: int, concurrency: int, prefix: str) -> list:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i: int):
+        async with semaphore:
+            # Unique questions so the answer cache never short-circuits the LLM
+            started = time.perf_counter()
+            response = await client.post("/chat", json={"message": f"{prefix} {i}: ATMU qayerda?", "version": 1})
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(one(i) for i in range(count)))
+    return latencies
+
+
+async def main(args):
+    with StubServer(create_app(latency=args.llm_latency)) as stub:
+        os.environ.update({
+            "LLM_PROVIDER": "openai",
+            "LLM_API_KEY": "stub",
+            "LLM_BASE_URL": f"{stub.url}/v1",
+            "EMBEDDING_STORE_DIR": "",  # stub vectors must never reach the real on-disk store
+            "RATE_LIMIT_PER_MINUTE": "0",  # every request comes from the one in-process client
+        })
+        from main import app  # imported after env so services pick up the stub
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            await _run(client, 1, 1, "warmup")  # knowledge base embeddings
+
+            sequential = await _run(client, args.sequential, 1, "seq")
+            per_request = sum(sequential) / len(sequential)
+
+            started = time.perf_counter()
+            concurrent = await _run(client, args.requests, args.concurrency, "conc")
+            wall = time.perf_counter() - started
+
+            # Same question from every client at once, before any cache is warm
+            calls_before = dict(stub.app.state.calls)
+            burst = await asyncio.gather(*(
+                client.post("/chat", json={"message": "Qabul komissiyasi qachon ishlaydi?", "version": 1})
+                for _ in range(args.burst)
+            ))
+            for response in burst:
+                response.raise_for_status()
+            burst_calls = {k: stub.app.state.calls[k] - calls_before[k] for k in calls_before}
+
+    serial_estimate = per_request * args.requests
+    print(f"stub LLM latency      : {args.llm_latency * 1000:.0f} ms")
+    print(f"sequential mean       : {per_request * 1000:.1f} ms/request")
+    print(f"concurrent requests   : {args.requests} (concurrency {args.concurrency})")
+    print(f"concurrent wall time  : {wall:.2f} s (serial estimate {serial_estimate:.2f} s)")
+    print(f"throughput            : {args.requests / wall:.1f} req/s")
+    print(f"concurrency gain      : {serial_estimate / wall:.1f}x")
+    print(f"max request latency   : {max(concurrent) * 1000:.1f} ms")
+    print(f"identical burst       : {args.burst} requests -> "
+          f"{burst_calls['chat']} LLM / {burst_calls['embeddings']} embedding calls")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=25)
+    parser.add_argument("--sequential", type=int, default=5)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--burst", type=int, default=25)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,22 @@
+"""Realistic Uzbek question mix shared by the benchmarks"""
+
+QUESTIONS = [
+    "ATMU qayerda joylashgan?",
+    "Universitet manzili qanday?",
+    "Qo‘rg‘on ko‘chasi qayerda?",
+    "Telefon raqamingiz qanday?",
+    "Qanday bog'lansam bo'ladi?",
+    "Email manzilingiz bormi?",
+    "Veb-sayt manzili qanday?",
+    "Universitet qachon tashkil etilgan?",
+    "Qanday fakultetlar bor?",
+    "Kompyuter fanlari yo'nalishi bormi?",
+    "Kechki ta'lim bormi?",
+    "Raqamli marketing o'qitiladimi?",
+    "Menejment yo'nalishi haqida ma'lumot bering",
+    "Kampus qanday?",
+    "Universitet haqida qisqacha aytib bering",
+    "Mo'ljal qayer?",
+    "Defektologiya yo'nalishi kunduzgimi?",
+    "Matematika va informatika bormi?",
+]
@@ -0,0 +1,71 @@
+"""
+Import-time benchmark for the app entry point.
+
+Imports `main` in fresh interpreters with `python -X importtime` and reports
+the wall time plus the slowest top-level imports, so heavy dependencies
+(torch, transformers, google-generativeai, tiktoken) creeping back onto the
+startup path show up immediately. Text-only serving is available as soon as
+`main` is imported; the TTS model loads afterwards on a background thread.
+
+Usage (from backend/):
+    python -m benchmarks.startup_benchmark --runs 5 --top 10
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _import_once() -> tuple:
+    """Wall seconds and importtime rows (module, cumulative us, depth) for one fresh import"""
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR, capture_output=True, text=True, env={**os.environ, "LLM_PROVIDER": ""},
+    )
+    wall = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((name.strip(), int(cumulative), depth))
+    return wall, rows
+
+
+def main(args):
+    walls, main_us, slowest, imported = [], [], {}, set()
+    for _ in range(args.runs):
+        wall, rows = _import_once()
+        walls.append(wall)
+        for name, cumulative, depth in rows:
+            imported.add(name)
+            if name == "main":
+                main_us.append(cumulative)
+            elif depth <= 2:  # what main and the services pull in directly
+                slowest[name] = max(slowest.get(name, 0), cumulative)
+
+    print(f"runs                  : {args.runs}")
+    print(f"interpreter wall time : {statistics.median(walls) * 1000:.0f} ms (median)")
+    print(f"import main           : {statistics.median(main_us) / 1000:.0f} ms (median)")
+    print("slowest imports       :")
+    for name, cumulative in sorted(slowest.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+    for heavy in ("torch", "transformers", "google.generativeai", "tiktoken", "scipy", "sklearn"):
+        if heavy in imported:
+            print(f"warning: {heavy} is imported at startup")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    main(parser.parse_args())
@@ -0,0 +1,148 @@
+"""
+Local stand-in for the OpenAI and Gemini APIs used by the benchmarks.
+
+Serves /v1/chat/completions (plain and streaming) and /v1/embeddings in the
+OpenAI shape, and models/*:generateContent / :streamGenerateContent in the
+Gemini REST shape, with a configurable artificial latency so the app can be
+load tested without network access or API cost. A share of completions can
+be made slow (tail_rate / tail_latency) or fail with a 503 (error_rate) to
+exercise hedging and fallback.
+"""
+import asyncio
+import hashlib
+import json
+import random
+import socket
+import threading
+import time
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+ANSWER = (
+    "ATMU Qashqadaryo viloyati, Qarshi shahri, Qo'rg'on ko'chasida joylashgan. "
+    "Mo'ljal: Yangi bozor orqa tomoni. "
+    "Telefon raqami: +998 (55) 404 55 55. "
+    "Fakultetlar yoki qabul haqida ham ma'lumot berayinmi?"
+)
+EMBEDDING_DIM = 64
+
+
+def _embed(text: str) -> list:
+    """Deterministic bag-of-words vector so retrieval behaves consistently"""
+    vec = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    for word in text.lower().split():
+        digest = hashlib.md5(word.encode()).digest()
+        vec[digest[0] % EMBEDDING_DIM] += 1.0
+    norm = np.linalg.norm(vec)
+    return (vec / norm if norm else vec).tolist()
+
+
+def create_app(latency: float = 0.5, token_delay: float = 0.01, tail_latency: float = 0.0,
+               tail_rate: float = 0.0, error_rate: float = 0.0, seed: int = 0) -> FastAPI:
+    app = FastAPI()
+    app.state.calls = {"chat": 0, "embeddings": 0}
+    words = ANSWER.split(" ")
+    rng = random.Random(seed)
+
+    async def respond_delay():
+        """Base latency, sometimes a slow tail, sometimes an overload error"""
+        app.state.calls["chat"] += 1
+        if rng.random() < error_rate:
+            await asyncio.sleep(latency / 5)
+            raise HTTPException(status_code=503, detail="stub overloaded")
+        await asyncio.sleep(tail_latency if rng.random() < tail_rate else latency)
+
+    @app.post("/v1/chat/completions")
+    async def chat(request: Request):
+        body = await request.json()
+        await respond_delay()
+        created = int(time.time())
+        if not body.get("stream"):
+            return {
+                "id": "stub", "object": "chat.completion", "created": created, "model": body["model"],
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": ANSWER}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            }
+
+        async def events():
+            for word in words:
+                chunk = {
+                    "id": "stub", "object": "chat.completion.chunk", "created": created, "model": body["model"],
+                    "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+                await asyncio.sleep(token_delay)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        app.state.calls["embeddings"] += 1
+        await asyncio.sleep(latency / 5)
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        return {
+            "object": "list", "model": body["model"],
+            "data": [{"object": "embedding", "index": i, "embedding": _embed(t)} for i, t in enumerate(inputs)],
+            "usage": {"prompt_tokens": 0, "total_tokens": 0},
+        }
+
+    def gemini_response(text: str) -> dict:
+        return {
+            "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP", "index": 0}],
+            "usageMetadata": {"promptTokenCount": 0, "candidatesTokenCount": 0, "totalTokenCount": 0},
+        }
+
+    @app.post("/{version}/models/{model}:generateContent")
+    async def gemini_generate(version: str, model: str):
+        await respond_delay()
+        return gemini_response(ANSWER)
+
+    @app.post("/{version}/models/{model}:streamGenerateContent")
+    async def gemini_stream(version: str, model: str, alt: str = "json"):
+        await respond_delay()
+
+        async def chunks():
+            # alt=sse: one event per chunk; otherwise a JSON array streamed element by element
+            for i, word in enumerate(words):
+                payload = json.dumps(gemini_response(word + " "))
+                if alt == "sse":
+                    yield f"data: {payload}\n\n"
+                else:
+                    yield ("[" if i == 0 else ",\n") + payload
+                await asyncio.sleep(token_delay)
+            if alt != "sse":
+                yield "]"
+
+        return StreamingResponse(chunks(), media_type="text/event-stream" if alt == "sse" else "application/json")
+
+    return app
+
+
+class StubServer:
+    """Run a stub app with uvicorn in a daemon thread on a free local port"""
+    def __init__(self, app: FastAPI):
+        self.app = app
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            self.port = sock.getsockname()[1]
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
@@ -0,0 +1,156 @@
+"""
+Correctness checks and speed benchmark for Uzbek transliteration.
+
+First verifies both directions against a table of reference spellings
+(digraphs, o'/g', ye/yo/yu/ya, e vs э, tutuq belgisi, casing, apostrophe
+variants) and exits non-zero on any mismatch. Then times the table-driven
+engine against the previous character-by-character implementation on a
+corpus built from the knowledge base and typical answers.
+
+Usage (from backend/):
+    python -m benchmarks.transliteration_benchmark --chars 200000
+"""
+import argparse
+import os
+import sys
+import time
+
+from benchmarks.questions import QUESTIONS
+from benchmarks.stub_llm import ANSWER
+from services.transliteration import transliterate_to_cyrillic, transliterate_to_latin, is_cyrillic
+
+# (Latin, Cyrillic) reference pairs, checked in both directions
+CASES = [
+    ("O'zbekiston", "Ўзбекистон"),
+    ("G'alaba", "Ғалаба"),
+    ("Qo'rg'on ko'chasi", "Қўрғон кўчаси"),
+    ("yo'l", "йўл"),
+    ("Yo'nalishlar", "Йўналишлар"),
+    ("shahar", "шаҳар"),
+    ("SHAHAR", "ШАҲАР"),
+    ("Choy", "Чой"),
+    ("hamma xabar", "ҳамма хабар"),
+    ("ma'lumot", "маълумот"),
+    ("sun'iy", "сунъий"),
+    ("Is'hoq", "Исҳоқ"),
+    ("yetti", "етти"),
+    ("Yer", "Ер"),
+    ("poyezd", "поезд"),
+    ("obyekt", "объект"),
+    ("ekran", "экран"),
+    ("Ekran", "Экран"),
+    ("poeziya", "поэзия"),
+    ("kelmoqda", "келмоқда"),
+    ("yangi", "янги"),
+    ("yubiley", "юбилей"),
+    ("yozuv", "ёзув"),
+    ("qayerda", "қаерда"),
+    ("ketsa", "кетса"),
+    ("ATMU", "АТМУ"),
+    ("'salom'", "'салом'"),
+    ("Telefon: +998 (55) 404-55-55", "Телефон: +998 (55) 404-55-55"),
+]
+
+# Latin spellings that must map to the same Cyrillic (apostrophe variants)
+VARIANTS = [
+    ("Qo‘rg‘on", "Қўрғон"),
+    ("oʻzbek", "ўзбек"),
+    ("o’qish", "ўқиш"),
+]
+
+# Cyrillic-only spellings with a defined Latin form
+CYRILLIC_ONLY = [
+    ("цирк", "sirk"),
+    ("станция", "stansiya"),
+    ("милиция", "militsiya"),
+    ("Шоҳжаҳон", "Shohjahon"),
+]
+
+_LEGACY_MAP = {
+    'a': 'а', 'b': 'б', 'd': 'д', 'e': 'е', 'f': 'ф', 'g': 'г', 'h': 'х', 'i': 'и', 'j': 'ж', 'k': 'к',
+    'l': 'л', 'm': 'м', 'n': 'н', 'o': 'о', 'p': 'п', 'q': 'қ', 'r': 'р', 's': 'с', 't': 'т', 'u': 'у',
+    'v': 'в', 'x': 'х', 'y': 'й', 'z': 'з', 'sh': 'ш', 'ch': 'ч', 'ng': 'нг', "'": "ъ",
+    'A': 'А', 'B': 'Б', 'D': 'Д', 'E': 'Е', 'F': 'Ф', 'G': 'Г', 'H': 'Х', 'I': 'И', 'J': 'Ж', 'K': 'К',
+    'L': 'Л', 'M': 'М', 'N': 'Н', 'O': 'О', 'P': 'П', 'Q': 'Қ', 'R': 'Р', 'S': 'С', 'T': 'Т', 'U': 'У',
+    'V': 'В', 'X': 'Х', 'Y': 'Й', 'Z': 'З', 'Sh': 'Ш', 'Ch': 'Ч', 'Ng': 'НГ'
+}
+
+
+def legacy_to_cyrillic(text: str) -> str:
+    """The previous implementation, kept here as the speed baseline"""
+    result = ''
+    i = 0
+    while i < len(text):
+        if i + 1 < len(text) and text[i:i+2].lower() in ('sh', 'ch', 'ng'):
+            dig = text[i:i+2]
+            result += _LEGACY_MAP.get(dig, dig)
+            i += 2
+            continue
+        ch = text[i]
+        result += _LEGACY_MAP.get(ch, ch)
+        i += 1
+    return result
+
+
+def check() -> int:
+    failures = []
+    for latin, cyrillic in CASES:
+        if transliterate_to_cyrillic(latin) != cyrillic:
+            failures.append(f"to_cyrillic({latin!r}) = {transliterate_to_cyrillic(latin)!r}, expected {cyrillic!r}")
+        if transliterate_to_latin(cyrillic) != latin:
+            failures.append(f"to_latin({cyrillic!r}) = {transliterate_to_latin(cyrillic)!r}, expected {latin!r}")
+    for latin, cyrillic in VARIANTS:
+        if transliterate_to_cyrillic(latin) != cyrillic:
+            failures.append(f"to_cyrillic({latin!r}) = {transliterate_to_cyrillic(latin)!r}, expected {cyrillic!r}")
+    for cyrillic, latin in CYRILLIC_ONLY:
+        if transliterate_to_latin(cyrillic) != latin:
+            failures.append(f"to_latin({cyrillic!r}) = {transliterate_to_latin(cyrillic)!r}, expected {latin!r}")
+    if is_cyrillic("ATMU qayerda?") or not is_cyrillic("АТМУ қаерда?"):
+        failures.append("is_cyrillic misclassifies script")
+
+    total = 2 * len(CASES) + len(VARIANTS) + len(CYRILLIC_ONLY) + 1
+    print(f"correctness           : {total - len(failures)}/{total} checks passed")
+    for failure in failures:
+        print(f"  FAIL {failure}")
+    return len(failures)
+
+
+def _corpus(chars: int) -> str:
+    data_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "university_data.txt")
+    with open(data_path, "r", encoding="utf-8") as f:
+        base = "\n".join([f.read(), ANSWER, *QUESTIONS])
+    return (base * (chars // len(base) + 1))[:chars]
+
+
+def _best(fn, text: str, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn(text)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main(args):
+    failures = check()
+
+    latin = _corpus(args.chars)
+    cyrillic = transliterate_to_cyrillic(latin)
+    legacy = _best(legacy_to_cyrillic, latin, args.repeats)
+    forward = _best(transliterate_to_cyrillic, latin, args.repeats)
+    reverse = _best(transliterate_to_latin, cyrillic, args.repeats)
+    answer = _best(transliterate_to_cyrillic, ANSWER, args.repeats * 100)
+
+    print(f"corpus                : {len(latin)} characters")
+    print(f"legacy Latin->Cyrillic: {legacy * 1000:.1f} ms")
+    print(f"Latin->Cyrillic       : {forward * 1000:.1f} ms ({legacy / forward:.1f}x faster)")
+    print(f"Cyrillic->Latin       : {reverse * 1000:.1f} ms")
+    print(f"one typical answer    : {answer * 1e6:.0f} us")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chars", type=int, default=200000)
+    parser.add_argument("--repeats", type=int, default=5)
+    main(parser.parse_args())
@@ -0,0 +1,75 @@
+"""
+Throughput benchmark for TTS micro-batching.
+
+Synthesizes the same set of short Cyrillic sentences two ways:
+one-at-a-time through TTSService.generate_audio (the pre-batching path)
+and concurrently through TTSService.synthesize, which the scheduler groups
+into padded batches. The audio cache is cleared between runs.
+
+Usage (from backend/):
+    python -m benchmarks.tts_benchmark --sentences 32 --batch-sizes 1 4 8 16
+"""
+import argparse
+import asyncio
+import time
+
+from services.transliteration import transliterate_to_cyrillic
+from services.tts_service import tts_service
+
+SENTENCES = [
+    "ATMU Qarshi shahrida joylashgan.",
+    "Telefon raqami: plus to'qqiz yuz to'qson sakkiz.",
+    "Universitet axborot texnologiyalari sohasida mutaxassislar tayyorlaydi.",
+    "Mo'ljal: Yangi bozor orqa tomoni.",
+    "Boshqa savolingiz bormi?",
+    "Fakultetlar yoki qabul haqida ham ma'lumot berayinmi?",
+    "Universitet 2022-yilda tashkil etilgan.",
+    "Barcha yo'nalishlar kunduzgi va kechki shaklda mavjud.",
+]
+
+
+def _corpus(count: int) -> list:
+    # Suffix keeps every text unique so neither cache nor batch dedupe kicks in
+    return [
+        transliterate_to_cyrillic(f"{SENTENCES[i % len(SENTENCES)]} {i}")
+        for i in range(count)
+    ]
+
+
+def run_sequential(texts: list) -> float:
+    tts_service.audio_cache.clear()
+    started = time.perf_counter()
+    for text in texts:
+        tts_service.generate_audio(text)
+    return time.perf_counter() - started
+
+
+async def run_batched(texts: list, batch_size: int, wait_ms: float) -> float:
+    tts_service.audio_cache.clear()
+    tts_service.scheduler.max_batch_size = batch_size
+    tts_service.scheduler.max_wait = wait_ms / 1000
+    started = time.perf_counter()
+    await asyncio.gather(*(tts_service.synthesize(text) for text in texts))
+    return time.perf_counter() - started
+
+
+def main(args):
+    texts = _corpus(args.sentences)
+    tts_service.generate_audio(transliterate_to_cyrillic("Salom."))  # load model outside timing
+
+    baseline = run_sequential(texts)
+    print(f"{'mode':<22}{'seconds':>10}{'sent/s':>10}{'speedup':>10}")
+    print(f"{'one-at-a-time':<22}{baseline:>10.2f}{len(texts) / baseline:>10.1f}{1.0:>10.2f}")
+    for batch_size in args.batch_sizes:
+        elapsed = asyncio.run(run_batched(texts, batch_size, args.max_wait_ms))
+        label = f"batched (max {batch_size})"
+        print(f"{label:<22}{elapsed:>10.2f}{len(texts) / elapsed:>10.1f}{baseline / elapsed:>10.2f}")
+    print(f"scheduler stats: {tts_service.scheduler.get_stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sentences", type=int, default=32)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--max-wait-ms", type=float, default=10)
+    main(parser.parse_args())
@@ -0,0 +1,90 @@
+"""
+CPU inference benchmark for the VITS model: speed and audio quality.
+
+Loads the model once per configuration (fp32 vs dynamic int8 quantization,
+at several intra-op thread counts) and synthesizes the same sentences with
+a fixed seed, so VITS's sampling noise is identical across runs. Reports
+the real-time factor (synthesis seconds per second of audio, lower is
+better) and how far each configuration's waveforms drift from the fp32
+reference: cosine similarity, SNR and duration ratio.
+
+Usage (from backend/):
+    python -m benchmarks.tts_inference_benchmark --threads 1 2 4 --repeats 3
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.tts_benchmark import SENTENCES
+from services.transliteration import transliterate_to_cyrillic
+from services.tts_service import TTSService
+
+
+def _load(quantize: str, threads: int) -> TTSService:
+    service = TTSService()
+    service.quantize = quantize
+    service.torch_threads = threads
+    service._load_model()
+    if service.model is None:
+        raise SystemExit("TTS model could not be loaded")
+    return service
+
+
+def _synthesize(service: TTSService, texts: list, repeats: int, seed: int) -> tuple:
+    """Best-of-repeats synthesis seconds and the waveforms of the last run"""
+    import torch
+
+    best, waveforms = float("inf"), []
+    for _ in range(repeats):
+        waveforms = []
+        started = time.perf_counter()
+        for text in texts:
+            torch.manual_seed(seed)
+            waveforms.extend(service._infer([text]))
+        best = min(best, time.perf_counter() - started)
+    return best, waveforms
+
+
+def _quality(reference: list, candidate: list) -> tuple:
+    """Mean cosine similarity, SNR (dB) and duration ratio against the reference waveforms"""
+    similarities, snrs, ratios = [], [], []
+    for ref, cand in zip(reference, candidate):
+        n = min(ref.size, cand.size)
+        a, b = ref[:n].astype(np.float64), cand[:n].astype(np.float64)
+        similarities.append(a @ b / (np.linalg.norm(a) * np.linalg.norm(b) or 1))
+        noise = np.sum((a - b) ** 2)
+        snrs.append(10 * np.log10(np.sum(a ** 2) / noise) if noise > 0 else float("inf"))
+        ratios.append(cand.size / ref.size)
+    return float(np.mean(similarities)), float(np.median(snrs)), float(np.mean(ratios))
+
+
+def main(args):
+    import torch
+
+    texts = [transliterate_to_cyrillic(s) for s in SENTENCES]
+    default_threads = torch.get_num_threads()
+    configs = [("fp32", "none", t) for t in args.threads] + [("int8", "int8", t) for t in args.threads]
+
+    reference = None
+    print(f"{'config':<16}{'threads':>8}{'seconds':>10}{'RTF':>8}{'cosine':>9}{'SNR dB':>9}{'length':>8}")
+    for label, quantize, threads in configs:
+        service = _load(quantize, threads or default_threads)
+        service._infer([texts[0]])  # first call allocates; keep it out of timing
+        seconds, waveforms = _synthesize(service, texts, args.repeats, args.seed)
+        audio_seconds = sum(w.size for w in waveforms) / service.sample_rate
+        if reference is None:
+            reference = waveforms  # first fp32 configuration
+        cosine, snr, length = _quality(reference, waveforms)
+        print(f"{label:<16}{torch.get_num_threads():>8}{seconds:>10.2f}{seconds / audio_seconds:>8.3f}"
+              f"{cosine:>9.4f}{snr:>9.1f}{length:>8.3f}")
+    torch.set_num_threads(default_threads)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, nargs="+", default=[0, 1, 2],
+                        help="intra-op thread counts to try (0 = torch default)")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    main(parser.parse_args())
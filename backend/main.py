@@ -1,16 +1,29 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
 import os
+import json
+import math
+import asyncio
+from collections import deque
 from dotenv import load_dotenv
 load_dotenv()
-from services.llm_service import llm_service, transliterate_to_cyrillic
+from services.llm_service import llm_service, LLMError
+from services.transliteration import transliterate_to_cyrillic
 from services.rag_service import rag_service
-from services.cache_service import cache_service
+from services.cache_service import cache_service, semantic_cache
 from services.conversation_service import conversation_service
 from services.tts_service import tts_service
+from services.text_utils import SentenceBuffer, split_sentences
+from services.prompt_budget import prompt_budgeter
+from services.chat_service import chat_service
+from services.warmup_service import warmup_service
+from services.metrics import metrics
+from services.fact_store import fact_store
+from services.prefetch_service import prefetch_service
+from services.admission import admission, Overloaded, BUSY_MESSAGE, DEGRADATION_LEVELS, NORMAL
 
 # from pathlib import Path
 
@@ -33,6 +46,23 @@ class ChatRequest(BaseModel):
     message: str
     session_id: str = None
     version: int = 1  # 1 = Assistant 1 (Browser TTS), 2 = Assistant 2 (Backend TTS)
+@app.on_event("startup")
+async def start_background_jobs():
+    conversation_service.start_sweeper()
+    # Knowledge-base edits are re-indexed and swapped in without a restart
+    rag_service.start_watcher()
+    # Text answers are served right away; the VITS model loads on a TTS thread meanwhile
+    if os.getenv("TTS_PRELOAD", "true").lower() == "true":
+        tts_service.start_preload()
+    if os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true":
+        warmup_service.start()
+    else:
+        warmup_service.skip()
+@app.on_event("shutdown")
+async def stop_background_jobs():
+    conversation_service.stop_sweeper()
+    rag_service.stop_watcher()
+    prefetch_service.stop()
 @app.get("/")
 @app.head("/")
 async def read_index():
@@ -42,69 +72,375 @@ async def create_session():
     """Create new conversation session"""
     session_id = conversation_service.create_session()
     return {"session_id": session_id}
+@app.get("/api/health")
+async def health():
+    """Liveness probe; also reports whether voice (Assistant 2) is ready"""
+    return {"status": "ok", "tts_model": tts_service.model_status}
+@app.get("/api/ready")
+async def readiness():
+    """Readiness probe: 503 until the startup warm-up has finished"""
+    stats = warmup_service.get_stats()
+    if not warmup_service.ready:
+        return JSONResponse(status_code=503, content=stats)
+    return stats
 @app.get("/api/cache/stats")
 async def cache_stats():
     """Get cache statistics"""
-    return cache_service.get_stats()
+    return {
+        **cache_service.get_stats(),
+        "semantic_cache": semantic_cache.get_stats(),
+        "prompt_tokens": prompt_budgeter.get_stats(),
+        "tts_audio_cache": tts_service.audio_cache.get_stats(),
+        "tts_batching": tts_service.scheduler.get_stats(),
+        "sessions": conversation_service.get_stats(),
+        "single_flight": {
+            flight.name: flight.get_stats()
+            for flight in (chat_service.flight, rag_service.query_flight, tts_service.flight)
+        },
+        "llm_providers": llm_service.router.get_stats(),
+        "knowledge_base": rag_service.get_stats(),
+        "fact_fast_path": fact_store.get_stats(),
+        "admission": admission.get_stats(),
+        "prefetch": prefetch_service.get_stats(),
+        "latency": metrics.get_stats()
+    }
+@app.post("/api/knowledge/reload")
+async def reload_knowledge():
+    """Re-read the knowledge-base file now instead of waiting for the watcher"""
+    stale = await rag_service.reload()
+    return {"changed": stale is not None, "stale_chunks": len(stale or ()), **rag_service.get_stats()}
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Latency histograms plus cache, session and queue gauges in the Prometheus text format"""
+    sessions = conversation_service.get_stats()
+    audio_cache = tts_service.audio_cache.get_stats()
+    batching = tts_service.scheduler.get_stats()
+    samples = [
+        ("chat_cache_hits_total", "counter", "Cache hits", cache_service.stats["hits"], {"cache": "exact"}),
+        ("chat_cache_hits_total", "counter", "Cache hits", semantic_cache.stats["hits"], {"cache": "semantic"}),
+        ("chat_cache_hits_total", "counter", "Cache hits", audio_cache["hits"] + audio_cache["disk_hits"], {"cache": "audio"}),
+        ("chat_cache_misses_total", "counter", "Cache misses", cache_service.stats["misses"], {"cache": "exact"}),
+        ("chat_cache_misses_total", "counter", "Cache misses", semantic_cache.stats["misses"], {"cache": "semantic"}),
+        ("chat_cache_misses_total", "counter", "Cache misses", audio_cache["misses"], {"cache": "audio"}),
+        ("chat_cache_entries", "gauge", "Entries held by each cache", len(cache_service.cache), {"cache": "exact"}),
+        ("chat_cache_entries", "gauge", "Entries held by each cache", semantic_cache.size, {"cache": "semantic"}),
+        ("chat_cache_entries", "gauge", "Entries held by each cache", audio_cache["entries"], {"cache": "audio"}),
+        ("chat_audio_cache_bytes", "gauge", "PCM bytes in the in-memory audio cache", audio_cache["bytes"], {}),
+        ("chat_sessions_active", "gauge", "Conversation sessions held", sessions["active_sessions"], {}),
+        ("chat_sessions_bytes", "gauge", "Approximate bytes of conversation history", sessions["bytes"], {}),
+        ("chat_tts_queue_depth", "gauge", "Sentences waiting for a TTS batch", batching["queued"], {}),
+        ("chat_tts_batches_total", "counter", "TTS forward passes run", batching["batches"], {}),
+        ("chat_tts_model_ready", "gauge", "1 once the VITS model is loaded", tts_service.model_status == "ready", {}),
+        ("chat_ready", "gauge", "1 once the startup warm-up has finished", warmup_service.ready, {}),
+        ("chat_degradation_level", "gauge", "0 normal, 1 text-only voice, 2 shedding new LLM work",
+         DEGRADATION_LEVELS.index(admission.level), {}),
+        ("chat_tts_estimated_wait_seconds", "gauge", "Expected wait for a newly submitted TTS sentence",
+         tts_service.scheduler.estimated_wait(), {}),
+        ("chat_rate_limited_total", "counter", "Requests refused by per-client rate limits",
+         admission.stats["rate_limited"], {}),
+        ("chat_degraded_total", "counter", "Version 2 requests answered text-only", admission.stats["text_only"], {}),
+        ("chat_fact_answers_total", "counter", "Questions answered from the fact store without the LLM",
+         fact_store.stats["matched"], {}),
+        ("chat_kb_chunks", "gauge", "Chunks in the live knowledge-base index", len(rag_service.chunks), {}),
+        ("chat_kb_reloads_total", "counter", "Knowledge-base reloads swapped in", rag_service.stats["reloads"], {}),
+        ("chat_cache_invalidated_total", "counter", "Answers dropped because their chunks changed",
+         cache_service.stats["invalidated"], {"cache": "exact"}),
+        ("chat_cache_invalidated_total", "counter", "Answers dropped because their chunks changed",
+         semantic_cache.stats["invalidated"], {"cache": "semantic"}),
+        ("chat_prefetch_llm_calls_total", "counter", "Follow-up answers computed speculatively",
+         prefetch_service.stats["computed"], {}),
+        ("chat_prefetch_resolved_total", "counter", "Replies taking up an offer, mapped to the predicted question",
+         prefetch_service.stats["resolved"], {}),
+        ("chat_prefetch_used_total", "counter", "Replies whose predicted question had been prefetched",
+         prefetch_service.stats["used"], {}),
+        ("chat_prefetch_useful_total", "counter", "Prefetched questions asked at least once",
+         prefetch_service.stats["useful"], {}),
+    ]
+    for outcome in ("already_cached", "skipped_busy", "skipped_budget", "dropped", "failed"):
+        samples.append(("chat_prefetch_skipped_total", "counter", "Predicted follow-ups not prefetched",
+                        prefetch_service.stats[outcome], {"reason": outcome}))
+    for flight in (chat_service.flight, rag_service.query_flight, tts_service.flight):
+        stats = flight.get_stats()
+        samples.append(("chat_single_flight_in_flight", "gauge", "Coalesced computations running",
+                        stats["in_flight"], {"flight": flight.name}))
+        samples.append(("chat_single_flight_coalesced_total", "counter", "Calls served by another caller's computation",
+                        stats["coalesced"], {"flight": flight.name}))
+    router = llm_service.router
+    for name in ("hedged", "hedge_wins", "fallbacks", "failures"):
+        samples.append((f"chat_llm_{name}_total", "counter", f"LLM calls {name.replace('_', ' ')}",
+                        router.stats[name], {}))
+    for health in router.health:
+        labels = {"provider": health.name}
+        samples.append(("chat_llm_provider_requests_total", "counter", "LLM attempts sent to each provider",
+                        health.stats["requests"], labels))
+        samples.append(("chat_llm_provider_errors_total", "counter", "Failed LLM attempts per provider",
+                        health.stats["errors"], labels))
+        samples.append(("chat_llm_provider_error_rate", "gauge", "Time-decayed error rate the router ranks by",
+                        health.error_rate, labels))
+        for kind, latency in health.latency_ewma.items():
+            if latency is not None:
+                samples.append(("chat_llm_provider_latency_ewma_seconds", "gauge",
+                                "Latency EWMA per provider (stream = time to first token)",
+                                latency, {**labels, "kind": kind}))
+    for stage in (admission.requests, admission.llm):
+        labels = {"stage": stage.name}
+        samples.append(("chat_stage_in_flight", "gauge", "Work holding an admission slot", stage.active, labels))
+        samples.append(("chat_stage_queued", "gauge", "Work waiting for an admission slot", stage.waiting, labels))
+        samples.append(("chat_stage_rejected_total", "counter", "Work refused because the stage queue was full or too slow",
+                        stage.stats["rejected"] + stage.stats["timed_out"], labels))
+    return PlainTextResponse(metrics.render(samples), media_type="text/plain; version=0.0.4")
+def _client_key(http_request: Request) -> str:
+    """Rate-limit identity: the client address (session ids are client-chosen, so a fresh one per request would reset the bucket)"""
+    return http_request.client.host if http_request.client else "unknown"
+
+
+def _overloaded(error: Overloaded) -> HTTPException:
+    return HTTPException(
+        status_code=error.status,
+        detail={"error": error.reason, "degradation": admission.level},
+        headers={"Retry-After": str(math.ceil(error.retry_after))},
+    )
+
+
 @app.post("/chat")
-async def chat_endpoint(request: ChatRequest):
+async def chat_endpoint(request: ChatRequest, response: Response, http_request: Request):
     """
     Optimized chat endpoint with caching and semantic search
     
     Flow:
-    1. Check cache for answer
+    1. Check exact cache, then semantic cache by query embedding
     2. If cache miss, use semantic RAG to get context
     3. Get LLM response with conversation history
     4. Cache the result
     5. Update conversation history
+    6. Remember the follow-ups this answer offers and prefetch them (PREFETCH_LLM_PER_MINUTE;
+       background, idle capacity only); a reply taking up the offer is asked as the predicted question
+    Steps 1-4 are coalesced: requests for the same normalized question that
+    arrive while one is in flight await its result instead of repeating it.
+    Stage timings go to /metrics, and to a Server-Timing header with METRICS_TRACE_HEADER.
+    Admission control: 429 beyond the client's rate, 503 when the request or
+    LLM queue is full; version 2 degrades to text-only ("degradation") when
+    TTS is over its latency budget, and the browser speaks the answer instead.
     """
-    user_message = request.message
+    trace = metrics.start_trace()
     session_id = request.session_id
+    message = chat_service.normalize_question(request.message)
     version = request.version
+
+    try:
+        admission.check_rate(_client_key(http_request))
+        async with admission.requests.slot():
+            # "ha" after an offer becomes the offered question, which may already be prefetched
+            user_message = prefetch_service.resolve(session_id, message)
+            response_text, cyrillic_text, cached = await chat_service.answer(user_message, session_id, version)
+    except Overloaded as e:
+        raise _overloaded(e)  # the offer stays for the retry
+    except LLMError as e:
+        # Shown like an answer, but never cached
+        response_text, cached = str(e), False
+        cyrillic_text = transliterate_to_cyrillic(response_text) if version == 2 else None
+
+    # Audio for version 2: a URL returned before synthesis finishes (identical sentences in flight are synthesized once)
+    audio = {"audio": None}
+    degradation = admission.voice_mode(version) if cyrillic_text else NORMAL
+    if version == 2 and cyrillic_text and degradation == NORMAL:
+        try:
+            audio = await _audio_fields(cyrillic_text, wait=False)
+        except Exception as e:
+            print(f"Error generating audio: {e}")
     
-    # Step 1: Check cache
-    cached_answer = cache_service.get(user_message)
-    if cached_answer:
-        print(f"[CACHE HIT] {user_message[:50]}...")
-        audio_base64 = None
-        if version == 2:
+    # Update conversation history
+    if session_id and not cached:
+        conversation_service.add_message(session_id, "user", user_message)
+        conversation_service.add_message(session_id, "assistant", response_text)
+    # Likely follow-ups are answered in the background while the user reads this one
+    prefetch_service.consume(session_id, message, user_message)
+    prefetch_service.after_response(response_text, session_id, version)
+    
+    metrics.finish_trace("chat", trace)
+    if metrics.trace_header:
+        response.headers["Server-Timing"] = trace.server_timing()
+    return {"response": response_text, "cached": cached, "degradation": degradation, **audio}
+
+
+async def _audio_fields(cyrillic: str, wait: bool) -> dict:
+    """Audio part of a response: a cacheable /audio URL, or inline base64 WAV (TTS_AUDIO_INLINE)"""
+    if tts_service.inline_audio:
+        return {"audio": await tts_service.synthesize(cyrillic)}
+    key = await tts_service.synthesize_clip(cyrillic, wait=wait)
+    return {"audio": None, "audio_url": f"/audio/{key}" if key else None}
+
+
+@app.get("/audio/{key}")
+async def get_audio(key: str, request: Request):
+    """
+    Synthesized speech for a clip key from /chat or /chat/stream
+    Keys are content hashes, so responses are immutable and cached by browsers and CDNs
+    """
+    etag = f'"{key}"'
+    headers = {"Cache-Control": "public, max-age=31536000, immutable", "ETag": etag}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    rendered = await tts_service.render_clip(key)
+    if rendered is None:
+        raise HTTPException(status_code=404, detail="Audio not found or expired")
+    content, media_type = rendered
+    return Response(content=content, media_type=media_type, headers=headers)
+
+
+def _sse(event: dict) -> str:
+    """Format one Server-Sent Events frame"""
+    return f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+async def _stream_answer(message: str, session_id: str, version: int):
+    """
+    Async generator behind /chat/stream
+    Yields text deltas as LLM tokens arrive and, for version 2, one audio
+    event per completed sentence so playback starts before the answer ends.
+    Sentence synthesis runs on the TTS executor while tokens keep streaming;
+    audio events are still emitted in sentence order.
+    """
+    # Timed here, inside the response task: headers are already sent when stages run
+    trace = metrics.start_trace()
+    message = chat_service.normalize_question(message)
+    # Runs inside the request slot; the offer is consumed in done(), so a shed stream keeps it
+    user_message = prefetch_service.resolve(session_id, message)
+    # Decided once per answer so its audio is never cut off halfway
+    degradation = admission.voice_mode(version)
+    voice = version == 2 and degradation == NORMAL
+    pending = deque()  # synthesis tasks in sentence order
+    audio_index = 0
+
+    def speak(sentence: str):
+        with metrics.stage("transliteration"):
+            cyrillic = transliterate_to_cyrillic(sentence)
+        pending.append(asyncio.create_task(_audio_fields(cyrillic, wait=True)))
+
+    def done(response_text: str, cached: bool) -> str:
+        metrics.finish_trace("chat_stream", trace)
+        prefetch_service.consume(session_id, message, user_message)
+        prefetch_service.after_response(response_text, session_id, version)
+        event = {"type": "done", "response": response_text, "cached": cached, "degradation": degradation}
+        if metrics.trace_header:
+            event["timing"] = trace.to_dict()
+        return _sse(event)
+
+    async def drain(wait: bool):
+        """
+        Yield finished audio from the head of the queue (all of it if wait),
+        each event as soon as its sentence is ready, in sentence order
+        """
+        nonlocal audio_index
+        while pending and (wait or pending[0].done()):
+            task = pending.popleft()
             try:
-                cyrillic = transliterate_to_cyrillic(cached_answer)
-                audio_base64 = tts_service.generate_audio(cyrillic)
+                audio = await task
             except Exception as e:
-                print(f"Error generating audio for cached response: {e}")
-        return {"response": cached_answer, "cached": True, "audio": audio_base64}
-    
-    print(f"[CACHE MISS] {user_message[:50]}...")
-    
-    # Step 2: Get relevant context using semantic search
-    # Pass OpenAI client for embeddings
-    context = rag_service.get_relevant_context(
-        user_message, 
-        client=llm_service.client if hasattr(llm_service, 'client') else None
-    )
-    
-    # Step 3: Get conversation history
+                print(f"Error generating audio for sentence: {e}")
+                continue
+            if audio.get("audio") or audio.get("audio_url"):
+                yield _sse({"type": "audio", "index": audio_index, **audio})
+                audio_index += 1
+
+    cached_answer, query_embedding, top_chunks = await chat_service.lookup_answer(user_message)
+    if cached_answer:
+        yield _sse({"type": "text", "delta": cached_answer})
+        if voice:
+            for sentence in split_sentences(cached_answer):
+                speak(sentence)
+            async for event in drain(wait=True):
+                yield event
+        yield done(cached_answer, True)
+        return
+
+    context = rag_service.context_for(top_chunks)
     history = conversation_service.get_history(session_id) if session_id else []
-    
-    # Step 4: Get LLM response
-    # Always returns Latin text now, we handle Cyrillic internally for TTS
-    result = llm_service.get_response(user_message, context, history, version=version)
-    response_text = result['text']
-    
-    # Generate audio for version 2
-    audio_base64 = None
-    if version == 2:
-        cyrillic_text = result.get('cyrillic')
-        if cyrillic_text:
-             audio_base64 = tts_service.generate_audio(cyrillic_text)
-    
-    # Step 5: Cache the result (text only)
-    cache_service.set(user_message, response_text)
-    
-    # Step 6: Update conversation history
+
+    splitter = SentenceBuffer()
+    sentences = []
+    failed = False
+
+    async def deltas():
+        nonlocal failed
+        try:
+            async for delta in llm_service.stream_response(user_message, context, history):
+                yield delta
+        except LLMError as e:
+            failed = True  # shown like an answer, but never cached
+            yield str(e)
+
+    def emit(sentence: str):
+        sentence = llm_service._clean_text(sentence)
+        if not sentence:
+            return None
+        delta = f" {sentence}" if sentences else sentence
+        sentences.append(sentence)
+        if voice:
+            speak(sentence)
+        return _sse({"type": "text", "delta": delta})
+
+    try:
+        async with admission.llm.slot():
+            async for delta in deltas():
+                for sentence in splitter.feed(delta):
+                    event = emit(sentence)
+                    if event:
+                        yield event
+                async for event in drain(wait=False):
+                    yield event
+        for sentence in splitter.flush():
+            event = emit(sentence)
+            if event:
+                yield event
+        async for event in drain(wait=True):
+            yield event
+    finally:
+        # Client disconnected mid-stream: do not keep synthesizing for nobody
+        for task in pending:
+            task.cancel()
+
+    response_text = " ".join(sentences)
+    if not failed:
+        chat_service.remember_answer(user_message, response_text, query_embedding, top_chunks)
     if session_id:
         conversation_service.add_message(session_id, "user", user_message)
         conversation_service.add_message(session_id, "assistant", response_text)
-    
-    return {"response": response_text, "cached": False, "audio": audio_base64}
+
+    yield done(response_text, False)
+
+
+async def _stream_admitted(message: str, session_id: str, version: int):
+    """_stream_answer within the request stage; work shed after the headers were sent ends with a busy answer"""
+    try:
+        async with admission.requests.slot():
+            async for event in _stream_answer(message, session_id, version):
+                yield event
+    except Overloaded:
+        yield _sse({"type": "text", "delta": BUSY_MESSAGE})
+        yield _sse({"type": "done", "response": BUSY_MESSAGE, "cached": False, "degradation": admission.level})
+
+
+@app.post("/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest, http_request: Request):
+    """
+    Streaming variant of /chat over Server-Sent Events
+
+    Events:
+    - {"type": "text", "delta": ...}   cleaned sentence text as it completes
+    - {"type": "audio", "index": n, "audio_url": ...}   /audio URL per sentence (version 2;
+      "audio" carries base64 WAV instead with TTS_AUDIO_INLINE)
+    - {"type": "done", "response": ..., "cached": ..., "degradation": ...}   full answer
+      (plus "timing", milliseconds per stage, with METRICS_TRACE_HEADER); "text_only"
+      means version 2 audio was skipped under TTS overload and the client should speak it
+    Over the client's rate limit the request is refused with 429 before streaming starts.
+    """
+    try:
+        admission.check_rate(_client_key(http_request))
+    except Overloaded as e:
+        raise _overloaded(e)
+    return StreamingResponse(
+        _stream_admitted(request.message, request.session_id, request.version),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,168 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+from services.storage import MemoryStore
+from services.tts_service import tts_service
+
+# Degradation levels, mildest first; reported in responses and as a gauge
+NORMAL, TEXT_ONLY, SHEDDING = "normal", "text_only", "shedding"
+DEGRADATION_LEVELS = (NORMAL, TEXT_ONLY, SHEDDING)
+# Answer streamed to a request that was shed after its response had started
+BUSY_MESSAGE = "Hozir so'rovlar juda ko'p. Iltimos, birozdan so'ng qayta urinib ko'ring."
+
+
+class Overloaded(Exception):
+    """Work refused by admission control; status and retry_after map to the HTTP response"""
+    def __init__(self, reason: str, status: int = 503, retry_after: float = 1.0):
+        super().__init__(reason)
+        self.reason = reason
+        self.status = status
+        self.retry_after = retry_after
+
+
+class StageLimiter:
+    """
+    Bounded concurrency with a bounded wait queue for one pipeline stage
+    Callers beyond limit wait for a slot; beyond max_queue waiters, or after
+    max_wait seconds, they are refused instead of piling up latency.
+    Time Complexity: O(1) per entry
+    """
+    def __init__(self, name: str, limit: int, max_queue: int, max_wait: float):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.active = 0
+        self.waiting = 0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.stats = {"admitted": 0, "rejected": 0, "timed_out": 0}
+
+    @property
+    def saturated(self) -> bool:
+        """Queue full: new work would be refused"""
+        return self.active >= self.limit and self.waiting >= self.max_queue
+
+    def _ensure_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:  # tests and benchmarks may run several loops
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.limit)
+            self.active = self.waiting = 0
+        return self._semaphore
+
+    @asynccontextmanager
+    async def slot(self):
+        semaphore = self._ensure_semaphore()
+        if self.saturated:
+            self.stats["rejected"] += 1
+            raise Overloaded(f"{self.name}_queue_full", retry_after=self.max_wait)
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(semaphore.acquire(), self.max_wait)
+        except asyncio.TimeoutError:
+            self.stats["timed_out"] += 1
+            raise Overloaded(f"{self.name}_queue_timeout", retry_after=self.max_wait)
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        self.stats["admitted"] += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            semaphore.release()
+
+    def get_stats(self) -> Dict:
+        return {**self.stats, "active": self.active, "waiting": self.waiting,
+                "limit": self.limit, "max_queue": self.max_queue}
+
+
+class AdmissionService:
+    """
+    Admission control and graceful degradation for the chat endpoints
+    - Per-client token buckets, keyed on the client address, answer bursts
+      beyond the rate with 429.
+    - Bounded stages: requests in flight, and LLM calls (cache hits never
+      reach the LLM stage, so they are still served when it is saturated).
+    - Degradation: when the TTS queue would exceed its latency budget, or
+      the model is still loading, version 2 requests are answered text-only
+      and the browser speaks them as Assistant 1 does; when the LLM queue is
+      full, new cache misses are shed with 503.
+    Buckets are per process, so with several workers the effective rate
+    limit is per worker.
+    Time Complexity: O(1) per request
+    """
+    def __init__(self):
+        self.rate = float(os.getenv("RATE_LIMIT_PER_MINUTE", "30")) / 60  # tokens per second; 0 disables
+        self.burst = float(os.getenv("RATE_LIMIT_BURST", "10"))
+        self.buckets = MemoryStore(max_size=int(os.getenv("RATE_LIMIT_MAX_CLIENTS", "10000")))
+        self.requests = StageLimiter(
+            "requests",
+            limit=int(os.getenv("ADMISSION_MAX_CONCURRENT", "64")),
+            max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "64")),
+            max_wait=float(os.getenv("ADMISSION_MAX_WAIT", "5")),
+        )
+        self.llm = StageLimiter(
+            "llm",
+            limit=int(os.getenv("ADMISSION_LLM_CONCURRENCY", "16")),
+            max_queue=int(os.getenv("ADMISSION_LLM_QUEUE", "32")),
+            max_wait=float(os.getenv("ADMISSION_LLM_MAX_WAIT", "10")),
+        )
+        # Voice is dropped once a new sentence would wait longer than this for synthesis
+        self.tts_budget = float(os.getenv("TTS_LATENCY_BUDGET", "2.0"))
+        self.stats = {
+            "rate_limited": 0,
+            "text_only": 0
+        }
+
+    def check_rate(self, client: str):
+        """Take one token from the client's bucket or raise Overloaded (429)"""
+        if self.rate <= 0:
+            return
+        now = time.monotonic()
+        bucket = self.buckets.get(client)
+        if bucket is None:
+            bucket = [self.burst, now]
+            self.buckets.set(client, bucket)
+        bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if bucket[0] < 1:
+            self.stats["rate_limited"] += 1
+            raise Overloaded("rate_limited", status=429, retry_after=(1 - bucket[0]) / self.rate)
+        bucket[0] -= 1
+
+    def tts_overloaded(self) -> bool:
+        """New synthesis would blow the latency budget (or cannot start yet)"""
+        if tts_service.model_status in ("loading", "failed"):
+            return True
+        return tts_service.scheduler.estimated_wait() > self.tts_budget
+
+    def voice_mode(self, version: int) -> str:
+        """Degradation applied to a new request: text_only when version 2 cannot get audio in budget"""
+        if version == 2 and self.tts_overloaded():
+            self.stats["text_only"] += 1
+            return TEXT_ONLY
+        return NORMAL
+
+    @property
+    def level(self) -> str:
+        """Current system-wide degradation level"""
+        if self.llm.saturated or self.requests.saturated:
+            return SHEDDING
+        if self.tts_overloaded():
+            return TEXT_ONLY
+        return NORMAL
+
+    def get_stats(self) -> Dict:
+        return {
+            **self.stats,
+            "level": self.level,
+            "tts_estimated_wait_ms": round(tts_service.scheduler.estimated_wait() * 1000, 1),
+            "tts_latency_budget_ms": self.tts_budget * 1000,
+            "stages": {stage.name: stage.get_stats() for stage in (self.requests, self.llm)}
+        }
+
+admission = AdmissionService()
@@ -0,0 +1,168 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+def normalize_tts_text(text: str) -> str:
+    """Canonical form of Cyrillic TTS input (the MMS tokenizer lowercases anyway)"""
+    return " ".join(unicodedata.normalize("NFC", text).lower().split())
+
+
+def audio_cache_key(text: str, model_name: str, sample_rate: int) -> str:
+    """Content hash of normalized text plus everything that changes the audio"""
+    payload = f"{model_name}|{sample_rate}|{normalize_tts_text(text)}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class AudioCache:
+    """
+    Byte-bounded LRU cache for synthesized audio (raw 16-bit PCM)
+    with an optional SQLite tier that survives restarts.
+    Workers may share one disk file, so disk_bytes is only this process's
+    estimate: the real total is re-read from the database every
+    sync_every writes and before pruning, and the limit applies to it.
+    Time Complexity: O(1) for memory get/set, O(log n) for disk lookups
+    Space Complexity: O(max_bytes) in memory, O(disk_max_bytes) on disk
+    """
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, disk_path: Optional[str] = None,
+                 disk_max_bytes: int = 512 * 1024 * 1024, sync_every: int = 32):
+        self.entries: OrderedDict[str, bytes] = OrderedDict()
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.disk_path = disk_path
+        self.disk_max_bytes = disk_max_bytes
+        self.disk_bytes = 0
+        self.sync_every = sync_every
+        self._writes = 0
+        self._lock = threading.Lock()  # used from TTS executor threads and the event loop
+        self._db: Optional[sqlite3.Connection] = None
+        self.stats = {
+            "hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "evictions": 0
+        }
+        if disk_path:
+            self._open_disk()
+            self.warm()
+
+    def _open_disk(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.disk_path)), exist_ok=True)
+        self._db = sqlite3.connect(self.disk_path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS audio ("
+            "key TEXT PRIMARY KEY, data BLOB NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS audio_last_access ON audio(last_access)")
+        self._sync_disk_bytes()
+
+    def _sync_disk_bytes(self):
+        """Total bytes on disk as stored, including rows written by other workers"""
+        self.disk_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM audio").fetchone()[0]
+
+    def warm(self):
+        """Load the most recently used disk entries into memory, up to max_bytes"""
+        if not self._db:
+            return
+        loaded = 0
+        with self._lock:
+            rows = self._db.execute("SELECT key, data FROM audio ORDER BY last_access DESC")
+            for key, data in rows:
+                if self.current_bytes + len(data) > self.max_bytes:
+                    break
+                # Oldest first in the OrderedDict, so insert at the LRU end
+                self.entries[key] = bytes(data)
+                self.entries.move_to_end(key, last=False)
+                self.current_bytes += len(data)
+                loaded += 1
+        print(f"Warmed TTS audio cache with {loaded} entries ({self.current_bytes} bytes)")
+
+    def _insert(self, key: str, data: bytes):
+        """Insert into memory and evict least recently used entries (lock held)"""
+        if key in self.entries:
+            self.current_bytes -= len(self.entries.pop(key))
+        if len(data) > self.max_bytes:
+            return
+        self.entries[key] = data
+        self.current_bytes += len(data)
+        while self.current_bytes > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.current_bytes -= len(evicted)
+            self.stats["evictions"] += 1
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            data = self.entries.get(key)
+            if data is not None:
+                self.entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return data
+            if self._db:
+                row = self._db.execute("SELECT data FROM audio WHERE key = ?", (key,)).fetchone()
+                if row:
+                    data = bytes(row[0])
+                    self._db.execute("UPDATE audio SET last_access = ? WHERE key = ?", (time.time(), key))
+                    self._insert(key, data)
+                    self.stats["disk_hits"] += 1
+                    return data
+            self.stats["misses"] += 1
+            return None
+
+    def set(self, key: str, data: bytes):
+        with self._lock:
+            self._insert(key, data)
+            if self._db:
+                old = self._db.execute("SELECT size FROM audio WHERE key = ?", (key,)).fetchone()
+                self._db.execute(
+                    "INSERT OR REPLACE INTO audio (key, data, size, last_access) VALUES (?, ?, ?, ?)",
+                    (key, data, len(data), time.time())
+                )
+                self.disk_bytes += len(data) - (old[0] if old else 0)
+                self._writes += 1
+                # Summing sizes is O(n): resync periodically, and whenever our estimate trips the limit
+                if self._writes % self.sync_every == 0 or self.disk_bytes > self.disk_max_bytes:
+                    self._sync_disk_bytes()
+                    if self.disk_bytes > self.disk_max_bytes:
+                        self._prune_disk()
+
+    def _prune_disk(self):
+        """Drop least recently used disk rows beyond disk_max_bytes (lock held)"""
+        stale = []
+        for key, size in self._db.execute("SELECT key, size FROM audio ORDER BY last_access"):
+            if self.disk_bytes <= self.disk_max_bytes:
+                break
+            stale.append((key,))
+            self.disk_bytes -= size
+        self._db.executemany("DELETE FROM audio WHERE key = ?", stale)
+
+    def get_stats(self) -> Dict:
+        total = self.stats["hits"] + self.stats["disk_hits"] + self.stats["misses"]
+        hit_rate = ((self.stats["hits"] + self.stats["disk_hits"]) / total * 100) if total > 0 else 0
+        stats = {
+            **self.stats,
+            "entries": len(self.entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hit_rate": f"{hit_rate:.1f}%"
+        }
+        if self._db:
+            with self._lock:
+                count = self._db.execute("SELECT COUNT(*) FROM audio").fetchone()[0]
+                self._sync_disk_bytes()
+            stats.update({"disk_entries": count, "disk_bytes": self.disk_bytes})
+        return stats
+
+    def clear(self):
+        """Clear both tiers"""
+        with self._lock:
+            self.entries.clear()
+            self.current_bytes = 0
+            if self._db:
+                self._db.execute("DELETE FROM audio")
+                self.disk_bytes = 0
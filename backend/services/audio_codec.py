@@ -0,0 +1,72 @@
+import io
+import struct
+from typing import Tuple
+
+import numpy as np
+
+try:
+    import soundfile  # Opus needs libsndfile >= 1.1
+except (ImportError, OSError):
+    soundfile = None
+
+MEDIA_TYPES = {
+    "wav": "audio/wav",
+    "ulaw": "audio/wav",
+    "opus": "audio/ogg",
+}
+
+
+def opus_available() -> bool:
+    return soundfile is not None and "OPUS" in soundfile.available_subtypes("OGG")
+
+
+def resample(samples: np.ndarray, rate: int, target_rate: int) -> np.ndarray:
+    """Linear-interpolation resampling of int16 mono audio (speech bandwidth only)"""
+    if target_rate == rate or samples.size == 0:
+        return samples
+    count = int(round(samples.size * target_rate / rate))
+    positions = np.linspace(0, samples.size - 1, count)
+    return np.interp(positions, np.arange(samples.size), samples).astype(np.int16)
+
+
+def mulaw_encode(samples: np.ndarray) -> bytes:
+    """G.711 mu-law: 8 bits per sample, half the size of 16-bit PCM"""
+    s = samples.astype(np.int32) >> 2  # G.711 works on 14-bit samples
+    sign = (s < 0).astype(np.int32) << 7
+    magnitude = np.minimum(np.minimum(np.abs(s), 8159) + 0x21, 0x1FFF)  # clip, bias, saturate
+    exponent = np.frexp(magnitude.astype(np.float64))[1] - 6  # highest set bit - 5, in 0..7
+    mantissa = (magnitude >> (exponent + 1)) & 0x0F
+    return (~(sign | (exponent << 4) | mantissa) & 0xFF).astype(np.uint8).tobytes()
+
+
+def _wav(payload: bytes, rate: int, format_code: int, bits: int) -> bytes:
+    """RIFF/WAVE container for mono audio (format 1 = PCM, 7 = mu-law)"""
+    block_align = bits // 8
+    fmt = struct.pack("<HHIIHH", format_code, 1, rate, rate * block_align, block_align, bits)
+    if format_code != 1:
+        fmt += struct.pack("<H", 0)  # non-PCM formats carry an extension size
+    body = b"WAVE" + b"fmt " + struct.pack("<I", len(fmt)) + fmt
+    if format_code != 1:
+        body += b"fact" + struct.pack("<II", 4, len(payload) // block_align)
+    body += b"data" + struct.pack("<I", len(payload)) + payload
+    return b"RIFF" + struct.pack("<I", len(body)) + body
+
+
+def encode_audio(pcm: bytes, rate: int, fmt: str = "wav", target_rate: int = 0) -> Tuple[bytes, str]:
+    """
+    Encode raw 16-bit mono PCM for transport
+    wav: 16-bit PCM WAV; ulaw: 8-bit mu-law WAV; opus: Ogg/Opus (needs soundfile)
+    target_rate resamples first (0 keeps the model rate).
+    Returns (encoded bytes, media type)
+    """
+    samples = np.frombuffer(pcm, dtype=np.int16)
+    if target_rate:
+        samples = resample(samples, rate, target_rate)
+        rate = target_rate
+    if fmt == "ulaw":
+        return _wav(mulaw_encode(samples), rate, 7, 8), MEDIA_TYPES[fmt]
+    if fmt == "opus":
+        buffer = io.BytesIO()
+        soundfile.write(buffer, samples, rate, format="OGG", subtype="OPUS")
+        return buffer.getvalue(), MEDIA_TYPES[fmt]
+    return _wav(samples.tobytes(), rate, 1, 16), MEDIA_TYPES["wav"]
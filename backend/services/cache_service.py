@@ -1,22 +1,27 @@
 import hashlib
+import os
 import time
-from typing import Optional, Dict
-from collections import OrderedDict
+from typing import Optional, Dict, List, Sequence, Set
+import numpy as np
+from services.storage import create_store
 
 class CacheService:
     """
     LRU Cache for Q&A pairs
+    Backed by the configured store, so with STORAGE_BACKEND=sqlite every
+    worker shares one answer cache (stats stay per process)
     Time Complexity: O(1) for get/set
     Space Complexity: O(n) where n = max_size
     """
     def __init__(self, max_size: int = 100, ttl_seconds: int = 86400):
-        self.cache: OrderedDict[str, Dict] = OrderedDict()
+        self.cache = create_store("answers", max_size)
         self.max_size = max_size
         self.ttl_seconds = ttl_seconds  # 24 hours default
         self.stats = {
             "hits": 0,
             "misses": 0,
-            "evictions": 0
+            "evictions": 0,
+            "invalidated": 0
         }
     
     def _hash_question(self, question: str) -> str:
@@ -29,44 +34,38 @@ class CacheService:
         Get cached answer for question
         Returns None if not found or expired
         """
-        key = self._hash_question(question)
-        
-        if key in self.cache:
-            entry = self.cache[key]
-            
-            # Check if expired
-            if time.time() - entry["timestamp"] > self.ttl_seconds:
-                del self.cache[key]
-                self.stats["misses"] += 1
-                return None
-            
-            # Move to end (most recently used)
-            self.cache.move_to_end(key)
-            self.stats["hits"] += 1
-            return entry["answer"]
-        
-        self.stats["misses"] += 1
-        return None
+        entry = self.cache.get(self._hash_question(question))
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+
+        self.stats["hits"] += 1
+        return entry["answer"]
     
-    def set(self, question: str, answer: str):
-        """Add question-answer pair to cache"""
+    def set(self, question: str, answer: str, chunks: Sequence[str] = ()):
+        """Add question-answer pair to cache, with the hashes of the chunks it was grounded on"""
         key = self._hash_question(question)
-        
-        # If already exists, update and move to end
-        if key in self.cache:
-            self.cache.move_to_end(key)
-        
-        # Add new entry
-        self.cache[key] = {
+        self.stats["evictions"] += self.cache.set(key, {
             "question": question,
             "answer": answer,
+            "chunks": list(chunks),
             "timestamp": time.time()
-        }
-        
-        # Evict oldest if over capacity
-        if len(self.cache) > self.max_size:
-            self.cache.popitem(last=False)  # Remove oldest (first item)
-            self.stats["evictions"] += 1
+        }, ttl=self.ttl_seconds)
+
+    def invalidate_chunks(self, stale: Set[str]) -> int:
+        """
+        Drop answers grounded on any of the stale chunks, and answers with no
+        recorded chunks (full-context answers depend on the whole knowledge base)
+        Time Complexity: O(n) over cached entries
+        """
+        removed = 0
+        for key, entry in self.cache.items():
+            chunks = entry.get("chunks")
+            if not chunks or not stale.isdisjoint(chunks):
+                self.cache.delete(key)
+                removed += 1
+        self.stats["invalidated"] += removed
+        return removed
     
     def get_stats(self) -> Dict:
         """Get cache statistics"""
@@ -83,5 +82,137 @@ class CacheService:
         """Clear entire cache"""
         self.cache.clear()
 
-# Global instance
+class SemanticCache:
+    """
+    Answer cache keyed by query embedding similarity
+    Vectors live in one preallocated, L2-normalized matrix so a lookup is a
+    single matrix-vector product instead of a Python loop over entries.
+    Each entry remembers the content hashes of the knowledge-base chunks
+    that answered it; a similar query whose best chunk is not among them is
+    rejected as a false hit, and a knowledge-base reload drops the entries
+    whose chunks changed.
+    Time Complexity: O(n * d) per lookup (one BLAS call)
+    Space Complexity: O(max_size * d)
+    """
+    def __init__(self, max_size: int = 500, threshold: float = 0.92, ttl_seconds: int = 86400):
+        self.max_size = max_size
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.vectors: Optional[np.ndarray] = None  # allocated on first add, once dimension is known
+        self.timestamps = np.zeros(max_size, dtype=np.float64)
+        self.last_used = np.zeros(max_size, dtype=np.float64)
+        self.answers: List[Optional[str]] = [None] * max_size
+        self.questions: List[Optional[str]] = [None] * max_size
+        self.chunk_ids: List[frozenset] = [frozenset()] * max_size
+        self.size = 0
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "false_hits": 0,
+            "evictions": 0,
+            "invalidated": 0
+        }
+        self.similarity_sum = 0.0  # over hits, to watch how close to the threshold we serve
+
+    @staticmethod
+    def _normalize(vector: np.ndarray) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def get(self, query_embedding: np.ndarray, top_chunks: Sequence[str] = ()) -> Optional[str]:
+        """
+        Return the cached answer of the most similar stored query, if it is
+        above the threshold, not expired and backed by the same best chunk
+        """
+        if self.size == 0:
+            self.stats["misses"] += 1
+            return None
+
+        query = self._normalize(query_embedding)
+        similarities = self.vectors[:self.size] @ query
+        similarities[time.time() - self.timestamps[:self.size] > self.ttl_seconds] = -1.0
+        best = int(np.argmax(similarities))
+        score = float(similarities[best])
+
+        if score < self.threshold:
+            self.stats["misses"] += 1
+            return None
+        if top_chunks and self.chunk_ids[best] and top_chunks[0] not in self.chunk_ids[best]:
+            # Similar wording, different facts (e.g. phone vs email): do not serve
+            self.stats["false_hits"] += 1
+            self.stats["misses"] += 1
+            return None
+
+        self.last_used[best] = time.time()
+        self.stats["hits"] += 1
+        self.similarity_sum += score
+        return self.answers[best]
+
+    def set(self, query_embedding: np.ndarray, question: str, answer: str, top_chunks: Sequence[str] = ()):
+        """Store an answer under its query vector, evicting the least recently used slot when full"""
+        vector = self._normalize(query_embedding)
+        if self.vectors is None or self.vectors.shape[1] != vector.shape[0]:
+            self.vectors = np.zeros((self.max_size, vector.shape[0]), dtype=np.float32)
+            self.size = 0
+
+        if self.size < self.max_size:
+            slot = self.size
+            self.size += 1
+        else:
+            slot = int(np.argmin(self.last_used))
+            self.stats["evictions"] += 1
+
+        now = time.time()
+        self.vectors[slot] = vector
+        self.timestamps[slot] = now
+        self.last_used[slot] = now
+        self.answers[slot] = answer
+        self.questions[slot] = question
+        self.chunk_ids[slot] = frozenset(top_chunks)
+
+    def invalidate_chunks(self, stale: Set[str]) -> int:
+        """
+        Drop entries grounded on any of the stale chunks (or on none recorded),
+        compacting the survivors to the front of the matrix
+        Time Complexity: O(n * d)
+        """
+        keep = [slot for slot in range(self.size) if self.chunk_ids[slot] and self.chunk_ids[slot].isdisjoint(stale)]
+        removed = self.size - len(keep)
+        if not removed:
+            return 0
+        count = len(keep)
+        for array in (self.vectors, self.timestamps, self.last_used):
+            array[:count] = array[keep]
+        self.last_used[count:] = 0
+        for values in (self.answers, self.questions, self.chunk_ids):
+            values[:count] = [values[slot] for slot in keep]
+        self.size = count
+        self.stats["invalidated"] += removed
+        return removed
+
+    def get_stats(self) -> Dict:
+        total = self.stats["hits"] + self.stats["misses"]
+        hit_rate = (self.stats["hits"] / total * 100) if total > 0 else 0
+        candidates = self.stats["hits"] + self.stats["false_hits"]
+        false_hit_rate = (self.stats["false_hits"] / candidates * 100) if candidates > 0 else 0
+        avg_similarity = self.similarity_sum / self.stats["hits"] if self.stats["hits"] else 0
+        return {
+            **self.stats,
+            "cache_size": self.size,
+            "threshold": self.threshold,
+            "hit_rate": f"{hit_rate:.1f}%",
+            "false_hit_rate": f"{false_hit_rate:.1f}%",
+            "avg_hit_similarity": round(avg_similarity, 4)
+        }
+
+    def clear(self):
+        self.size = 0
+        self.last_used[:] = 0
+
+# Global instances
 cache_service = CacheService()
+semantic_cache = SemanticCache(
+    max_size=int(os.getenv("SEMANTIC_CACHE_SIZE", "500")),
+    threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92")),
+)
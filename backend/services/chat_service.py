@@ -0,0 +1,127 @@
+import time
+from typing import List, Optional, Set, Tuple
+from services.llm_service import llm_service
+from services.transliteration import transliterate_to_cyrillic, transliterate_to_latin, is_cyrillic
+from services.rag_service import rag_service
+from services.cache_service import cache_service, semantic_cache
+from services.conversation_service import conversation_service
+from services.single_flight import SingleFlight
+from services.metrics import metrics
+from services.admission import admission
+from services.fact_store import fact_store
+
+class ChatService:
+    """
+    Question -> answer pipeline shared by the endpoints and the warm-up job:
+    exact cache, semantic cache, retrieval, LLM and cache fill
+    """
+    def __init__(self):
+        # Concurrent identical questions share one retrieval + LLM call
+        self.flight = SingleFlight("answers")
+        rag_service.reload_listeners.append(self.invalidate_answers)
+
+    def normalize_question(self, user_message: str) -> str:
+        """
+        Questions typed in Cyrillic are converted to Latin, the script of the
+        knowledge base, prompts and caches, so both spellings share one answer
+        """
+        if not is_cyrillic(user_message):
+            return user_message
+        with metrics.stage("transliteration"):
+            return transliterate_to_latin(user_message)
+
+    async def lookup_answer(self, user_message: str):
+        """
+        Fact fast path first (a template answer from the knowledge base's
+        literal fields, no LLM), then exact cache, then semantic cache on the query embedding.
+        Returns (answer, query_embedding, top_chunks); on a miss top_chunks
+        are the retrieved context, so the query is embedded and searched once.
+        top_chunks are content hashes, so they stay valid across reloads.
+        """
+        with metrics.stage("fact_lookup"):
+            fact = fact_store.answer(user_message)
+        if fact:
+            print(f"[FACT] {user_message[:50]}...")
+            return fact, None, []
+
+        started = time.perf_counter()
+        cached_answer = cache_service.get(user_message)
+        lookup_seconds = time.perf_counter() - started
+        if cached_answer:
+            metrics.observe("cache_lookup", lookup_seconds)
+            print(f"[CACHE HIT] {user_message[:50]}...")
+            return cached_answer, None, []
+
+        query_embedding = await rag_service.embed_query(user_message)
+        if query_embedding is None:
+            metrics.observe("cache_lookup", lookup_seconds)
+            print(f"[CACHE MISS] {user_message[:50]}...")
+            # No semantic cache without embeddings; BM25 still picks the context
+            return None, None, rag_service.chunk_ids(rag_service.search(user_message))
+
+        top_chunks = rag_service.chunk_ids(rag_service.search(user_message, query_embedding))
+        started = time.perf_counter()
+        cached_answer = semantic_cache.get(query_embedding, top_chunks)
+        # Exact plus semantic lookup; embedding and retrieval are stages of their own
+        metrics.observe("cache_lookup", lookup_seconds + time.perf_counter() - started)
+        if cached_answer:
+            print(f"[SEMANTIC HIT] {user_message[:50]}...")
+            cache_service.set(user_message, cached_answer, top_chunks)  # exact hit next time
+            return cached_answer, query_embedding, top_chunks
+
+        print(f"[CACHE MISS] {user_message[:50]}...")
+        return None, query_embedding, top_chunks
+
+    def remember_answer(self, user_message: str, answer: str, query_embedding, top_chunks: List[str]):
+        """Store a fresh answer in the exact and semantic caches"""
+        if not rag_service.has_chunks(top_chunks):
+            return  # the knowledge base was reloaded while this answer was generated
+        cache_service.set(user_message, answer, top_chunks)
+        if query_embedding is not None:
+            semantic_cache.set(query_embedding, user_message, answer, top_chunks)
+
+    def invalidate_answers(self, stale: Set[str]):
+        """Reload listener: drop cached answers grounded on removed or changed chunks"""
+        exact = cache_service.invalidate_chunks(stale)
+        semantic = semantic_cache.invalidate_chunks(stale)
+        print(f"Invalidated {exact} cached answers and {semantic} semantic cache entries")
+
+    async def _compute_answer(self, user_message: str, session_id: Optional[str],
+                              version: int) -> Tuple[str, Optional[str], bool]:
+        cached_answer, query_embedding, top_chunks = await self.lookup_answer(user_message)
+        if cached_answer:
+            cyrillic = None
+            if version == 2:
+                with metrics.stage("transliteration"):
+                    cyrillic = transliterate_to_cyrillic(cached_answer)
+            return cached_answer, cyrillic, True
+
+        # The lookup already retrieved the chunks
+        context = rag_service.context_for(top_chunks)
+        history = conversation_service.get_history(session_id) if session_id else []
+
+        # Always returns Latin text now, we handle Cyrillic internally for TTS
+        async with admission.llm.slot():  # bounded; raises Overloaded when the queue is full
+            result = await llm_service.get_response(user_message, context, history, version=version)
+        response_text = result['text']
+
+        # Cache the result (text only)
+        self.remember_answer(user_message, response_text, query_embedding, top_chunks)
+        return response_text, result.get('cyrillic'), False
+
+    async def answer(self, user_message: str, session_id: Optional[str] = None,
+                     version: int = 1) -> Tuple[str, Optional[str], bool]:
+        """
+        Cache lookup, retrieval and LLM call for one question, coalesced
+        across concurrent requests for the same normalized question (across
+        sessions only while the asking session has no history)
+        Returns (response_text, cyrillic_text or None, cached)
+        Raises LLMError when the LLM fails; nothing is cached then.
+        """
+        flight_key = f"{version}:{cache_service._hash_question(user_message)}"
+        if session_id and conversation_service.get_history(session_id):
+            # The prompt carries this session's history ("Uning manzili?"), so only its own calls may share it
+            flight_key = f"{flight_key}:{session_id}"
+        return await self.flight.do(flight_key, lambda: self._compute_answer(user_message, session_id, version))
+
+chat_service = ChatService()
@@ -1,68 +1,151 @@
-from typing import Dict, List
+from typing import Dict, List, Optional
+import asyncio
+import os
+import sys
 import uuid
 import time
+from services.storage import create_store
+
+class Message:
+    """One conversation turn; __slots__ keeps it to two references"""
+    __slots__ = ("role", "content")
+
+    def __init__(self, role: str, content: str):
+        self.role = role
+        self.content = content
+
+    def to_dict(self) -> Dict:
+        return {"role": self.role, "content": self.content}
+
+class Session:
+    """Bounded message history of one browser session"""
+    __slots__ = ("messages", "last_activity", "nbytes")
+
+    def __init__(self, messages: Optional[List[Message]] = None, last_activity: Optional[float] = None):
+        self.messages = messages or []
+        self.last_activity = last_activity or time.time()
+        self.nbytes = sum(_message_size(m) for m in self.messages)
+
+    def to_state(self) -> Dict:
+        """JSON-compatible form for shared storage"""
+        return {"messages": [[m.role, m.content] for m in self.messages], "last_activity": self.last_activity}
+
+    @classmethod
+    def from_state(cls, state: Dict) -> "Session":
+        return cls([Message(role, content) for role, content in state["messages"]], state["last_activity"])
+
+_SESSION_OVERHEAD = sys.getsizeof(Session()) + sys.getsizeof([]) + 64  # object, list, store entry
+
+def _message_size(message: Message) -> int:
+    """Approximate resident bytes of one message (object plus its content string)"""
+    return sys.getsizeof(message) + sys.getsizeof(message.content)
+
+def _session_size(session: Session) -> int:
+    return _SESSION_OVERHEAD + session.nbytes
 
 class ConversationService:
     """
     Manages conversation history per session
-    Time Complexity: O(1) for operations
-    Space Complexity: O(s * m) where s = sessions, m = max_messages
+    Sessions live in the configured store (shared across workers with
+    STORAGE_BACKEND=sqlite) with a sliding TTL of session_timeout.
+    A background sweeper purges idle sessions, and the store evicts the
+    least recently active ones beyond max_sessions or max_bytes, so memory
+    stays flat no matter how many tabs are abandoned.
+    Time Complexity: O(1) for operations, O(s) per sweep
+    Space Complexity: O(min(s * m, max_bytes)) where s = sessions, m = max_messages
     """
-    def __init__(self, max_messages: int = 5, session_timeout: int = 1800):
-        self.sessions: Dict[str, Dict] = {}
+    def __init__(self, max_messages: int = 5, session_timeout: int = 1800,
+                 max_sessions: int = 10000, max_bytes: int = 32 * 1024 * 1024,
+                 sweep_interval: float = 60):
+        self.sessions = create_store(
+            "sessions", max_size=max_sessions, max_bytes=max_bytes,
+            sizeof=_session_size, encode=Session.to_state, decode=Session.from_state
+        )
         self.max_messages = max_messages
         self.session_timeout = session_timeout  # 30 minutes
-    
-    def create_session(self) -> str:
-        """Create new session and return session ID"""
-        session_id = str(uuid.uuid4())
-        self.sessions[session_id] = {
-            "messages": [],
-            "last_activity": time.time()
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        self._sweeper: Optional[asyncio.Task] = None
+        self.stats = {
+            "created": 0,
+            "evicted": 0,
+            "expired": 0,
+            "sweeps": 0
         }
+
+    def create_session(self, session_id: Optional[str] = None) -> str:
+        """Create new session (under the given ID if any) and return session ID"""
+        session_id = session_id or str(uuid.uuid4())
+        self.stats["created"] += 1
+        self.stats["evicted"] += self.sessions.set(session_id, Session(), ttl=self.session_timeout)
         return session_id
-    
+
     def add_message(self, session_id: str, role: str, content: str):
-        """Add message to session history"""
-        if session_id not in self.sessions:
-            session_id = self.create_session()
-        
-        session = self.sessions[session_id]
-        session["messages"].append({
-            "role": role,
-            "content": content
-        })
-        
+        """Add message to session history (an expired or unknown session restarts under the same ID)"""
+        session = self.sessions.get(session_id) or Session()
+
+        message = Message(role, content)
+        session.messages.append(message)
+        session.nbytes += _message_size(message)
+
         # Keep only last N messages
-        if len(session["messages"]) > self.max_messages * 2:  # *2 for user+assistant pairs
-            session["messages"] = session["messages"][-self.max_messages * 2:]
-        
-        session["last_activity"] = time.time()
-    
+        while len(session.messages) > self.max_messages * 2:  # *2 for user+assistant pairs
+            session.nbytes -= _message_size(session.messages.pop(0))
+
+        session.last_activity = time.time()
+        self.stats["evicted"] += self.sessions.set(session_id, session, ttl=self.session_timeout)
+
     def get_history(self, session_id: str) -> List[Dict]:
         """Get conversation history for session"""
-        if session_id not in self.sessions:
-            return []
-        
-        session = self.sessions[session_id]
-        
-        # Check if expired
-        if time.time() - session["last_activity"] > self.session_timeout:
-            del self.sessions[session_id]
+        # The store drops sessions idle longer than session_timeout
+        session = self.sessions.get(session_id)
+        if session is None:
             return []
-        
-        return session["messages"]
-    
-    def cleanup_expired(self):
+
+        return [m.to_dict() for m in session.messages]
+
+    def cleanup_expired(self) -> int:
         """Remove expired sessions"""
-        current_time = time.time()
-        expired = [
-            sid for sid, session in self.sessions.items()
-            if current_time - session["last_activity"] > self.session_timeout
-        ]
-        
-        for sid in expired:
-            del self.sessions[sid]
+        removed = self.sessions.purge_expired()
+        self.stats["expired"] += removed
+        self.stats["sweeps"] += 1
+        return removed
+
+    async def _sweep(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                removed = self.cleanup_expired()
+                if removed:
+                    print(f"Swept {removed} expired sessions")
+            except Exception as e:
+                print(f"Session sweep failed: {e}")
+
+    def start_sweeper(self):
+        """Start the periodic expiry sweep on the running event loop"""
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.get_running_loop().create_task(self._sweep())
+
+    def stop_sweeper(self):
+        if self._sweeper:
+            self._sweeper.cancel()
+            self._sweeper = None
+
+    def get_stats(self) -> Dict:
+        """Session counts and approximate memory footprint"""
+        return {
+            **self.stats,
+            "active_sessions": len(self.sessions),
+            "bytes": self.sessions.nbytes,
+            "max_sessions": self.max_sessions,
+            "max_bytes": self.max_bytes,
+            "session_timeout": self.session_timeout
+        }
 
 # Global instance
-conversation_service = ConversationService()
+conversation_service = ConversationService(
+    max_sessions=int(os.getenv("SESSION_MAX_COUNT", "10000")),
+    max_bytes=int(os.getenv("SESSION_MAX_BYTES", str(32 * 1024 * 1024))),
+    sweep_interval=float(os.getenv("SESSION_SWEEP_INTERVAL", "60")),
+)
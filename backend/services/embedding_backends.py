@@ -0,0 +1,107 @@
+import os
+import re
+import zlib
+from typing import List, Optional
+from urllib.parse import urlparse
+
+import numpy as np
+
+from services.text_utils import normalize_uzbek
+
+try:
+    from openai import AsyncOpenAI
+except ImportError:
+    AsyncOpenAI = None
+
+_WORD = re.compile(r"[\w']+")
+
+
+class OpenAIEmbeddingBackend:
+    """Remote embeddings via the OpenAI API (one network round trip per call)"""
+    persistent = True  # worth caching on disk
+
+    def __init__(self, client, model: str = "text-embedding-3-small", base_url: Optional[str] = None):
+        self.client = client
+        self.model = model
+        # Vectors from another endpoint (a proxy, a local stub) must not share the on-disk store
+        host = urlparse(base_url).netloc if base_url else ""
+        self.name = f"{model}@{host}" if host else model
+
+    def fit(self, texts: List[str]):
+        """Nothing to fit for a pretrained remote model"""
+
+    async def embed(self, texts: List[str]) -> Optional[np.ndarray]:
+        """
+        Returns: numpy array of shape (n_texts, embedding_dim), or None on error
+        """
+        try:
+            response = await self.client.embeddings.create(model=self.model, input=texts)
+            return np.array([item.embedding for item in response.data], dtype=np.float32)
+        except Exception as e:
+            print(f"Embedding error: {e}")
+            return None
+
+
+class HashingEmbeddingBackend:
+    """
+    Local CPU embeddings: hashed word + character n-gram TF-IDF
+    Fit on the knowledge-base chunks at startup; embedding a query is a few
+    hundred hash lookups, so retrieval needs no network and works with any
+    LLM provider. Character n-grams make it robust to Uzbek suffixes.
+    Time Complexity: O(L) per text where L = text length
+    Space Complexity: O(dim)
+    """
+    persistent = False  # IDF depends on the current chunks; refitting is sub-millisecond
+
+    def __init__(self, dim: int = 2048, ngram_range: tuple = (3, 5)):
+        self.dim = dim
+        self.ngram_range = ngram_range
+        self.name = f"local-hashing-{dim}"
+        self.idf = np.ones(dim, dtype=np.float32)
+
+    def _features(self, text: str) -> np.ndarray:
+        """Hashed feature ids of one text (words and padded char n-grams)"""
+        grams = []
+        low, high = self.ngram_range
+        for word in _WORD.findall(normalize_uzbek(text)):
+            grams.append(word)
+            padded = f" {word} "
+            for n in range(low, high + 1):
+                grams.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+        return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.int64, count=len(grams)) % self.dim
+
+    def _counts(self, texts: List[str]) -> np.ndarray:
+        counts = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            counts[row] = np.bincount(self._features(text), minlength=self.dim)
+        return counts
+
+    def fit(self, texts: List[str]):
+        """Learn IDF weights from the knowledge-base chunks"""
+        document_frequency = (self._counts(texts) > 0).sum(axis=0)
+        self.idf = (np.log((1 + len(texts)) / (1 + document_frequency)) + 1).astype(np.float32)
+
+    async def embed(self, texts: List[str]) -> Optional[np.ndarray]:
+        vectors = np.log1p(self._counts(texts)) * self.idf
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms > 0, norms, 1)
+
+
+def create_embedding_backend():
+    """
+    Pick the embedding backend from EMBEDDING_BACKEND (openai | local | auto)
+    auto uses OpenAI when it is the configured provider, otherwise local
+    """
+    kind = os.getenv("EMBEDDING_BACKEND", "auto")
+    api_key = os.getenv("EMBEDDING_API_KEY") or os.getenv("LLM_API_KEY")
+    openai_ready = AsyncOpenAI is not None and bool(api_key)
+    if kind == "auto":
+        kind = "openai" if openai_ready and os.getenv("LLM_PROVIDER") == "openai" else "local"
+
+    if kind == "openai" and openai_ready:
+        client = AsyncOpenAI(api_key=api_key, base_url=os.getenv("LLM_BASE_URL"))
+        return OpenAIEmbeddingBackend(client, os.getenv("EMBEDDING_MODEL", "text-embedding-3-small"),
+                                      base_url=os.getenv("LLM_BASE_URL"))
+    if kind == "openai":
+        print("Warning: OpenAI embeddings requested but not available. Using local embeddings.")
+    return HashingEmbeddingBackend(dim=int(os.getenv("LOCAL_EMBEDDING_DIM", "2048")))
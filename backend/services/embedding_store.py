@@ -0,0 +1,93 @@
+import hashlib
+import json
+import os
+import re
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, last writer wins
+    fcntl = None
+
+
+def chunk_hash(text: str) -> str:
+    """Content address of a knowledge-base chunk"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """
+    On-disk embedding index, content-addressed by chunk hash
+    Rows live in a single .npy file that is memory-mapped on load, so
+    startup is zero-copy and every worker process shares the same pages.
+    A JSON sidecar maps row order to chunk hashes for one embedding model.
+    Time Complexity: O(n) to map hashes to rows on load
+    Space Complexity: O(n * d) on disk, O(1) resident until pages are touched
+    """
+    def __init__(self, directory: str, model_name: str, dtype: str = "float32"):
+        self.directory = directory
+        self.model_name = model_name
+        self.dtype = np.dtype(dtype)
+        safe_name = re.sub(r"[^A-Za-z0-9_.-]", "_", model_name)
+        self.matrix_path = os.path.join(directory, f"{safe_name}.npy")
+        self.index_path = os.path.join(directory, f"{safe_name}.json")
+        self.lock_path = os.path.join(directory, f"{safe_name}.lock")
+
+    def acquire_lock(self):
+        """Exclusive lock so only one worker embeds and writes at a time (blocking)"""
+        os.makedirs(self.directory, exist_ok=True)
+        handle = open(self.lock_path, "w")
+        if fcntl:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        return handle
+
+    def release_lock(self, handle):
+        if fcntl:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+        handle.close()
+
+    def load(self, hashes: List[str]) -> Tuple[Optional[np.ndarray], List[int]]:
+        """
+        Look up embeddings for the given chunk hashes
+        Returns (matrix with one row per hash, or None if nothing is stored;
+        positions of hashes that still need embedding, whose rows are zero)
+        """
+        if not (os.path.exists(self.matrix_path) and os.path.exists(self.index_path)):
+            return None, list(range(len(hashes)))
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                stored_hashes = json.load(f)["hashes"]
+            stored = np.load(self.matrix_path, mmap_mode="r")
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Embedding store unreadable, rebuilding: {e}")
+            return None, list(range(len(hashes)))
+
+        if stored.shape[0] != len(stored_hashes):
+            return None, list(range(len(hashes)))  # caught between the two renames of a writer
+        if stored_hashes == hashes:
+            return stored, []  # unchanged knowledge base: the mapped file itself
+
+        rows = {h: i for i, h in enumerate(stored_hashes)}
+        matrix = np.zeros((len(hashes), stored.shape[1]), dtype=stored.dtype)
+        missing = []
+        for position, h in enumerate(hashes):
+            if h in rows:
+                matrix[position] = stored[rows[h]]
+            else:
+                missing.append(position)
+        return matrix, missing
+
+    def save(self, hashes: List[str], matrix: np.ndarray):
+        """Atomically replace the stored index with exactly these rows"""
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_matrix = f"{self.matrix_path}.{os.getpid()}.tmp"
+        tmp_index = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp_matrix, "wb") as f:
+            np.save(f, np.ascontiguousarray(matrix, dtype=self.dtype))
+        with open(tmp_index, "w", encoding="utf-8") as f:
+            json.dump({"model": self.model_name, "dtype": self.dtype.name, "hashes": hashes}, f)
+        # Readers may map the old file meanwhile; os.replace keeps their view valid
+        os.replace(tmp_matrix, self.matrix_path)
+        os.replace(tmp_index, self.index_path)
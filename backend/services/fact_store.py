@@ -0,0 +1,150 @@
+import re
+from typing import Dict, List, Optional, Set, Tuple
+from services.rag_service import rag_service
+from services.text_utils import normalize_uzbek
+from services.transliteration import transliterate_to_cyrillic
+
+_WORD = re.compile(r"[\w']+")
+_LIST_ITEM = re.compile(r"^\s*\d+\.\s*")
+# Markup TTS would read aloud: emphasis and heading markers, bullets, and spaced dashes
+# ("Defektologiya - Kunduzgi"); hyphens inside words and numbers ("1-uy", "404-55-55") stay
+_MARKUP = re.compile(r"\*+|__|^\s*#+\s*|^\s*[-–—•]\s+", re.M)
+_SPACED_DASH = re.compile(r"\s+[-–—]\s+")
+
+# name -> (question word stems, template over knowledge-base fields)
+# A template field is a "Field: value" key, or a list section title, normalized
+INTENTS: Dict[str, Tuple[List[str], str]] = {
+    "contact": (["aloqa", "kontakt", "bog'lan"],
+                "ATMU bilan bog'lanish: telefon {telefon}, email {email}, veb-sayt {veb-sayt}"),
+    "phone": (["telefon", "raqam", "nomer", "qo'ng'iroq"], "ATMU telefon raqami: {telefon}."),
+    "email": (["email", "mail", "pochta", "elektron"], "ATMU elektron pochtasi: {email}."),
+    "website": (["sayt", "veb", "web"], "ATMU rasmiy veb-sayti: {veb-sayt}"),
+    "address": (["manzil", "adres", "joylash", "qayer", "qaer", "lokatsiya", "mo'ljal"],
+                "ATMU manzili: {joylashuvi}. Mo'ljal: {mo'ljal}."),
+    "founded": (["tashkil", "asos", "ochilgan"], "ATMU {tashkil etilgan yili}da tashkil etilgan."),
+    "faculties": (["fakultet", "yo'nalish", "mutaxassislik"],
+                  "ATMUda quyidagi ta'lim yo'nalishlari mavjud: {mavjud yo'nalishlar}."),
+    "name": (["nomi"], "Universitetning to'liq nomi: {nomi}."),
+}
+
+# Words that narrow one intent but never ask anything on their own ("Qaysi yil?" has no subject)
+QUALIFIERS: Dict[str, Tuple[List[str], str]] = {
+    "year": (["yil"], "founded"),
+}
+
+# Words that may surround an intent word without changing what is asked:
+# stems take any suffix, short words only match exactly ("mi" must not cover "mingta").
+# No pronouns: "Uning telefoni?" may refer back to whatever the session talked about last
+FILLER_STEMS = [
+    "atmu", "univer", "oliygoh", "institut", "qanday", "qanaqa", "qaysi", "qachon", "nima",
+    "necha", "qancha", "ayt", "ber", "kerak", "bilmoqchi", "ma'lumot", "haqida", "etilgan",
+    "bo'lgan", "solingan", "iltimos",
+]
+FILLER_WORDS = [
+    "bor", "bormi", "bilsam", "menga", "sizning", "sizlarning", "va", "ham", "edi", "mi", "etgan",
+    "bo'ladi", "qilib", "e", "the", "what", "is",
+]
+
+
+class FactStore:
+    """
+    Literal facts parsed from the knowledge base plus a fast intent matcher
+    Every "Field: value" line becomes a fact and every numbered section a
+    list; intents render template answers from them. A question is answered
+    here, without embedding, retrieval or the LLM, only when all of its
+    words are one intent's words or filler (so "rektorning telefoni" still
+    goes to the LLM); qualifier words count only beside their own intent.
+    Answers keep the knowledge base's text, minus markup TTS would read
+    aloud. Word stems of every intent are compiled into one regex with a
+    named group per intent, in Latin and Cyrillic spelling.
+    Rebuilt on every knowledge-base reload.
+    Time Complexity: O(w) per question where w = number of words
+    """
+    def __init__(self, max_words: int = 10):
+        self.max_words = max_words
+        self.facts: Dict[str, str] = {}
+        self.lists: Dict[str, List[str]] = {}
+        self.answers: Dict[str, str] = {}
+        self.stats = {"matched": 0, "missed": 0, "intents": {}}
+        alternatives = [f"(?P<{name}>(?:{self._forms(stems)})[\\w']*)"
+                        for name, (stems, _) in {**INTENTS, **QUALIFIERS}.items()]
+        alternatives.append(f"(?P<filler>(?:{self._forms(FILLER_STEMS)})[\\w']*|{self._forms(FILLER_WORDS)})")
+        # Matched per word with fullmatch; the first alternative that covers the whole word wins
+        self._pattern = re.compile("|".join(alternatives))
+        self.build(rag_service.chunks)
+        rag_service.reload_listeners.append(lambda stale: self.build(rag_service.chunks))
+
+    @staticmethod
+    def _forms(stems: List[str]) -> str:
+        forms = set()
+        for stem in stems:
+            forms.add(stem)
+            forms.add(normalize_uzbek(transliterate_to_cyrillic(stem)))
+        return "|".join(re.escape(form) for form in sorted(forms, key=len, reverse=True))
+
+    def build(self, chunks: List[str]):
+        """Parse facts and lists from the chunks and render every intent's answer"""
+        facts, lists = {}, {}
+        for chunk in chunks:
+            lines = chunk.splitlines()
+            items = [_LIST_ITEM.sub("", line).strip() for line in lines[1:] if _LIST_ITEM.match(line)]
+            if items:
+                title = re.sub(r"\(.*?\)", "", lines[0]).strip().rstrip(":").strip()
+                lists[normalize_uzbek(title)] = items
+            for line in lines:
+                field, sep, value = line.partition(":")
+                field = field.strip()
+                if sep and value.strip() and 0 < len(field) <= 30 and not field[0].isdigit():
+                    facts[normalize_uzbek(field)] = value.strip()
+
+        values = {**facts, **{title: "; ".join(items) for title, items in lists.items()}}
+        answers = {}
+        for name, (_, template) in INTENTS.items():
+            fields = re.findall(r"\{(.*?)\}", template)
+            if all(field in values for field in fields):  # renamed or removed fields disable the intent
+                answer = re.sub(r"\{(.*?)\}", lambda m: values[m.group(1)].rstrip("."), template)
+                answers[name] = _SPACED_DASH.sub(", ", _MARKUP.sub("", answer)).strip()
+        self.facts, self.lists, self.answers = facts, lists, answers
+
+    def match(self, question: str) -> Optional[str]:
+        """The single intent the question asks for, or None if it is not a confident match"""
+        words = _WORD.findall(normalize_uzbek(question))
+        if not words or len(words) > self.max_words:
+            return None
+        intents: Set[str] = set()
+        for word in words:
+            match = self._pattern.fullmatch(word)
+            if match is None:
+                return None  # a word we cannot account for: leave it to RAG + LLM
+            if match.lastgroup != "filler":
+                intents.add(match.lastgroup)
+        if len(intents) == 2 and intents & {"email", "website"}:
+            intents.discard("address")  # "email manzili", "veb-sayt manzili": the channel's address
+        for qualifier, (_, intent) in QUALIFIERS.items():
+            if qualifier in intents:
+                intents.discard(qualifier)
+                if intents != {intent}:
+                    return None  # alone, or qualifying another intent
+        return intents.pop() if len(intents) == 1 else None
+
+    def answer(self, question: str) -> Optional[str]:
+        """Template answer for a confidently matched intent, else None"""
+        intent = self.match(question)
+        answer = self.answers.get(intent) if intent else None
+        if answer is None:
+            self.stats["missed"] += 1
+            return None
+        self.stats["matched"] += 1
+        self.stats["intents"][intent] = self.stats["intents"].get(intent, 0) + 1
+        return answer
+
+    def get_stats(self) -> Dict:
+        total = self.stats["matched"] + self.stats["missed"]
+        return {
+            **self.stats,
+            "facts": len(self.facts),
+            "answerable_intents": sorted(self.answers),
+            "match_rate": f"{self.stats['matched'] / total * 100:.1f}%" if total else "0.0%"
+        }
+
+fact_store = FactStore()
@@ -0,0 +1,71 @@
+import re
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from services.text_utils import normalize_uzbek
+
+_WORD = re.compile(r"[\w']+")
+# Common Uzbek inflectional suffixes, longest first; stripped so that
+# "fakultetlari", "fakultetlar" and "fakultet" share one index term
+_SUFFIXES = sorted([
+    "larimiz", "laringiz", "larning", "lardan", "larga", "larda", "larni", "lari", "lar",
+    "ning", "dagi", "dan", "dir", "ni", "ga", "ka", "qa", "da", "ta", "mi", "si", "i",
+], key=len, reverse=True)
+
+
+def tokenize(text: str) -> List[str]:
+    """Normalized, lightly stemmed terms of Latin or Cyrillic Uzbek text"""
+    terms = []
+    for word in _WORD.findall(normalize_uzbek(text)):
+        for suffix in _SUFFIXES:
+            if len(word) - len(suffix) >= 3 and word.endswith(suffix):
+                word = word[:-len(suffix)]
+                break
+        terms.append(word)
+    return terms
+
+
+class BM25Index:
+    """
+    Inverted index with Okapi BM25 scoring over knowledge-base chunks
+    Postings are precomputed numpy arrays, so scoring a query only touches
+    the documents that contain its terms.
+    Time Complexity: O(sum of posting list lengths) per query
+    Space Complexity: O(total terms in the corpus)
+    """
+    def __init__(self, documents: List[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.size = len(documents)
+        self.postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+
+        doc_terms = [tokenize(doc) for doc in documents]
+        lengths = np.array([len(terms) for terms in doc_terms], dtype=np.float32)
+        avg_length = lengths.mean() if self.size else 0.0
+        # Per-document length normalization is query independent: precompute it
+        self.length_norm = k1 * (1 - b + b * lengths / avg_length) if avg_length else np.full(self.size, k1)
+
+        raw: Dict[str, Dict[int, int]] = {}
+        for doc_id, terms in enumerate(doc_terms):
+            for term in terms:
+                counts = raw.setdefault(term, {})
+                counts[doc_id] = counts.get(doc_id, 0) + 1
+        self.idf: Dict[str, float] = {}
+        for term, counts in raw.items():
+            self.postings[term] = (
+                np.fromiter(counts.keys(), dtype=np.int32, count=len(counts)),
+                np.fromiter(counts.values(), dtype=np.float32, count=len(counts)),
+            )
+            self.idf[term] = float(np.log(1 + (self.size - len(counts) + 0.5) / (len(counts) + 0.5)))
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every document for the query (zeros where no term matches)"""
+        scores = np.zeros(self.size, dtype=np.float32)
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            doc_ids, tf = posting
+            scores[doc_ids] += self.idf[term] * tf * (self.k1 + 1) / (tf + self.length_norm[doc_ids])
+        return scores
@@ -0,0 +1,151 @@
+import json
+import os
+from typing import AsyncIterator, Dict, List, Optional
+
+import httpx
+
+try:
+    from openai import AsyncOpenAI
+except ImportError:
+    AsyncOpenAI = None
+
+GEMINI_BASE_URL = "https://generativelanguage.googleapis.com"
+
+
+def _pooled_client(**kwargs) -> httpx.AsyncClient:
+    """
+    Keep-alive connection pool shared by every request to one provider, so a
+    request reuses a warm TLS connection instead of opening a new one
+    """
+    size = int(os.getenv("LLM_POOL_SIZE", "20"))
+    return httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=size, max_keepalive_connections=size, keepalive_expiry=60),
+        timeout=httpx.Timeout(float(os.getenv("LLM_TIMEOUT", "30")), connect=5),
+        **kwargs,
+    )
+
+
+class OpenAIProvider:
+    """Chat completions over a pooled AsyncOpenAI client"""
+    name = "openai"
+
+    def __init__(self, api_key: str, base_url: Optional[str] = None, model: str = "gpt-4o-mini"):
+        self.model = model
+        # Retries, hedging and fallback are the router's job; SDK retries would hide slow attempts
+        self.client = AsyncOpenAI(api_key=api_key, base_url=base_url, max_retries=0, http_client=_pooled_client())
+
+    async def complete(self, messages: List[Dict]) -> str:
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=0.8,
+            max_tokens=400,
+        )
+        return response.choices[0].message.content
+
+    async def stream(self, messages: List[Dict]) -> AsyncIterator[str]:
+        stream = await self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=0.8,
+            max_tokens=400,
+            stream=True,
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+class GeminiProvider:
+    """
+    Gemini generateContent over REST on a pooled httpx client
+    Chat messages are converted to Gemini contents with the same history the
+    OpenAI path sends (see to_gemini_request).
+    """
+    name = "gemini"
+
+    def __init__(self, api_key: str, base_url: Optional[str] = None, model: str = "gemini-pro"):
+        self.model = model
+        self.client = _pooled_client(base_url=base_url or GEMINI_BASE_URL, headers={"x-goog-api-key": api_key})
+
+    @staticmethod
+    def to_gemini_request(messages: List[Dict]) -> Dict:
+        """
+        The leading system message becomes systemInstruction (a constant, so it
+        stays cacheable); assistant turns become "model" turns; later system
+        messages (the retrieved context) are folded into the next user turn.
+        Consecutive turns of one role are merged, since Gemini expects them to alternate.
+        """
+        system = messages[0]["content"] if messages and messages[0]["role"] == "system" else None
+        contents, pending_system = [], []
+        for message in messages[1:] if system is not None else messages:
+            if message["role"] == "system":
+                pending_system.append(message["content"])
+                continue
+            role = "model" if message["role"] == "assistant" else "user"
+            text = message["content"]
+            if role == "user" and pending_system:
+                text = "\n\n".join([*pending_system, text])
+                pending_system = []
+            if contents and contents[-1]["role"] == role:
+                contents[-1]["parts"][0]["text"] += "\n\n" + text
+            else:
+                contents.append({"role": role, "parts": [{"text": text}]})
+        request = {
+            "contents": contents,
+            "generationConfig": {"temperature": 0.8, "maxOutputTokens": 400},
+        }
+        if system is not None:
+            request["systemInstruction"] = {"parts": [{"text": system}]}
+        return request
+
+    @staticmethod
+    def _text(payload: Dict) -> str:
+        candidates = payload.get("candidates") or []
+        if not candidates:
+            return ""
+        return "".join(part.get("text", "") for part in candidates[0].get("content", {}).get("parts", []))
+
+    async def complete(self, messages: List[Dict]) -> str:
+        response = await self.client.post(f"/v1beta/models/{self.model}:generateContent",
+                                          json=self.to_gemini_request(messages))
+        response.raise_for_status()
+        return self._text(response.json())
+
+    async def stream(self, messages: List[Dict]) -> AsyncIterator[str]:
+        async with self.client.stream("POST", f"/v1beta/models/{self.model}:streamGenerateContent",
+                                      params={"alt": "sse"}, json=self.to_gemini_request(messages)) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if line.startswith("data: "):
+                    text = self._text(json.loads(line[6:]))
+                    if text:
+                        yield text
+
+
+PROVIDERS = {"openai": OpenAIProvider, "gemini": GeminiProvider}
+
+
+def create_providers() -> List:
+    """
+    Providers in preference order: LLM_PROVIDER first, then LLM_FALLBACK_PROVIDERS
+    LLM_API_KEY / LLM_BASE_URL configure the primary provider; any provider can
+    also be configured with <NAME>_API_KEY, <NAME>_BASE_URL and <NAME>_MODEL.
+    Providers without a key (or without their client library) are skipped.
+    """
+    primary = os.getenv("LLM_PROVIDER", "")
+    names = [primary] + [n.strip() for n in os.getenv("LLM_FALLBACK_PROVIDERS", "").split(",")]
+    providers = []
+    for name in dict.fromkeys(n for n in names if n):
+        prefix = name.upper()
+        api_key = os.getenv(f"{prefix}_API_KEY") or (os.getenv("LLM_API_KEY") if name == primary else None)
+        base_url = os.getenv(f"{prefix}_BASE_URL") or (os.getenv("LLM_BASE_URL") if name == primary else None)
+        if name not in PROVIDERS or not api_key:
+            print(f"Warning: LLM provider '{name}' is unknown or has no API key; skipping it")
+            continue
+        if name == "openai" and AsyncOpenAI is None:
+            print("Warning: openai is not installed; skipping the OpenAI provider")
+            continue
+        model = os.getenv(f"{prefix}_MODEL")
+        providers.append(PROVIDERS[name](api_key, base_url, **({"model": model} if model else {})))
+    return providers
@@ -0,0 +1,267 @@
+import asyncio
+import math
+import time
+from collections import deque
+from typing import AsyncIterator, Dict, List, Optional
+
+_END = object()  # a stream finished normally
+
+
+class ProviderHealth:
+    """
+    Latency and error EWMAs of one provider, plus a window of recent latencies
+    per call kind ("complete" = whole answer, "stream" = time to first token)
+    from which the hedge deadline is derived.
+    The error rate decays with time, so a provider that failed and stopped
+    receiving traffic is tried again once it has had time to recover.
+    Time Complexity: O(1) per observation, O(w log w) per deadline where w = window
+    """
+    def __init__(self, provider, alpha: float = 0.2, window: int = 200, error_half_life: float = 30.0):
+        self.provider = provider
+        self.name = provider.name
+        self.alpha = alpha
+        self.error_half_life = error_half_life
+        self.latency_ewma: Dict[str, Optional[float]] = {"complete": None, "stream": None}
+        self.latencies: Dict[str, deque] = {"complete": deque(maxlen=window), "stream": deque(maxlen=window)}
+        self._error_ewma = 0.0
+        self._error_at = time.monotonic()
+        self.stats = {"requests": 0, "errors": 0, "hedge_wins": 0}
+
+    @property
+    def error_rate(self) -> float:
+        return self._error_ewma * 0.5 ** ((time.monotonic() - self._error_at) / self.error_half_life)
+
+    def _record_outcome(self, failed: bool):
+        self._error_ewma = self.error_rate + self.alpha * (float(failed) - self.error_rate)
+        self._error_at = time.monotonic()
+
+    def record_latency(self, kind: str, seconds: float):
+        """A successful call (or a lower bound for one cancelled after losing a hedge race)"""
+        previous = self.latency_ewma[kind]
+        self.latency_ewma[kind] = seconds if previous is None else previous + self.alpha * (seconds - previous)
+        self.latencies[kind].append(seconds)
+        self._record_outcome(False)
+
+    def record_error(self):
+        self.stats["errors"] += 1
+        self._record_outcome(True)
+
+    def quantile(self, kind: str, q: float, min_samples: int) -> Optional[float]:
+        window = self.latencies[kind]
+        if len(window) < min_samples:
+            return None
+        ordered = sorted(window)
+        return ordered[min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1)]
+
+    def score(self, kind: str, default_latency: float, error_penalty: float = 4.0) -> float:
+        """Expected cost of routing here: latency inflated by the recent error rate (lower is better)"""
+        latency = self.latency_ewma[kind]
+        return (default_latency if latency is None else latency) * (1 + error_penalty * self.error_rate)
+
+    def get_stats(self) -> Dict:
+        return {
+            **self.stats,
+            "latency_ewma_ms": {kind: None if v is None else round(v * 1000, 1) for kind, v in self.latency_ewma.items()},
+            "error_rate": round(self.error_rate, 3),
+        }
+
+
+class _StreamAttempt:
+    """One provider stream pumped into the router's shared event queue"""
+    def __init__(self, health: ProviderHealth, messages: List[Dict], events: asyncio.Queue):
+        self.health = health
+        self.started = time.perf_counter()
+        self.task = asyncio.ensure_future(self._pump(messages, events))
+
+    async def _pump(self, messages: List[Dict], events: asyncio.Queue):
+        try:
+            async for chunk in self.health.provider.stream(messages):
+                events.put_nowait((self, chunk))
+            events.put_nowait((self, _END))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            events.put_nowait((self, e))
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+
+class LLMRouter:
+    """
+    Routes each LLM call across the configured providers
+    - Providers are ranked by latency EWMA inflated by their recent error
+      rate; ties keep the configured preference order.
+    - Hedging: if the first attempt has not answered (or, when streaming,
+      produced its first token) by the provider's p95 latency, a second
+      request goes to the next provider (or the same one when there is only
+      one); the first to succeed wins and the other is cancelled. Hedges are
+      capped at hedge_max_ratio of requests so a slow provider cannot double the load.
+    - Fallback: when every running attempt has failed, the next provider is tried.
+    Time Complexity: O(p log p) per call where p = number of providers
+    """
+    def __init__(self, providers: List, hedge: bool = True, hedge_default: float = 2.0,
+                 hedge_quantile: float = 0.95, hedge_max_ratio: float = 0.1, min_samples: int = 20):
+        self.health = [ProviderHealth(provider) for provider in providers]
+        self.hedge = hedge
+        self.hedge_default = hedge_default  # deadline until a provider has min_samples latencies
+        self.hedge_quantile = hedge_quantile
+        self.hedge_max_ratio = hedge_max_ratio
+        self.min_samples = min_samples
+        self.stats = {"requests": 0, "hedged": 0, "hedge_wins": 0, "fallbacks": 0, "failures": 0}
+
+    @property
+    def available(self) -> bool:
+        return bool(self.health)
+
+    def _ranked(self, kind: str) -> List[ProviderHealth]:
+        order = {id(h): i for i, h in enumerate(self.health)}
+        return sorted(self.health, key=lambda h: (h.score(kind, self.hedge_default / 2), order[id(h)]))
+
+    def _deadline(self, health: ProviderHealth, kind: str) -> float:
+        deadline = health.quantile(kind, self.hedge_quantile, self.min_samples)
+        return self.hedge_default if deadline is None else deadline
+
+    def _hedge_allowed(self) -> bool:
+        return self.hedge and self.stats["hedged"] < self.hedge_max_ratio * self.stats["requests"] + 1
+
+    async def complete(self, messages: List[Dict]) -> str:
+        """Full answer from the fastest healthy provider"""
+        if not self.health:
+            raise RuntimeError("No LLM provider configured")
+        self.stats["requests"] += 1
+        ranked = self._ranked("complete")
+        candidates = iter(ranked)
+        running: Dict[asyncio.Task, tuple] = {}  # task -> (health, started)
+
+        def launch(health: ProviderHealth):
+            health.stats["requests"] += 1
+            task = asyncio.ensure_future(health.provider.complete(messages))
+            running[task] = (health, time.perf_counter())
+            return task
+
+        launch(next(candidates))
+        hedged, hedge, last_error = False, None, None
+        try:
+            while running:
+                timeout = None
+                if not hedged and len(running) == 1 and self._hedge_allowed():
+                    health, started = next(iter(running.values()))
+                    timeout = max(0.0, self._deadline(health, "complete") - (time.perf_counter() - started))
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    self.stats["hedged"] += 1
+                    hedge = launch(next(candidates, None) or ranked[0])
+                    continue
+                for task in done:
+                    health, started = running.pop(task)
+                    if task.exception() is None:
+                        health.record_latency("complete", time.perf_counter() - started)
+                        if task is hedge:
+                            self.stats["hedge_wins"] += 1
+                            health.stats["hedge_wins"] += 1
+                        for loser, (loser_health, loser_started) in running.items():
+                            if not loser.done():
+                                loser_health.record_latency("complete", time.perf_counter() - loser_started)
+                        return task.result()
+                    last_error = task.exception()
+                    health.record_error()
+                if not running:
+                    fallback = next(candidates, None)
+                    if fallback is None:
+                        break
+                    self.stats["fallbacks"] += 1
+                    launch(fallback)
+            self.stats["failures"] += 1
+            raise last_error
+        finally:
+            for task in running:
+                task.cancel()
+                if task.done() and not task.cancelled():
+                    task.exception()  # finished alongside the winner; not needed
+
+    async def stream(self, messages: List[Dict]) -> AsyncIterator[str]:
+        """
+        Text deltas from whichever provider produces a first token first;
+        after that only the winner is streamed. Errors after the first token are raised.
+        """
+        if not self.health:
+            raise RuntimeError("No LLM provider configured")
+        self.stats["requests"] += 1
+        ranked = self._ranked("stream")
+        candidates = iter(ranked)
+        events: asyncio.Queue = asyncio.Queue()
+        attempts: List[_StreamAttempt] = []
+
+        def launch(health: ProviderHealth):
+            health.stats["requests"] += 1
+            attempts.append(_StreamAttempt(health, messages, events))
+            return attempts[-1]
+
+        launch(next(candidates))
+        winner, hedged, hedge, last_error = None, False, None, None
+        try:
+            while winner is None:
+                timeout = None
+                if not hedged and len(attempts) == 1 and self._hedge_allowed():
+                    timeout = max(0.0, self._deadline(attempts[0].health, "stream") - attempts[0].elapsed())
+                try:
+                    attempt, item = await asyncio.wait_for(events.get(), timeout)
+                except asyncio.TimeoutError:
+                    hedged = True
+                    self.stats["hedged"] += 1
+                    hedge = launch(next(candidates, None) or ranked[0])
+                    continue
+                if attempt not in attempts:
+                    continue  # queued before its attempt was dropped
+                if isinstance(item, str):
+                    winner = attempt
+                    attempt.health.record_latency("stream", attempt.elapsed())
+                    if attempt is hedge:
+                        self.stats["hedge_wins"] += 1
+                        attempt.health.stats["hedge_wins"] += 1
+                    for other in attempts:
+                        if other is not attempt:
+                            other.health.record_latency("stream", other.elapsed())
+                            other.task.cancel()
+                    attempts[:] = [attempt]
+                    yield item
+                    break
+                # Failed, or ended without a single token
+                attempts.remove(attempt)
+                attempt.health.record_error()
+                last_error = item if isinstance(item, Exception) else RuntimeError("LLM stream ended without output")
+                if not attempts:
+                    fallback = next(candidates, None)
+                    if fallback is None:
+                        self.stats["failures"] += 1
+                        raise last_error
+                    self.stats["fallbacks"] += 1
+                    launch(fallback)
+
+            while True:
+                attempt, item = await events.get()
+                if attempt is not winner:
+                    continue
+                if item is _END:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            for attempt in attempts:
+                attempt.task.cancel()
+
+    def get_stats(self) -> Dict:
+        return {
+            **self.stats,
+            "providers": {
+                health.name: {
+                    **health.get_stats(),
+                    "hedge_after_ms": {kind: round(self._deadline(health, kind) * 1000, 1)
+                                       for kind in ("complete", "stream")},
+                }
+                for health in self.health
+            },
+        }
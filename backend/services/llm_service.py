@@ -1,57 +1,60 @@
 import os
 import random
+import asyncio
+import time
+from functools import lru_cache
 
-try:
-    from openai import OpenAI
-except ImportError:
-    OpenAI = None
-
-try:
-    import google.generativeai as genai
-except ImportError:
-    genai = None
-
-# Simple transliteration map from Uzbek Latin to Cyrillic
-_LATIN_TO_CYRILLIC = {
-    'a': 'а', 'b': 'б', 'd': 'д', 'e': 'е', 'f': 'ф', 'g': 'г', 'h': 'х', 'i': 'и', 'j': 'ж', 'k': 'к',
-    'l': 'л', 'm': 'м', 'n': 'н', 'o': 'о', 'p': 'п', 'q': 'қ', 'r': 'р', 's': 'с', 't': 'т', 'u': 'у',
-    'v': 'в', 'x': 'х', 'y': 'й', 'z': 'з', 'sh': 'ш', 'ch': 'ч', 'ng': 'нг', "'": "ъ",
-    'A': 'А', 'B': 'Б', 'D': 'Д', 'E': 'Е', 'F': 'Ф', 'G': 'Г', 'H': 'Х', 'I': 'И', 'J': 'Ж', 'K': 'К',
-    'L': 'Л', 'M': 'М', 'N': 'Н', 'O': 'О', 'P': 'П', 'Q': 'Қ', 'R': 'Р', 'S': 'С', 'T': 'Т', 'U': 'У',
-    'V': 'В', 'X': 'Х', 'Y': 'Й', 'Z': 'З', 'Sh': 'Ш', 'Ch': 'Ч', 'Ng': 'НГ'
-}
-
-def transliterate_to_cyrillic(text: str) -> str:
-    """Very basic transliteration from Latin Uzbek to Cyrillic.
-    Handles digraphs 'sh', 'ch', 'ng' before single letters.
-    """
-    result = ''
-    i = 0
-    while i < len(text):
-        # Check digraphs first
-        if i + 1 < len(text) and text[i:i+2].lower() in ('sh', 'ch', 'ng'):
-            dig = text[i:i+2]
-            result += _LATIN_TO_CYRILLIC.get(dig, dig)
-            i += 2
-            continue
-        ch = text[i]
-        result += _LATIN_TO_CYRILLIC.get(ch, ch)
-        i += 1
-    return result
+from services.prompt_budget import prompt_budgeter, count_tokens
+from services.transliteration import transliterate_to_cyrillic
+from services.metrics import metrics
+from services.llm_providers import create_providers
+from services.llm_router import LLMRouter
+
+# Static instruction prefix: never formatted per request, so it stays byte-identical
+# and provider-side prompt caching can reuse it
+SYSTEM_INSTRUCTIONS = """Siz Axborot Texnologiyalari va Menejment Universiteti (ATMU) bo'yicha yordamchi sun'iy intellektsiz.
+
+QOIDALAR:
+1. Faqat o'zbek tilida javob bering
+2. To'liq va batafsil ma'lumot bering - qisqa javoblardan saqlaning
+3. Kontekstdagi BARCHA tegishli ma'lumotlarni ishlating (manzil, telefon, fakultetlar va boshqalar)
+4. Agar savol manzil haqida bo'lsa - TO'LIQ manzilni bering: viloyat, shahar, ko'cha, uy raqami, mo'ljal
+5. Agar savol telefon haqida bo'lsa - barcha telefon raqamlarni ko'rsating
+
+MUHIM - Quyidagi hollarda FAQAT javob bering, savol BERMANG:
+- Agar siz savol bergan bo'lsangiz ("bormi?", "kerakmi?", "xohlaysizmi?" bilan tugagan)
+- Agar foydalanuvchi "rahmat", "yo'q", yoki qisqa javob bersa
+
+Boshqa hollarda javob oxirida TURLI xil iboralardan foydalaning:
+- "Boshqa nima haqida bilmoqchisiz?"
+- "Yana qanday yordam bera olaman?"
+- "Qo'shimcha ma'lumot kerakmi?"
+- "Fakultetlar yoki qabul haqida ham ma'lumot berayinmi?"
+- "Boshqa savol bormi sizda?"
+"""
+
+class LLMError(Exception):
+    """The LLM gave no answer; the message is shown to the user but never cached"""
+
+
+@lru_cache(maxsize=1)
+def _system_instruction_tokens() -> int:
+    """Counted on first request, not at import (loading the tokenizer is slow)"""
+    return count_tokens(SYSTEM_INSTRUCTIONS)
 
 class LLMService:
     def __init__(self):
-        self.api_key = os.getenv("LLM_API_KEY")
-        self.provider = os.getenv("LLM_PROVIDER")  # openai or gemini
-        self.client = None
-        self.model = None
-        if self.provider == "openai" and self.api_key and OpenAI:
-            self.client = OpenAI(api_key=self.api_key)
-        elif self.provider == "gemini" and self.api_key and genai:
-            genai.configure(api_key=self.api_key)
-            self.model = genai.GenerativeModel('gemini-pro')
-        else:
-            self.client = None
+        self.max_retries = int(os.getenv("LLM_MAX_RETRIES", "3"))
+        self.retry_base_delay = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+        # LLM_PROVIDER first, then LLM_FALLBACK_PROVIDERS; each call is hedged / failed over between them
+        self.router = LLMRouter(
+            create_providers(),
+            hedge=os.getenv("LLM_HEDGE", "true").lower() == "true",
+            hedge_default=float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "2.0")),
+            hedge_quantile=float(os.getenv("LLM_HEDGE_QUANTILE", "0.95")),
+            hedge_max_ratio=float(os.getenv("LLM_HEDGE_MAX_RATIO", "0.1")),
+        )
+        if not self.router.available:
             print("Warning: LLM API Key not found or provider not configured. Using mock responses.")
 
         # Pool of varied follow‑up phrases (Uzbek Latin)
@@ -92,11 +95,8 @@ class LLMService:
         # No follow‑up phrase added to keep answers concise
         return response
 
-    def get_response(self, prompt: str, context: str = "", conversation_history: list = None, version: int = 1) -> dict:
-        """Generate LLM response and optionally transliterate for version 2.
-        Returns a dict with 'text' and optional 'cyrillic' fields.
-        """
-        # ---------- Farewell / Thanks detection ----------
+    def _quick_reply(self, prompt: str):
+        """Return a canned reply for farewells and thanks, or None"""
         prompt_lower = prompt.lower().strip()
         farewell_indicators = ['xayr', 'hayr', 'bye', 'alvido', "ko'rishguncha"]
         gratitude_words = ['rahmat', 'raxmat', 'tashakkur']
@@ -105,90 +105,115 @@ class LLMService:
         has_farewell = any(word in prompt_lower for word in farewell_indicators)
         has_thanks = any(word in prompt_lower for word in gratitude_words)
         has_no = any(word in prompt_lower for word in negative_responses)
-        
+
         if is_short and (has_thanks or (has_no and '?' not in prompt)):
-            text_response = "Xayr! Murojaat qilganingiz uchun rahmat. Omad tilayman! 😊"
-            result = {"text": text_response}
-            if version == 2:
-                result["cyrillic"] = transliterate_to_cyrillic(text_response)
-            return result
-            
+            return "Xayr! Murojaat qilganingiz uchun rahmat. Omad tilayman! 😊"
         if has_farewell:
-            text_response = "Siz bilan gaplashganimdan xursand bo'ldim. Xayr! 😊"
-            result = {"text": text_response}
-            if version == 2:
-                result["cyrillic"] = transliterate_to_cyrillic(text_response)
-            return result
+            return "Siz bilan gaplashganimdan xursand bo'ldim. Xayr! 😊"
+        return None
 
-        # ---------- System prompt ----------
-        system_prompt = f"""Siz Axborot Texnologiyalari va Menejment Universiteti (ATMU) bo'yicha yordamchi sun'iy intellektsiz.
+    def _prepare(self, prompt: str, context: str, conversation_history: list = None):
+        """
+        Build provider input within the token budget.
+        Layout keeps the static instructions first and byte-identical so
+        provider-side prompt caching can reuse them; per-request parts
+        (history, retrieved context, question) follow.
+        Returns chat messages; every provider receives the same history.
+        """
+        context, _ = prompt_budgeter.fit_context(context)
+        history, history_tokens = prompt_budgeter.fit_history(conversation_history or [])
+        context_block = f"""KONTEKST (barcha ma'lumotlardan foydalaning):
+{context}
 
-QOIDALAR:
-1. Faqat o'zbek tilida javob bering
-2. To'liq va batafsil ma'lumot bering - qisqa javoblardan saqlaning
-3. Kontekstdagi BARCHA tegishli ma'lumotlarni ishlating (manzil, telefon, fakultetlar va boshqalar)
-4. Agar savol manzil haqida bo'lsa - TO'LIQ manzilni bering: viloyat, shahar, ko'cha, uy raqami, mo'ljal
-5. Agar savol telefon haqida bo'lsa - barcha telefon raqamlarni ko'rsating
+Esda tuting: To'liq va foydali javob bering!"""
 
-MUHIM - Quyidagi hollarda FAQAT javob bering, savol BERMANG:
-- Agar siz savol bergan bo'lsangiz ("bormi?", "kerakmi?", "xohlaysizmi?" bilan tugagan)
-- Agar foydalanuvchi "rahmat", "yo'q", yoki qisqa javob bersa
+        messages = [{"role": "system", "content": SYSTEM_INSTRUCTIONS}]
+        messages.extend(history)
+        messages.append({"role": "system", "content": context_block})
+        messages.append({"role": "user", "content": prompt})
 
-Boshqa hollarda javob oxirida TURLI xil iboralardan foydalaning:
-- "Boshqa nima haqida bilmoqchisiz?"
-- "Yana qanday yordam bera olaman?"
-- "Qo'shimcha ma'lumot kerakmi?"
-- "Fakultetlar yoki qabul haqida ham ma'lumot berayinmi?"
-- "Boshqa savol bormi sizda?"
+        prompt_budgeter.record({
+            "instruction_tokens": _system_instruction_tokens(),
+            "context_tokens": count_tokens(context_block),
+            "history_tokens": history_tokens,
+            "question_tokens": count_tokens(prompt)
+        })
+        return messages
 
-KONTEKST (barcha ma'lumotlardan foydalaning):
-{context}
+    async def _backoff(self, attempt: int):
+        """Exponential backoff with jitter; never blocks the event loop"""
+        delay = self.retry_base_delay * (2 ** attempt)
+        await asyncio.sleep(delay + random.uniform(0, delay / 2))
 
-Esda tuting: To'liq va foydali javob bering!"""
+    async def get_response(self, prompt: str, context: str = "", conversation_history: list = None, version: int = 1) -> dict:
+        """Generate LLM response and optionally transliterate for version 2.
+        Returns a dict with 'text' and optional 'cyrillic' fields.
+        Raises LLMError when no provider is configured or every retry failed.
+        """
+        # ---------- Farewell / Thanks detection ----------
+        quick = self._quick_reply(prompt)
+        if quick:
+            result = {"text": quick}
+            if version == 2:
+                with metrics.stage("transliteration"):
+                    result["cyrillic"] = transliterate_to_cyrillic(quick)
+            return result
 
-        if not self.api_key:
-            return {"text": "Kechirasiz, tizimda API kalit sozlanmagan. Iltimos, administratorga murojaat qiling."}
+        if not self.router.available:
+            raise LLMError("Kechirasiz, tizimda API kalit sozlanmagan. Iltimos, administratorga murojaat qiling.")
 
-        # Build messages
-        messages = [{"role": "system", "content": system_prompt}]
-        if conversation_history:
-            messages.extend(conversation_history)
-        messages.append({"role": "user", "content": prompt})
+        # ---------- Prompt within token budget ----------
+        messages = self._prepare(prompt, context, conversation_history)
 
-        max_retries = 3
-        retry_delay = 1
-        for attempt in range(max_retries):
+        for attempt in range(self.max_retries):
             try:
-                raw = ""
-                if self.provider == "openai" and self.client:
-                    response = self.client.chat.completions.create(
-                        model="gpt-4o-mini",
-                        messages=messages,
-                        temperature=0.8,
-                        max_tokens=400,
-                    )
-                    raw = response.choices[0].message.content
-                elif self.provider == "gemini" and hasattr(self, "model"):
-                    full_prompt = f"{system_prompt}\n\nFoydalanuvchi savoli: {prompt}"
-                    response = self.model.generate_content(full_prompt)
-                    raw = response.text
-                else:
-                    raw = "Kechirasiz, javob bera olmadim."
-
+                with metrics.stage("llm_total"):  # one observation per attempt, hedges and fallbacks included
+                    raw = await self.router.complete(messages)
                 processed = self._post_process(raw)
                 result = {"text": processed}
                 if version == 2:
                     # Provide Cyrillic version for TTS
-                    result["cyrillic"] = transliterate_to_cyrillic(processed)
+                    with metrics.stage("transliteration"):
+                        result["cyrillic"] = transliterate_to_cyrillic(processed)
                 return result
 
             except Exception as e:
-                if attempt < max_retries - 1:
-                    import time
-                    time.sleep(retry_delay * (attempt + 1))
+                if attempt < self.max_retries - 1:
+                    await self._backoff(attempt)
+                    continue
+                raise LLMError(f"Xatolik yuz berdi: {str(e)}") from e
+        raise LLMError("Kechirasiz, javob bera olmadim.")
+
+    async def stream_response(self, prompt: str, context: str = "", conversation_history: list = None):
+        """Yield raw LLM text deltas as the provider produces them.
+        Callers are responsible for sentence splitting and cleaning.
+        Connection errors are retried only until the first token arrives;
+        after that, or once retries are exhausted, LLMError is raised.
+        """
+        quick = self._quick_reply(prompt)
+        if quick:
+            yield quick
+            return
+
+        if not self.router.available:
+            raise LLMError("Kechirasiz, tizimda API kalit sozlanmagan. Iltimos, administratorga murojaat qiling.")
+
+        messages = self._prepare(prompt, context, conversation_history)
+        requested = time.perf_counter()
+        for attempt in range(self.max_retries):
+            started = False
+            try:
+                async for delta in self.router.stream(messages):
+                    if not started:
+                        metrics.observe("llm_first_token", time.perf_counter() - requested)
+                    started = True
+                    yield delta
+                metrics.observe("llm_total", time.perf_counter() - requested)
+                return
+            except Exception as e:
+                if not started and attempt < self.max_retries - 1:
+                    await self._backoff(attempt)
                     continue
-                else:
-                    return {"text": f"Xatolik yuz berdi: {str(e)}"}
-        return {"text": "Kechirasiz, javob bera olmadim."}
+                raise LLMError(f"Xatolik yuz berdi: {str(e)}") from e
 
 llm_service = LLMService()
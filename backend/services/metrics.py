@@ -0,0 +1,175 @@
+import bisect
+import contextvars
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Seconds; spans a cache hit (sub-millisecond) to a slow LLM call or cold TTS load
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# (name, type, help, value, labels) for gauges and counters collected at scrape time
+Sample = Tuple[str, str, str, float, Dict[str, str]]
+
+
+class Histogram:
+    """
+    Fixed-bucket latency histogram with Prometheus semantics
+    Time Complexity: O(log b) per observation where b = number of buckets
+    """
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile (None if empty or beyond the last bucket)"""
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return None
+
+    def render(self, name: str, labels: str) -> List[str]:
+        """Exposition lines: cumulative buckets, then sum and count"""
+        sep = "," if labels else ""
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels}{sep}le="{bound:g}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {self.count}')
+        lines.append(f"{name}_sum{{{labels}}} {self.sum:.6f}")
+        lines.append(f"{name}_count{{{labels}}} {self.count}")
+        return lines
+
+
+class RequestTrace:
+    """Per-request stage timings, accumulated while the request is handled"""
+    __slots__ = ("started", "stages")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    def add(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def to_dict(self) -> Dict[str, float]:
+        """Milliseconds per stage plus the total so far"""
+        timings = {stage: round(seconds * 1000, 2) for stage, seconds in self.stages.items()}
+        timings["total"] = round(self.elapsed() * 1000, 2)
+        return timings
+
+    def server_timing(self) -> str:
+        """Server-Timing header value, shown per request in browser dev tools"""
+        return ", ".join(f"{stage};dur={ms}" for stage, ms in self.to_dict().items())
+
+
+# Tasks copy the context when created, so stages timed in coalesced or
+# gathered work still land on the request that started it
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("request_trace", default=None)
+
+
+class MetricsService:
+    """
+    Request and per-stage latency histograms, exported in the Prometheus
+    text format together with gauges collected from the other services.
+    Stages: fact_lookup, cache_lookup, embedding, retrieval, llm_first_token, llm_total,
+    transliteration, tts_synthesis, encoding.
+    Time Complexity: O(log b) per observation, O(stages * b) per scrape
+    """
+    def __init__(self, trace_header: bool = False, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        # Server-Timing header on /chat and a "timing" field on the /chat/stream done event
+        self.trace_header = trace_header
+        self.buckets = tuple(buckets)
+        self.stages: Dict[str, Histogram] = {}
+        self.requests: Dict[str, Histogram] = {}
+
+    def start_trace(self) -> RequestTrace:
+        """Begin timing a request in the current context"""
+        trace = RequestTrace()
+        _current_trace.set(trace)
+        return trace
+
+    def observe(self, stage: str, seconds: float):
+        """Record one stage duration in its histogram and in the current request's trace"""
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            histogram = self.stages[stage] = Histogram(self.buckets)
+        histogram.observe(seconds)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(stage, seconds)
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time the enclosed block as one observation of a stage"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def finish_trace(self, endpoint: str, trace: RequestTrace):
+        """Record the whole request's duration under its endpoint"""
+        histogram = self.requests.get(endpoint)
+        if histogram is None:
+            histogram = self.requests[endpoint] = Histogram(self.buckets)
+        histogram.observe(trace.elapsed())
+
+    def render(self, samples: Iterable[Sample] = ()) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = [
+            "# HELP chat_request_duration_seconds End-to-end chat request latency",
+            "# TYPE chat_request_duration_seconds histogram",
+        ]
+        for endpoint, histogram in sorted(self.requests.items()):
+            lines.extend(histogram.render("chat_request_duration_seconds", f'endpoint="{endpoint}"'))
+        lines += [
+            "# HELP chat_stage_duration_seconds Latency of each stage of answering a question",
+            "# TYPE chat_stage_duration_seconds histogram",
+        ]
+        for stage, histogram in sorted(self.stages.items()):
+            lines.extend(histogram.render("chat_stage_duration_seconds", f'stage="{stage}"'))
+
+        # Every sample of a metric family must follow its HELP/TYPE lines
+        families: Dict[str, List[Sample]] = {}
+        for sample in samples:
+            families.setdefault(sample[0], []).append(sample)
+        for name, family in families.items():
+            _, kind, help_text, _, _ = family[0]
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            for _, _, _, value, labels in family:
+                label_text = ",".join(f'{key}="{val}"' for key, val in labels.items())
+                lines.append(f"{name}{{{label_text}}} {float(value):g}" if label_text else f"{name} {float(value):g}")
+        return "\n".join(lines) + "\n"
+
+    def get_stats(self) -> Dict:
+        """Bucket-resolution p50/p95/p99 per stage, in milliseconds"""
+        def summary(histogram: Histogram) -> Dict:
+            quantiles = {f"p{int(q * 100)}_ms": histogram.quantile(q) for q in (0.5, 0.95, 0.99)}
+            return {
+                "count": histogram.count,
+                "mean_ms": round(histogram.sum / histogram.count * 1000, 2) if histogram.count else None,
+                **{key: None if value is None else value * 1000 for key, value in quantiles.items()},
+            }
+        return {
+            "requests": {endpoint: summary(h) for endpoint, h in self.requests.items()},
+            "stages": {stage: summary(h) for stage, h in self.stages.items()},
+        }
+
+metrics = MetricsService(trace_header=os.getenv("METRICS_TRACE_HEADER", "false").lower() == "true")
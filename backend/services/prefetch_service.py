@@ -0,0 +1,256 @@
+import asyncio
+import os
+import re
+import time
+from typing import Dict, List, Optional, Set
+from services.chat_service import chat_service
+from services.cache_service import cache_service
+from services.conversation_service import conversation_service
+from services.fact_store import fact_store
+from services.rag_service import rag_service
+from services.lexical_index import tokenize
+from services.tts_service import tts_service
+from services.storage import MemoryStore
+from services.admission import admission, NORMAL
+from services.text_utils import normalize_uzbek
+
+_QUESTION = re.compile(r"[^.!?]*\?")
+_OFFER_WORD = re.compile(r"\s(?:haqida|kerakmi)\b")
+_TOPIC_SPLIT = re.compile(r",|\byoki\b|\bva\b")
+_WORD = re.compile(r"[\w']+")
+# Offers about nothing in particular ("Boshqa nima haqida bilmoqchisiz?") predict no question
+GENERIC_WORDS = {
+    "boshqa", "yana", "nima", "qanday", "qo'shimcha", "biror", "savol", "savolingiz", "yordam",
+    "siz", "sizga", "sizni", "ma'lumot", "narsa", "ham", "shuningdek",
+}
+# A reply made only of these (plus offered topics) takes up the offer: "ha", "Ha, qabul haqida ayting"
+AFFIRMATIVE_WORDS = {"ha", "xa", "mayli", "albatta", "ok", "okey", "xo'p", "xop", "bo'pti", "roziman", "kerak"}
+REPLY_WORDS = {
+    "ayting", "aytib", "aytsangiz", "bering", "bera", "oling", "haqida", "ham", "ma'lumot", "iltimos",
+    "menga", "bilmoqchiman", "qani", "o'sha", "shu", "u", "va", "yoki", "keyin", "bilan",
+}
+
+
+class PrefetchService:
+    """
+    Speculative prefetch of the answer a session is about to ask for
+    When an answer ends by offering topics ("Fakultetlar yoki qabul haqida ham
+    ma'lumot berayinmi?"), the offer is remembered for that session as
+    questions: one per topic the knowledge base covers, plus one for all of
+    them. The session's next message is mapped onto those questions when it
+    only takes up the offer ("ha" -> all offered topics, "qabul haqida" ->
+    that topic), so it reaches the exact cache under the predicted key; the
+    offer is consumed only once that message has been admitted and answered.
+    In the background, predicted questions the caches cannot answer yet are
+    run through the normal pipeline (Assistant 2 audio too), only while the
+    LLM stage is mostly idle and nothing is degraded, within a per-minute
+    LLM budget. Failed LLM calls are neither cached nor counted as computed.
+    hit_rate = prefetched questions later asked / LLM calls spent.
+    Offers live in this process, so with several workers a reply handled by
+    another worker is answered as usual, just without the shortcut.
+    Time Complexity: O(n) per response where n = answer length; at most
+    max_candidates LLM calls per response, and budget per minute overall
+    """
+    def __init__(self):
+        # Off unless PREFETCH_LLM_PER_MINUTE is set: every prefetch is a real LLM call
+        self.budget = float(os.getenv("PREFETCH_LLM_PER_MINUTE", "0"))
+        self.max_candidates = int(os.getenv("PREFETCH_MAX_CANDIDATES", "2"))
+        self.concurrency = int(os.getenv("PREFETCH_CONCURRENCY", "1"))
+        # Prefetch only while fewer LLM slots than this fraction of the limit are taken
+        self.idle_ratio = float(os.getenv("PREFETCH_IDLE_RATIO", "0.5"))
+        self.ttl = float(os.getenv("PREFETCH_TTL", "600"))
+        self.tokens = self.budget
+        self.refilled = time.monotonic()
+        # session -> {"topics": {term: question}, "all": question}; consumed by the next message
+        self.offers = MemoryStore(max_size=int(os.getenv("PREFETCH_MAX_SESSIONS", "10000")))
+        # question hash -> {"question", "uses"} for questions answered by a prefetch
+        self.prefetched = MemoryStore(max_size=1000)
+        self._tasks: Set[asyncio.Task] = set()
+        self.stats = {
+            "offers": 0,
+            "resolved": 0,
+            "scheduled": 0,
+            "computed": 0,
+            "already_cached": 0,
+            "skipped_busy": 0,
+            "skipped_budget": 0,
+            "dropped": 0,
+            "failed": 0,
+            "audio": 0,
+            "used": 0,
+            "useful": 0
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.budget > 0
+
+    @staticmethod
+    def _question(topics: List[str]) -> str:
+        topic = " va ".join(topics)
+        return f"{topic[0].upper()}{topic[1:]} haqida ma'lumot bering"
+
+    @staticmethod
+    def _term(word: str) -> str:
+        terms = tokenize(word)
+        return terms[0] if terms else ""
+
+    def offered_topics(self, answer: str, history: List[Dict]) -> Dict[str, str]:
+        """
+        Topics the answer offers next, as {stemmed head word: topic phrase}
+        Only the clause right before the last "haqida"/"kerakmi" of each question
+        counts; topics the knowledge base does not cover or the session already asked about are dropped.
+        """
+        asked = {term for m in history if m.get("role") == "user" for term in tokenize(m["content"])}
+        postings = rag_service.lexical.postings
+        topics = {}
+        for sentence in _QUESTION.findall(answer):
+            cuts = list(_OFFER_WORD.finditer(sentence))
+            if not cuts:
+                continue
+            clause = sentence[cuts[-2].end() if len(cuts) > 1 else 0:cuts[-1].start()]
+            for part in _TOPIC_SPLIT.split(clause):
+                words = [w for w in _WORD.findall(part) if normalize_uzbek(w) not in GENERIC_WORDS]
+                if not words:
+                    continue
+                term = self._term(words[-1])
+                if term in postings and term not in asked:
+                    topics[term] = " ".join(words[-2:])  # "universitetning fakultetlari", not the whole clause
+        return topics
+
+    def resolve(self, session_id: Optional[str], message: str) -> str:
+        """
+        The predicted question when the message only takes up the session's last offer, else the message
+        Read-only: the offer stays until consume() records that the message was answered.
+        """
+        if not session_id:
+            return message
+        offer = self.offers.get(session_id)
+        if offer is None:
+            return message
+        chosen, affirmed = [], False
+        for word in _WORD.findall(normalize_uzbek(message)):
+            term = self._term(word)
+            if term in offer["topics"]:
+                chosen.append(term)
+            elif word in AFFIRMATIVE_WORDS:
+                affirmed = True
+            elif word not in REPLY_WORDS:
+                return message  # asks something else
+        chosen = list(dict.fromkeys(chosen))
+        if len(chosen) == 1:
+            question = offer["topics"][chosen[0]]
+        elif (chosen and len(chosen) == len(offer["topics"])) or (affirmed and not chosen):
+            question = offer["all"]
+        else:
+            return message
+        return question
+
+    def consume(self, session_id: Optional[str], message: str, question: str):
+        """
+        Drop the session's offer once its next message was answered (an offer is only
+        taken up by the very next message) and count the hit when it resolved to a prediction
+        Requests refused with 429/503 never get here, so their offer survives the retry.
+        """
+        if not session_id or self.offers.get(session_id) is None:
+            return
+        self.offers.delete(session_id)
+        if question == message:
+            return
+        self.stats["resolved"] += 1
+        entry = self.prefetched.get(cache_service._hash_question(question))
+        if entry is not None:
+            if entry["uses"] == 0:
+                self.stats["useful"] += 1
+            entry["uses"] += 1
+            self.stats["used"] += 1
+        print(f"[PREFETCH] '{message[:30]}' -> {question}")
+
+    def after_response(self, answer: str, session_id: Optional[str], version: int):
+        """Remember the answer's offer for the session and prefetch the questions it predicts"""
+        if not self.enabled or not session_id:
+            return
+        topics = self.offered_topics(answer, conversation_service.get_history(session_id))
+        if not topics:
+            return
+        offer = {
+            "topics": {term: self._question([topic]) for term, topic in topics.items()},
+            "all": self._question(list(topics.values())),
+        }
+        self.offers.set(session_id, offer, ttl=self.ttl)
+        self.stats["offers"] += 1
+        # A plain "ha" is the likeliest reply, so the combined question goes first
+        predicted = list(dict.fromkeys([offer["all"], *offer["topics"].values()]))
+        candidates = [q for q in predicted if not self._answered(q)][:self.max_candidates]
+        if not candidates:
+            return
+        self._tasks = {task for task in self._tasks if not task.done()}
+        if len(self._tasks) >= self.concurrency:
+            self.stats["dropped"] += len(candidates)
+            return
+        self.stats["scheduled"] += len(candidates)
+        self._tasks.add(asyncio.get_running_loop().create_task(self._run(candidates, version)))
+
+    def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = set()
+
+    def _answered(self, question: str) -> bool:
+        """Free already: a fact fast-path answer or an exact cache entry (no stats recorded)"""
+        intent = fact_store.match(question)
+        if intent and intent in fact_store.answers:
+            return True
+        return cache_service.cache.get(cache_service._hash_question(question)) is not None
+
+    def _idle(self) -> bool:
+        llm = admission.llm
+        return admission.level == NORMAL and llm.waiting == 0 and llm.active < llm.limit * self.idle_ratio
+
+    def _take_budget(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.budget, self.tokens + (now - self.refilled) * self.budget / 60)
+        self.refilled = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    async def _run(self, questions: List[str], version: int):
+        for question in questions:
+            if not self._idle():
+                self.stats["skipped_busy"] += 1
+                continue
+            if not self._take_budget():
+                self.stats["skipped_budget"] += 1
+                continue
+            try:
+                # LLMError (outage, no provider) lands here: nothing was cached
+                _, cyrillic, cached = await chat_service.answer(question, version=version)
+            except Exception as e:
+                self.stats["failed"] += 1
+                print(f"Prefetch failed for '{question}': {e}")
+                continue
+            if cached:
+                self.tokens += 1  # a semantic hit cost no LLM call
+                self.stats["already_cached"] += 1
+                continue
+            self.stats["computed"] += 1
+            self.prefetched.set(cache_service._hash_question(question), {"question": question, "uses": 0},
+                                ttl=self.ttl)
+            if cyrillic and not admission.tts_overloaded():
+                if await tts_service.synthesize(cyrillic):
+                    self.stats["audio"] += 1
+
+    def get_stats(self) -> Dict:
+        computed = self.stats["computed"]
+        return {
+            **self.stats,
+            "enabled": self.enabled,
+            "running": sum(not task.done() for task in self._tasks),
+            "pending_offers": len(self.offers),
+            "budget_per_minute": self.budget,
+            "hit_rate": f"{self.stats['useful'] / computed * 100:.1f}%" if computed else "0.0%"
+        }
+
+prefetch_service = PrefetchService()
@@ -0,0 +1,134 @@
+import os
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    """tiktoken encoder, loaded on first use to keep imports fast; None if unavailable"""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")  # gpt-4o family
+    except Exception:  # not installed or encoding files unavailable offline
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Exact count with tiktoken when available, else ~3 characters per token (Uzbek Latin)"""
+    if not text:
+        return 0
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return len(text) // 3 + 1
+
+
+class PromptBudgeter:
+    """
+    Keeps LLM input size bounded regardless of knowledge-base size or
+    conversation length: deduplicates retrieved chunks, packs them into a
+    context budget in rank order, and keeps the newest history turns
+    verbatim while folding older ones into a one-line summary.
+    Time Complexity: O(c + h) per request where c = chunks, h = history messages
+    """
+    def __init__(self, max_context_tokens: int = 900, max_history_tokens: int = 600,
+                 summary_tokens: int = 120):
+        self.max_context_tokens = max_context_tokens
+        self.max_history_tokens = max_history_tokens
+        self.summary_tokens = summary_tokens
+        self.stats = {
+            "requests": 0,
+            "instruction_tokens": 0,
+            "context_tokens": 0,
+            "history_tokens": 0,
+            "question_tokens": 0,
+            "total_tokens": 0,
+            "chunks_deduplicated": 0,
+            "chunks_dropped": 0,
+            "history_messages_summarized": 0
+        }
+        self.last_request: Dict[str, int] = {}
+        self.max_total_tokens = 0
+
+    def dedupe_chunks(self, chunks: List[str]) -> List[str]:
+        """Drop empty, repeated and fully contained chunks, keeping rank order"""
+        kept: List[str] = []
+        for chunk in chunks:
+            chunk = chunk.strip()
+            if not chunk or any(chunk in other for other in kept):
+                self.stats["chunks_deduplicated"] += 1
+                continue
+            before = len(kept)
+            kept = [other for other in kept if other not in chunk]
+            self.stats["chunks_deduplicated"] += before - len(kept)
+            kept.append(chunk)
+        return kept
+
+    def fit_context(self, context: str) -> Tuple[str, int]:
+        """Pack deduplicated chunks (separated by blank lines) into the context budget"""
+        packed, used = [], 0
+        chunks = self.dedupe_chunks(context.split("\n\n"))
+        for chunk in chunks:
+            tokens = count_tokens(chunk)
+            if packed and used + tokens > self.max_context_tokens:
+                self.stats["chunks_dropped"] += 1
+                continue
+            packed.append(chunk)
+            used += tokens
+        return "\n\n".join(packed), used
+
+    def fit_history(self, history: List[Dict]) -> Tuple[List[Dict], int]:
+        """Newest turns verbatim within budget; older user questions summarized in one message"""
+        if not history:
+            return [], 0
+        kept: List[Dict] = []
+        used = 0
+        index = len(history)
+        while index > 0:
+            message = history[index - 1]
+            tokens = count_tokens(message["content"])
+            if used + tokens > self.max_history_tokens:
+                break
+            kept.append(message)
+            used += tokens
+            index -= 1
+        kept.reverse()
+
+        older = history[:index]
+        if older:
+            self.stats["history_messages_summarized"] += len(older)
+            topics = [m["content"].split("?")[0][:80] for m in older if m["role"] == "user"]
+            summary = "Oldingi suhbatda so'ralgan: " + "; ".join(topics)
+            while count_tokens(summary) > self.summary_tokens and topics:
+                topics.pop(0)
+                summary = "Oldingi suhbatda so'ralgan: " + "; ".join(topics)
+            if topics:
+                tokens = count_tokens(summary)
+                kept.insert(0, {"role": "system", "content": summary})
+                used += tokens
+        return kept, used
+
+    def record(self, usage: Dict[str, int]):
+        """Accumulate per-request token counts"""
+        usage["total_tokens"] = sum(usage.values())
+        self.stats["requests"] += 1
+        for key, value in usage.items():
+            self.stats[key] += value
+        self.last_request = usage
+        self.max_total_tokens = max(self.max_total_tokens, usage["total_tokens"])
+
+    def get_stats(self) -> Dict:
+        requests = self.stats["requests"]
+        return {
+            **self.stats,
+            "avg_total_tokens": round(self.stats["total_tokens"] / requests, 1) if requests else 0,
+            "max_total_tokens": self.max_total_tokens,
+            "last_request": self.last_request,
+            "exact_counts": _encoding() is not None
+        }
+
+
+prompt_budgeter = PromptBudgeter(
+    max_context_tokens=int(os.getenv("PROMPT_MAX_CONTEXT_TOKENS", "900")),
+    max_history_tokens=int(os.getenv("PROMPT_MAX_HISTORY_TOKENS", "600")),
+)
@@ -1,98 +1,335 @@
 import os
+import time
+import asyncio
 import numpy as np
-from typing import List, Tuple
-from sklearn.metrics.pairwise import cosine_similarity
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from services.embedding_store import EmbeddingStore, chunk_hash
+from services.embedding_backends import create_embedding_backend
+from services.lexical_index import BM25Index
+from services.single_flight import SingleFlight
+from services.metrics import metrics
+from services.text_utils import normalize_uzbek
+
+
+def _unit_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize rows; returns the input untouched (zero-copy) if already unit length"""
+    norms = np.linalg.norm(matrix, axis=1)
+    if np.allclose(norms, 1.0, atol=1e-3):
+        return matrix
+    return (matrix / np.where(norms > 0, norms, 1)[:, None]).astype(np.float32)
+
+
+def _read_chunks(path: str) -> List[str]:
+    """Knowledge-base sections (separated by blank lines)"""
+    if not os.path.exists(path):
+        return ["Ma'lumotlar bazasi topilmadi."]
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read()
+    # Split by sections (identified by double newline or header patterns)
+    sections = content.split('\n\n')
+    return [chunk.strip() for chunk in sections if chunk.strip()]
+
+
+class KnowledgeIndex:
+    """
+    One version of the knowledge base: chunks, their content hashes, the
+    embedding rows (None until embedded) and the BM25 index
+    Never mutated once built; a search takes one reference and sees a
+    consistent snapshot, and a reload swaps in a whole new instance.
+    """
+    __slots__ = ("chunks", "hashes", "positions", "embeddings", "lexical")
+
+    def __init__(self, chunks: List[str], embeddings: Optional[np.ndarray] = None,
+                 lexical: Optional[BM25Index] = None):
+        self.chunks = chunks
+        self.hashes = [chunk_hash(chunk) for chunk in chunks]
+        self.positions: Dict[str, int] = {h: i for i, h in enumerate(self.hashes)}
+        self.embeddings = embeddings
+        self.lexical = lexical or BM25Index(chunks)
+
+    def with_embeddings(self, embeddings: np.ndarray) -> "KnowledgeIndex":
+        return KnowledgeIndex(self.chunks, embeddings, self.lexical)
+
 
 class RAGService:
     """
-    Enhanced RAG with semantic search using embeddings
-    Time Complexity: O(n) for search where n = number of chunks
+    Hybrid RAG: BM25 over an inverted index fused with embedding similarity
+    With KB_WATCH_INTERVAL set, edits to the knowledge-base file are picked
+    up without a restart (see reload).
+    Time Complexity: O(n * d) for search where n = number of chunks
     Space Complexity: O(n * d) where d = embedding dimension
     """
-    def __init__(self, data_path: str = "university_data.txt"):
+    def __init__(self, data_path: str = "university_data.txt", backend=None):
         self.data_path = data_path
-        self.chunks: List[str] = []
-        self.embeddings: np.ndarray = None
+        self.index: KnowledgeIndex = None
+        # Remote (OpenAI) or local CPU embeddings, see EMBEDDING_BACKEND
+        self.backend = backend or create_embedding_backend()
+        store_dir = os.getenv("EMBEDDING_STORE_DIR", "cache/embeddings")
+        # Persistent, content-addressed index; empty EMBEDDING_STORE_DIR disables it
+        self.embedding_store = EmbeddingStore(
+            store_dir, self.backend.name, dtype=os.getenv("EMBEDDING_STORE_DTYPE", "float32")
+        ) if store_dir and self.backend.persistent else None
+        # Weight of vector similarity vs BM25 in the fused score
+        self.hybrid_alpha = float(os.getenv("RAG_HYBRID_ALPHA", "0.6"))
+        self._init_lock = asyncio.Lock()
+        self.query_flight = SingleFlight("embeddings")
+        # Seconds between checks of the knowledge-base file; 0 disables watching
+        self.watch_interval = float(os.getenv("KB_WATCH_INTERVAL", "10"))
+        self.reload_listeners: List[Callable[[Set[str]], None]] = []
+        self._signature: Optional[Tuple[int, int]] = None
+        self._watcher: Optional[asyncio.Task] = None
+        self.stats = {
+            "reloads": 0,
+            "chunks_added": 0,
+            "chunks_removed": 0,
+            "chunks_embedded": 0,
+            "failed_reloads": 0
+        }
+        self.last_reload: Optional[float] = None
         self.load_data()
-    
+
+    @property
+    def chunks(self) -> List[str]:
+        return self.index.chunks
+
+    @property
+    def embeddings(self) -> Optional[np.ndarray]:
+        return self.index.embeddings
+
+    @property
+    def lexical(self) -> BM25Index:
+        return self.index.lexical
+
+    def _file_signature(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.data_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
     def load_data(self):
         """Load and chunk the knowledge base"""
-        if os.path.exists(self.data_path):
-            with open(self.data_path, "r", encoding="utf-8") as f:
-                content = f.read()
-            
-            # Split by sections (identified by double newline or header patterns)
-            sections = content.split('\n\n')
-            self.chunks = [chunk.strip() for chunk in sections if chunk.strip()]
-        else:
-            self.chunks = ["Ma'lumotlar bazasi topilmadi."]
+        self._signature = self._file_signature()
+        self.index = KnowledgeIndex(_read_chunks(self.data_path))
+
+    def chunk_ids(self, indices: List[int]) -> List[str]:
+        """Content hashes of chunks returned by search (call before awaiting anything)"""
+        return [self.index.hashes[i] for i in indices]
+
+    def has_chunks(self, chunk_ids: List[str]) -> bool:
+        """Whether every chunk is still part of the live knowledge base"""
+        positions = self.index.positions
+        return all(h in positions for h in chunk_ids)
+
+    async def generate_embeddings(self, texts: List[str]) -> np.ndarray:
+        """
+        Generate embeddings for texts with the configured backend
+        Returns: numpy array of shape (n_texts, embedding_dim), or None on error
+        """
+        return await self.backend.embed(texts)
     
-    def generate_embeddings(self, texts: List[str], client) -> np.ndarray:
+    async def initialize_embeddings(self):
+        """
+        One-time initialization of chunk embeddings
+        Loads the memory-mapped store and embeds only chunks whose content
+        hash is not stored yet (all of them on the very first start)
+        """
+        # Lock so concurrent first requests embed the knowledge base only once
+        async with self._init_lock:
+            index = self.index
+            if index.embeddings is not None or not index.chunks:
+                return
+            self.backend.fit(index.chunks)
+            embeddings, embedded = await self._embed_index(index)
+            if embeddings is None:
+                return
+            self.index = index.with_embeddings(embeddings)
+            if self.embedding_store:
+                print(f"Loaded embeddings for {len(index.chunks)} chunks ({embedded} re-embedded)")
+            else:
+                print(f"Generated {self.backend.name} embeddings for {len(index.chunks)} chunks")
+
+    async def _embed_index(self, index: KnowledgeIndex,
+                           known: Optional[KnowledgeIndex] = None) -> Tuple[Optional[np.ndarray], int]:
         """
-        Generate embeddings for texts using OpenAI
-        Returns: numpy array of shape (n_texts, embedding_dim)
+        Unit-length embedding rows for every chunk of index, reusing rows of
+        unchanged chunks from the embedding store or from the known (live)
+        index and embedding only the rest
+        Returns (matrix or None on error, number of chunks embedded)
         """
+        # File lock: other workers wait here, then find the rows on disk
+        lock = await asyncio.to_thread(self.embedding_store.acquire_lock) if self.embedding_store else None
         try:
-            response = client.embeddings.create(
-                model="text-embedding-3-small",
-                input=texts
-            )
-            embeddings = [item.embedding for item in response.data]
-            return np.array(embeddings)
-        except Exception as e:
-            print(f"Embedding error: {e}")
-            # Fallback to keyword search
-            return None
-    
-    def initialize_embeddings(self, client):
-        """One-time initialization of chunk embeddings"""
-        if self.embeddings is None and self.chunks:
-            print("Generating embeddings for knowledge base...")
-            self.embeddings = self.generate_embeddings(self.chunks, client)
-            print(f"Generated embeddings for {len(self.chunks)} chunks")
-    
-    def semantic_search(self, query: str, client, top_k: int = 3) -> str:
+            matrix, missing = None, list(range(len(index.hashes)))
+            if self.embedding_store:
+                matrix, missing = self.embedding_store.load(index.hashes)
+            unsaved = bool(missing)
+            if missing and known is not None and known.embeddings is not None:
+                reused = [i for i in missing if index.hashes[i] in known.positions]
+                if reused:
+                    if matrix is None:
+                        matrix = np.zeros((len(index.hashes), known.embeddings.shape[1]), dtype=np.float32)
+                    matrix[reused] = known.embeddings[[known.positions[index.hashes[i]] for i in reused]]
+                    missing = [i for i in missing if index.hashes[i] not in known.positions]
+            if missing:
+                print(f"Embedding {len(missing)} new or changed chunks...")
+                fresh = await self.generate_embeddings([index.chunks[i] for i in missing])
+                if fresh is None:
+                    return None, 0
+                fresh = _unit_rows(fresh)  # stored unit-length so loads stay zero-copy
+                if matrix is None:
+                    matrix = fresh
+                else:
+                    matrix[missing] = fresh
+            if self.embedding_store and unsaved:
+                self.embedding_store.save(index.hashes, matrix)
+                matrix, _ = self.embedding_store.load(index.hashes)  # map the saved file
+            return _unit_rows(matrix), len(missing)
+        finally:
+            if lock is not None:
+                self.embedding_store.release_lock(lock)
+
+    async def reload(self) -> Optional[Set[str]]:
+        """
+        Re-read the knowledge base and atomically swap in a new index
+        Chunking, embedding and BM25 indexing run off the request path;
+        requests keep searching the old index until the single assignment
+        that replaces it. Only new or modified chunks are embedded. The local
+        embedding backend keeps the IDF it was fitted with at startup, so
+        cached query vectors stay comparable.
+        Reload listeners are called with the hashes of chunks that were
+        removed or changed (an empty set if chunks were only added or moved).
+        Returns that set, or None when the content is unchanged or the reload failed.
+        Time Complexity: O(n) hashing plus embedding calls for changed chunks only
+        """
+        async with self._init_lock:
+            self._signature = self._file_signature()
+            current = self.index
+            index = await asyncio.to_thread(lambda: KnowledgeIndex(_read_chunks(self.data_path)))
+            if index.hashes == current.hashes:
+                return None
+
+            embedded = 0
+            if current.embeddings is not None:  # otherwise the first query embeds the new index
+                embeddings, embedded = await self._embed_index(index, known=current)
+                if embeddings is None:
+                    self.stats["failed_reloads"] += 1
+                    self._signature = None  # retry on the next check
+                    print("Knowledge base reload failed: could not embed changed chunks; keeping the current index")
+                    return None
+                index = index.with_embeddings(embeddings)
+
+            self.index = index
+            stale = set(current.hashes) - set(index.hashes)
+            added = len(set(index.hashes) - set(current.hashes))
+            self.stats["reloads"] += 1
+            self.stats["chunks_added"] += added
+            self.stats["chunks_removed"] += len(stale)
+            self.stats["chunks_embedded"] += embedded
+            self.last_reload = time.time()
+            print(f"Knowledge base reloaded: {len(index.chunks)} chunks (+{added} / -{len(stale)}), "
+                  f"{embedded} embedded")
+
+        for listener in self.reload_listeners:
+            listener(stale)
+        return stale
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.watch_interval)
+            try:
+                signature = self._file_signature()
+                if signature == self._signature:
+                    continue
+                # Let a writer finish; a file still changing is picked up on a later check
+                await asyncio.sleep(min(1.0, self.watch_interval))
+                if self._file_signature() == signature:
+                    await self.reload()
+            except Exception as e:
+                self.stats["failed_reloads"] += 1
+                print(f"Knowledge base reload failed: {e}")
+
+    def start_watcher(self):
+        """Poll the knowledge-base file for changes on the running event loop"""
+        if self.watch_interval > 0 and (self._watcher is None or self._watcher.done()):
+            self._watcher = asyncio.get_running_loop().create_task(self._watch())
+
+    def stop_watcher(self):
+        if self._watcher:
+            self._watcher.cancel()
+            self._watcher = None
+
+    async def embed_query(self, query: str) -> Optional[np.ndarray]:
         """
-        Perform semantic search to find most relevant chunks
-        Time Complexity: O(n) where n = number of chunks
+        Embed a query (initializing chunk embeddings on first use)
+        Returns a 1-D vector, or None if embeddings are unavailable
         """
         # Initialize embeddings if not done yet
         if self.embeddings is None:
-            self.initialize_embeddings(client)
-        
-        # If embeddings failed, fall back to full context
+            await self.initialize_embeddings()
+
+        # If embeddings failed, callers fall back to full context
         if self.embeddings is None:
-            return self.get_full_context()
-        
-        # Generate query embedding
-        query_embedding = self.generate_embeddings([query], client)
-        
-        if query_embedding is None:
-            return self.get_full_context()
-        
-        # Compute cosine similarity
-        similarities = cosine_similarity(query_embedding, self.embeddings)[0]
-        
-        # Get top-k indices
-        top_indices = np.argsort(similarities)[-top_k:][::-1]
-        
-        # Return concatenated top chunks
-        relevant_chunks = [self.chunks[i] for i in top_indices]
-        return "\n\n".join(relevant_chunks)
-    
-    def get_full_context(self) -> str:
-        """Fallback: return all knowledge base"""
-        return "\n\n".join(self.chunks)
-    
-    def get_relevant_context(self, query: str, client=None) -> str:
+            return None
+
+        # Identical queries in flight at once share one embedding call
+        with metrics.stage("embedding"):
+            query_embedding = await self.query_flight.do(
+                normalize_uzbek(query).strip(), lambda: self.generate_embeddings([query])
+            )
+        return None if query_embedding is None else query_embedding[0]
+
+    def search(self, query: str, query_embedding: Optional[np.ndarray] = None, top_k: int = 3) -> List[int]:
         """
-        Main method to get relevant context
-        Uses semantic search if client available, else returns all
+        Indices of the top-k chunks by fused score, best first
+        Fused score = alpha * cosine similarity + (1 - alpha) * BM25 scaled
+        to [0, 1]; lexical only when no query embedding is available.
+        Returns [] when neither signal matches anything.
+        Time Complexity: O(n * d + postings) with O(n) top-k selection
         """
-        if client:
-            return self.semantic_search(query, client, top_k=3)
+        with metrics.stage("retrieval"):
+            return self._search(self.index, query, query_embedding, top_k)
+
+    def _search(self, index: KnowledgeIndex, query: str, query_embedding: Optional[np.ndarray],
+                top_k: int) -> List[int]:
+        lexical = index.lexical.scores(query)
+        peak = lexical.max() if lexical.size else 0
+        if peak > 0:
+            lexical /= peak
+
+        if query_embedding is not None and index.embeddings is not None:
+            query_vector = np.asarray(query_embedding, dtype=np.float32).ravel()
+            query_vector = query_vector / (np.linalg.norm(query_vector) or 1)  # the embedding may be shared
+            # Rows are unit length, so a dot product is cosine similarity
+            scores = self.hybrid_alpha * (index.embeddings @ query_vector) + (1 - self.hybrid_alpha) * lexical
+        elif peak > 0:
+            scores = lexical
         else:
-            # Fallback to full context
-            return self.get_full_context()
+            return []
+
+        top_k = min(top_k, scores.size)
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        return [int(i) for i in top[np.argsort(-scores[top])] if scores[i] > 0]
+
+    def context_for(self, chunk_ids: List[str]) -> str:
+        """
+        Context from chunks already retrieved by search (as content hashes),
+        so a cache miss does not search again; no match means the whole knowledge base
+        Time Complexity: O(k) where k = number of chunks
+        """
+        index = self.index
+        positions = index.positions
+        chunks = [index.chunks[positions[h]] for h in chunk_ids if h in positions]
+        return "\n\n".join(chunks or index.chunks)
+
+    def get_stats(self) -> Dict:
+        index = self.index
+        return {
+            **self.stats,
+            "chunks": len(index.chunks),
+            "embedded": index.embeddings is not None,
+            "watching": self._watcher is not None and not self._watcher.done(),
+            "last_reload": self.last_reload
+        }
 
 rag_service = RAGService()
@@ -0,0 +1,56 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key into one in-flight computation
+    The first caller (leader) starts the work as a task; callers arriving
+    before it finishes await the same task. Each caller is shielded, so one
+    client disconnecting does not cancel the work others are waiting on.
+    Nothing is cached after completion: that is the caches' job.
+    Time Complexity: O(1) per call
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.stats = {
+            "calls": 0,
+            "executions": 0,
+            "coalesced": 0,
+            "max_waiters": 0
+        }
+        self._waiters: Dict[str, int] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """Run fn() once for all concurrent callers with this key"""
+        self.stats["calls"] += 1
+        task = self._inflight.get(key)
+        if task is None:
+            self.stats["executions"] += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            self._waiters[key] = 1
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.stats["coalesced"] += 1
+            self._waiters[key] += 1
+            self.stats["max_waiters"] = max(self.stats["max_waiters"], self._waiters[key])
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        self._waiters.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # retrieved here even if every caller went away
+
+    def get_stats(self) -> Dict:
+        calls = self.stats["calls"]
+        saved = (self.stats["coalesced"] / calls * 100) if calls else 0
+        return {
+            **self.stats,
+            "in_flight": len(self._inflight),
+            "saved_rate": f"{saved:.1f}%"
+        }
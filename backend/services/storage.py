@@ -0,0 +1,241 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, List, Optional, Tuple
+
+
+class KeyValueStore(ABC):
+    """
+    Storage interface for sessions and caches
+    Values are JSON-serializable unless the store was given an encode/decode
+    pair; ttl is in seconds (None = no expiry). get() refreshes recency for
+    LRU eviction when max_size or max_bytes is set.
+    Backends implement every abstract method; an incomplete one fails when
+    instantiated.
+    """
+    nbytes = 0  # approximate payload size currently held
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> int:
+        """Store a value; returns how many entries were evicted to make room"""
+
+    @abstractmethod
+    def delete(self, key: str):
+        ...
+
+    @abstractmethod
+    def items(self) -> List[Tuple[str, Any]]:
+        """Snapshot of unexpired (key, value) pairs; does not refresh recency"""
+
+    @abstractmethod
+    def purge_expired(self) -> int:
+        """Remove expired entries; returns how many were removed"""
+
+    @abstractmethod
+    def clear(self):
+        ...
+
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
+
+
+class MemoryStore(KeyValueStore):
+    """
+    In-process store: OrderedDict of (value, expires_at, size) in LRU order
+    Values are kept as live objects; sizeof estimates each one for max_bytes.
+    Time Complexity: O(1) for get/set/delete, amortized O(1) eviction
+    """
+    def __init__(self, max_size: Optional[int] = None, max_bytes: Optional[int] = None,
+                 sizeof: Optional[Callable[[Any], int]] = None):
+        self.data: OrderedDict[str, tuple] = OrderedDict()
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.nbytes = 0
+
+    def _remove(self, key: str):
+        self.nbytes -= self.data.pop(key)[2]
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        value, expires_at, _ = entry
+        if expires_at is not None and time.time() > expires_at:
+            self._remove(key)
+            return None
+        self.data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> int:
+        if key in self.data:
+            self._remove(key)
+        size = self.sizeof(value) if self.sizeof else 0
+        self.data[key] = (value, time.time() + ttl if ttl is not None else None, size)
+        self.nbytes += size
+        evicted = 0
+        while len(self.data) > 1 and (
+            (self.max_size is not None and len(self.data) > self.max_size)
+            or (self.max_bytes is not None and self.nbytes > self.max_bytes)
+        ):
+            self._remove(next(iter(self.data)))  # Remove oldest (first item)
+            evicted += 1
+        return evicted
+
+    def delete(self, key: str):
+        if key in self.data:
+            self._remove(key)
+
+    def items(self) -> List[Tuple[str, Any]]:
+        now = time.time()
+        return [(k, value) for k, (value, expires_at, _) in self.data.items()
+                if expires_at is None or now <= expires_at]
+
+    def purge_expired(self) -> int:
+        now = time.time()
+        expired = [k for k, (_, expires_at, _) in self.data.items() if expires_at is not None and now > expires_at]
+        for key in expired:
+            self._remove(key)
+        return len(expired)
+
+    def clear(self):
+        self.data.clear()
+        self.nbytes = 0
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+
+class SQLiteStore(KeyValueStore):
+    """
+    Shared store in one SQLite file (WAL mode) so every uvicorn worker on a
+    host sees the same sessions and answers; a stand-in for Redis.
+    Each namespace is its own table.
+    Calls are synchronous and run on the event loop: an indexed lookup in
+    WAL mode takes microseconds, less than handing it to a thread, and the
+    caches and sessions are read from sync code. The cost is that a writer
+    contending for the file lock (busy timeout 5 s) or the O(n) limit sweep
+    every 64 writes stalls the loop meanwhile; keep the file on local disk.
+    Time Complexity: O(log n) primary-key lookups, effectively constant at our sizes
+    """
+    def __init__(self, path: str, namespace: str, max_size: Optional[int] = None,
+                 max_bytes: Optional[int] = None, encode: Optional[Callable[[Any], Any]] = None,
+                 decode: Optional[Callable[[Any], Any]] = None):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.table = f"kv_{namespace}"
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.encode = encode
+        self.decode = decode
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL, last_access REAL NOT NULL)"
+        )
+        self._db.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_lru ON {self.table}(last_access)")
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] is not None and now > row[1]:
+                self._db.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                return None
+            if self.max_size is not None or self.max_bytes is not None:
+                self._db.execute(f"UPDATE {self.table} SET last_access = ? WHERE key = ?", (now, key))
+        value = json.loads(row[0])
+        return self.decode(value) if self.decode else value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> int:
+        now = time.time()
+        payload = json.dumps(self.encode(value) if self.encode else value, ensure_ascii=False)
+        with self._lock:
+            self._db.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, payload, now + ttl if ttl is not None else None, now)
+            )
+            self._writes += 1
+            # Counting rows is O(n): enforce the limits every 64 writes, not on each one
+            if (self.max_size is None and self.max_bytes is None) or self._writes % 64:
+                return 0
+            return self._enforce_limits()
+
+    def _enforce_limits(self) -> int:
+        """Drop least recently used rows beyond max_size / max_bytes (lock held)"""
+        count, total = self._db.execute(
+            f"SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM {self.table}"
+        ).fetchone()
+        stale = []
+        for key, size in self._db.execute(f"SELECT key, LENGTH(value) FROM {self.table} ORDER BY last_access"):
+            over_size = self.max_size is not None and count > self.max_size
+            over_bytes = self.max_bytes is not None and total > self.max_bytes
+            if not (over_size or over_bytes) or count <= 1:
+                break
+            stale.append((key,))
+            count -= 1
+            total -= size
+        self._db.executemany(f"DELETE FROM {self.table} WHERE key = ?", stale)
+        return len(stale)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._db.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def items(self) -> List[Tuple[str, Any]]:
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT key, value FROM {self.table} WHERE expires_at IS NULL OR expires_at >= ?", (time.time(),)
+            ).fetchall()
+        return [(key, self.decode(json.loads(value)) if self.decode else json.loads(value)) for key, value in rows]
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            cursor = self._db.execute(
+                f"DELETE FROM {self.table} WHERE expires_at IS NOT NULL AND expires_at < ?", (time.time(),)
+            )
+            return cursor.rowcount
+
+    def clear(self):
+        with self._lock:
+            self._db.execute(f"DELETE FROM {self.table}")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    @property
+    def nbytes(self) -> int:
+        with self._lock:
+            return self._db.execute(f"SELECT COALESCE(SUM(LENGTH(value)), 0) FROM {self.table}").fetchone()[0]
+
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "memory")  # memory or sqlite
+STORAGE_PATH = os.getenv("STORAGE_PATH", "cache/shared_state.sqlite3")
+
+
+def create_store(namespace: str, max_size: Optional[int] = None, max_bytes: Optional[int] = None,
+                 sizeof: Optional[Callable[[Any], int]] = None,
+                 encode: Optional[Callable[[Any], Any]] = None,
+                 decode: Optional[Callable[[Any], Any]] = None) -> KeyValueStore:
+    """
+    Store for one namespace using the configured STORAGE_BACKEND
+    sizeof sizes live values for the memory backend's max_bytes; encode/decode
+    convert values to and from JSON-compatible data for the SQLite backend.
+    """
+    if STORAGE_BACKEND == "sqlite":
+        return SQLiteStore(STORAGE_PATH, namespace, max_size, max_bytes, encode, decode)
+    return MemoryStore(max_size, max_bytes, sizeof)
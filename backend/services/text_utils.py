@@ -0,0 +1,65 @@
+import re
+import unicodedata
+from typing import List
+
+# Every apostrophe variant used for o‘/g‘ and the tutuq belgisi
+_APOSTROPHES = "‘’ʻʼ`´ʹ′"
+
+# Sentence boundary: terminal punctuation followed by whitespace, or a line break
+_BOUNDARY = re.compile(r'(?<=[.!?…])\s+|\n+')
+# "1." / "2." list numbers at line start and short abbreviations must not end a sentence
+_NO_BREAK_TAIL = re.compile(r'(?:(?:^|\n)[ \t]*\d{1,2}|(?:^|\s)[A-Za-zА-Яа-яЎўҚқҒғҲҳ]{1,2})\.$')
+
+
+def unify_apostrophes(text: str) -> str:
+    """NFC-normalize and map every apostrophe variant to ' (o‘ / o’ / oʻ -> o')"""
+    text = unicodedata.normalize("NFC", text)
+    for apostrophe in _APOSTROPHES:  # str.replace runs in C; a dict translate does not
+        if apostrophe in text:
+            text = text.replace(apostrophe, "'")
+    return text
+
+
+def normalize_uzbek(text: str) -> str:
+    """Lowercase, NFC-normalize and unify apostrophe variants (o‘ / o’ / oʻ -> o')"""
+    return unify_apostrophes(text).lower()
+
+
+def split_sentences(text: str, min_length: int = 20) -> List[str]:
+    """
+    Split text into sentences suitable for TTS.
+    Fragments shorter than min_length are merged into the following sentence
+    so the synthesizer is never fed single words.
+    """
+    buffer = SentenceBuffer(min_length)
+    return buffer.feed(text) + buffer.flush()
+
+
+class SentenceBuffer:
+    """
+    Incremental sentence splitter for streamed LLM tokens
+    Time Complexity: O(k) per feed where k = buffered characters
+    """
+    def __init__(self, min_length: int = 20):
+        self.min_length = min_length
+        self.buffer = ""
+
+    def feed(self, delta: str) -> List[str]:
+        """Add a token delta and return sentences completed by it"""
+        self.buffer += delta
+        completed: List[str] = []
+        start = 0
+        for match in _BOUNDARY.finditer(self.buffer):
+            candidate = self.buffer[start:match.start()].strip()
+            if len(candidate) < self.min_length or _NO_BREAK_TAIL.search(candidate):
+                continue
+            completed.append(" ".join(candidate.split()))
+            start = match.end()
+        self.buffer = self.buffer[start:]
+        return completed
+
+    def flush(self) -> List[str]:
+        """Return whatever is left once the stream has ended"""
+        rest = " ".join(self.buffer.split())
+        self.buffer = ""
+        return [rest] if rest else []
@@ -0,0 +1,124 @@
+import re
+from services.text_utils import unify_apostrophes
+
+# Uzbek Latin <-> Cyrillic, table-driven. Each direction is a fixed number of
+# linear passes that run in C: str.replace for digraphs, one regex for the
+# context-dependent letters and one str.translate for everything else.
+
+_LATIN_SINGLE = str.maketrans({
+    'a': 'а', 'b': 'б', 'd': 'д', 'e': 'е', 'f': 'ф', 'g': 'г', 'h': 'ҳ', 'i': 'и', 'j': 'ж', 'k': 'к',
+    'l': 'л', 'm': 'м', 'n': 'н', 'o': 'о', 'p': 'п', 'q': 'қ', 'r': 'р', 's': 'с', 't': 'т', 'u': 'у',
+    'v': 'в', 'x': 'х', 'y': 'й', 'z': 'з',
+    'A': 'А', 'B': 'Б', 'D': 'Д', 'E': 'Е', 'F': 'Ф', 'G': 'Г', 'H': 'Ҳ', 'I': 'И', 'J': 'Ж', 'K': 'К',
+    'L': 'Л', 'M': 'М', 'N': 'Н', 'O': 'О', 'P': 'П', 'Q': 'Қ', 'R': 'Р', 'S': 'С', 'T': 'Т', 'U': 'У',
+    'V': 'В', 'X': 'Х', 'Y': 'Й', 'Z': 'З',
+})
+# Fixed digraphs, longest first: s'h before sh, yo' before yo and o'
+_LATIN_MULTI = [
+    ("s'h", "сҳ"),  # the apostrophe keeps s and h apart: Is'hoq
+    ("yo'", "йў"),  # yo'l, not ё + ъ
+    ("sh", "ш"), ("ch", "ч"), ("o'", "ў"), ("g'", "ғ"),
+    ("yo", "ё"), ("yu", "ю"), ("ya", "я"),
+]
+# Every casing a word can carry: sh, Sh, SH
+_LATIN_REPLACEMENTS = [
+    (variant, target)
+    for latin, cyrillic in _LATIN_MULTI
+    for variant, target in (
+        (latin, cyrillic),
+        (latin[0].upper() + latin[1:], cyrillic[0].upper() + cyrillic[1:]),
+        (latin.upper(), cyrillic.upper()),
+    )
+]
+# Consonants as they stand after the digraph pass
+_LATIN_CONSONANTS = "bcdfghjklmnpqrstvwxzшчғҳ"
+_LATIN_PATTERN = re.compile(
+    rf"(?P<ye_hard>(?<=[{_LATIN_CONSONANTS}])ye)"  # obyekt -> объект
+    r"|(?P<ye>ye)"  # word start or after a vowel: yer -> ер
+    rf"|(?P<e>(?<![{_LATIN_CONSONANTS}y])e)"  # word start or after a vowel: ekran -> экран
+    r"|(?P<tutuq>(?<=[^\W\d_])'(?=[^\W\d_]))",  # ma'lumot -> маълумот; quotes stay quotes
+    re.IGNORECASE,
+)
+_LATIN_CONTEXT = {"ye_hard": "ъе", "ye": "е", "e": "э", "tutuq": "ъ"}
+
+_CYRILLIC_SINGLE = str.maketrans({
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ж': 'j', 'з': 'z', 'и': 'i', 'й': 'y',
+    'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
+    'ф': 'f', 'х': 'x', 'ц': 's', 'ъ': "'", 'ы': 'i', 'ь': '', 'э': 'e', 'ў': "o'", 'қ': 'q', 'ғ': "g'",
+    'ҳ': 'h',
+    'А': 'A', 'Б': 'B', 'В': 'V', 'Г': 'G', 'Д': 'D', 'Е': 'E', 'Ж': 'J', 'З': 'Z', 'И': 'I', 'Й': 'Y',
+    'К': 'K', 'Л': 'L', 'М': 'M', 'Н': 'N', 'О': 'O', 'П': 'P', 'Р': 'R', 'С': 'S', 'Т': 'T', 'У': 'U',
+    'Ф': 'F', 'Х': 'X', 'Ц': 'S', 'Ъ': "'", 'Ы': 'I', 'Ь': '', 'Э': 'E', 'Ў': "O'", 'Қ': 'Q', 'Ғ': "G'",
+    'Ҳ': 'H',
+})
+_CYRILLIC_MULTI = {"ш": "sh", "ч": "ch", "щ": "sh", "ё": "yo", "ю": "yu", "я": "ya"}
+_CYRILLIC_CONSONANTS = "бвгджзйклмнпрстфхцчшщқғҳ"
+_CYRILLIC_PATTERN = re.compile(
+    r"(?-i:[ШЧЩЁЮЯ])"  # capitals depend on the next letter: Шаҳар vs ШАҲАР; lower case is a plain replace
+    rf"|(?P<ye>(?<![{_CYRILLIC_CONSONANTS}])е)"  # ер -> yer, but келди -> keldi
+    r"|(?P<ts>(?<=[аеёиоуэюяў])ц)"  # after a vowel: militsiya; elsewhere ц -> s (sirk, stansiya)
+    r"|(?P<sign>ъ(?=[еёюя]))"  # объект -> obyekt
+    r"|(?P<s_h>с(?=ҳ))",  # Исҳоқ -> Is'hoq, not Ishoq
+    re.IGNORECASE,
+)
+_CYRILLIC_CONTEXT = {"ye": "ye", "ts": "ts", "sign": "", "s_h": "s'"}
+
+_CYRILLIC_LETTER = re.compile(r"[а-яёўқғҳ]", re.IGNORECASE)
+_LATIN_LETTER = re.compile(r"[a-z]", re.IGNORECASE)
+
+
+def _latin_token(match: re.Match) -> str:
+    token = match.group()
+    target = _LATIN_CONTEXT[match.lastgroup]
+    if token.isupper():
+        return target.upper()  # YE -> Е, E -> Э
+    if token[0].isupper():
+        return target[0].upper() + target[1:]  # Ekran -> Экран
+    return target
+
+
+def _cyrillic_token(match: re.Match) -> str:
+    char = match.group()
+    target = _CYRILLIC_CONTEXT[match.lastgroup] if match.lastgroup else _CYRILLIC_MULTI[char.lower()]
+    if not char.isupper() or not target:
+        return target
+    text, start, end = match.string, match.start(), match.end()
+    following = text[end:end + 1]
+    preceding = text[start - 1:start]
+    # All-caps words stay all caps: ШАҲАР -> SHAHAR, but Шаҳар -> Shahar
+    if following.isupper() or (not following.isalpha() and preceding.isupper()):
+        return target.upper()
+    return target[0].upper() + target[1:]
+
+
+def transliterate_to_cyrillic(text: str) -> str:
+    """
+    Uzbek Latin -> Cyrillic (the TTS model's script)
+    Covers sh/ch/o'/g', ye/yo/yu/ya, e vs э, the tutuq belgisi (') and s'h;
+    apostrophe variants (o‘, oʻ, o’) are unified first. ts is kept as тс,
+    which is correct across morpheme boundaries (ketsa, aytsa) and sounds
+    like ц in loanwords anyway.
+    Time Complexity: O(n)
+    """
+    text = unify_apostrophes(text)
+    for latin, cyrillic in _LATIN_REPLACEMENTS:
+        if latin in text:
+            text = text.replace(latin, cyrillic)
+    return _LATIN_PATTERN.sub(_latin_token, text).translate(_LATIN_SINGLE)
+
+
+def transliterate_to_latin(text: str) -> str:
+    """
+    Uzbek Cyrillic -> Latin, for questions typed in Cyrillic
+    Time Complexity: O(n)
+    """
+    text = _CYRILLIC_PATTERN.sub(_cyrillic_token, text)
+    for cyrillic, latin in _CYRILLIC_MULTI.items():
+        if cyrillic in text:
+            text = text.replace(cyrillic, latin)
+    return text.translate(_CYRILLIC_SINGLE)
+
+
+def is_cyrillic(text: str) -> bool:
+    """True when Cyrillic letters outnumber Latin ones"""
+    return len(_CYRILLIC_LETTER.findall(text)) > len(_LATIN_LETTER.findall(text))
@@ -0,0 +1,137 @@
+import asyncio
+import math
+from concurrent.futures import Executor
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class TTSBatchScheduler:
+    """
+    Micro-batching scheduler for TTS inference
+    Collects synthesis jobs for up to max_wait_ms (or until max_batch_size
+    jobs are queued), runs them as one padded forward pass on the executor
+    and resolves each caller's future with its own result.
+    Identical texts inside one batch are synthesized once.
+    """
+    def __init__(
+        self,
+        synthesize_batch: Callable[[List[str]], List[Optional[bytes]]],
+        executor: Executor,
+        max_batch_size: int = 8,
+        max_wait_ms: float = 10,
+        concurrency: int = 1,
+    ):
+        self.synthesize_batch = synthesize_batch
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.concurrency = concurrency  # batches allowed in flight at once
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.pending = 0  # submitted jobs not yet resolved
+        self.batch_seconds: Optional[float] = None  # EWMA of one forward pass
+        self.stats = {
+            "jobs": 0,
+            "batches": 0,
+            "batched_texts": 0,
+            "deduplicated": 0,
+            "max_batch_seen": 0
+        }
+
+    def _ensure_workers(self):
+        """Start batch workers on the running loop (restart if the loop changed)"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._workers = []
+        self._workers = [w for w in self._workers if not w.done()]
+        while len(self._workers) < self.concurrency:
+            self._workers.append(loop.create_task(self._worker()))
+
+    async def submit(self, text: str) -> Optional[bytes]:
+        """Queue one text for synthesis and wait for its audio"""
+        self._ensure_workers()
+        future = self._loop.create_future()
+        self.stats["jobs"] += 1
+        self.pending += 1
+        try:
+            await self._queue.put((text, future))
+            return await future
+        finally:
+            self.pending -= 1
+
+    def estimated_wait(self) -> float:
+        """
+        Seconds a job submitted now would wait for its audio: the batches
+        ahead of it, run concurrency at a time, at the recent batch duration
+        """
+        if not self.batch_seconds:
+            return 0.0
+        rounds = math.ceil(math.ceil((self.pending + 1) / self.max_batch_size) / self.concurrency)
+        return rounds * self.batch_seconds
+
+    async def _collect(self) -> List[Tuple[str, asyncio.Future]]:
+        """Block for the first job, then gather more until full or the wait expires"""
+        batch = [await self._queue.get()]
+        deadline = self._loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - self._loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _worker(self):
+        while True:
+            batch = await self._collect()
+            # Skip callers that already gave up (client disconnected)
+            batch = [(text, future) for text, future in batch if not future.cancelled()]
+            if not batch:
+                continue
+
+            waiters: Dict[str, List[asyncio.Future]] = {}
+            for text, future in batch:
+                waiters.setdefault(text, []).append(future)
+            texts = list(waiters)
+            self.stats["batches"] += 1
+            self.stats["batched_texts"] += len(texts)
+            self.stats["deduplicated"] += len(batch) - len(texts)
+            self.stats["max_batch_seen"] = max(self.stats["max_batch_seen"], len(texts))
+
+            started = self._loop.time()
+            try:
+                results = await self._loop.run_in_executor(self.executor, self.synthesize_batch, texts)
+                elapsed = self._loop.time() - started
+                self.batch_seconds = elapsed if self.batch_seconds is None else \
+                    self.batch_seconds + 0.2 * (elapsed - self.batch_seconds)
+            except Exception as e:
+                for futures in waiters.values():
+                    for future in futures:
+                        if not future.done():
+                            future.set_exception(e)
+                continue
+
+            for text, result in zip(texts, results):
+                for future in waiters[text]:
+                    if not future.done():
+                        future.set_result(result)
+
+    def get_stats(self) -> Dict:
+        batches = self.stats["batches"]
+        avg = self.stats["batched_texts"] / batches if batches else 0
+        return {
+            **self.stats,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "pending": self.pending,
+            "estimated_wait_ms": round(self.estimated_wait() * 1000, 1),
+            "avg_batch_size": round(avg, 2),
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000
+        }
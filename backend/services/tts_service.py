@@ -1,74 +1,260 @@
-import torch
-from transformers import VitsModel, AutoTokenizer
-import scipy.io.wavfile
-import io
 import base64
+import hashlib
+import os
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional, Tuple
 import numpy as np
+from services.tts_scheduler import TTSBatchScheduler
+from services.audio_cache import AudioCache, audio_cache_key, normalize_tts_text
+from services.audio_codec import encode_audio, opus_available
+from services.text_utils import split_sentences
+from services.storage import STORAGE_BACKEND, STORAGE_PATH, create_store
+from services.single_flight import SingleFlight
+from services.metrics import metrics
 
 class TTSService:
     def __init__(self):
         self.model_name = "facebook/mms-tts-uzb-script_cyrillic"
         self.model = None
         self.tokenizer = None
+        # torch/transformers are imported on first load, so text-only serving starts fast
+        self.model_status = "not_loaded"  # not_loaded -> loading -> ready | failed
+        # A failed load is retried after this many seconds, never when torch/transformers are missing
+        self.load_retry_seconds = float(os.getenv("TTS_LOAD_RETRY_SECONDS", "300"))
+        self._retry_at: Optional[float] = None
+        self._preload: Optional[Future] = None
         self.device = "cpu" # Use CPU to avoid complex CUDA setup for user
-        self.audio_cache = {} # Simple in-memory cache for audio
+        self.sample_rate = int(os.getenv("TTS_SAMPLE_RATE", "16000"))  # MMS models emit 16 kHz
+        # CPU inference tuning: dynamic int8 quantization of Linear layers and
+        # intra-op threads per process (0 = torch default, all cores)
+        self.quantize = os.getenv("TTS_QUANTIZE", "none")  # none or int8
+        self.torch_threads = int(os.getenv("TTS_TORCH_THREADS", "0"))
+        # Byte-bounded LRU of raw PCM, optionally persisted to SQLite across restarts;
+        # with the shared storage backend the disk tier is shared by all workers
+        disk_path = os.getenv("TTS_CACHE_PATH") or (STORAGE_PATH if STORAGE_BACKEND == "sqlite" else None)
+        self.audio_cache = AudioCache(
+            max_bytes=int(os.getenv("TTS_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+            disk_path=disk_path,
+            disk_max_bytes=int(os.getenv("TTS_CACHE_DISK_MAX_BYTES", str(512 * 1024 * 1024))),
+        )
+        # Silence inserted between independently synthesized sentences
+        self.sentence_gap_ms = int(os.getenv("TTS_SENTENCE_GAP_MS", "120"))
+        # Bounded pool so CPU-bound VITS inference never runs on the event loop
+        self.max_workers = int(os.getenv("TTS_WORKERS", "2"))
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="tts")
+        self._load_lock = threading.Lock()
+        # Concurrent requests are micro-batched into one padded VITS forward pass
+        self.scheduler = TTSBatchScheduler(
+            self._synthesize_batch,
+            self.executor,
+            max_batch_size=int(os.getenv("TTS_MAX_BATCH_SIZE", "8")),
+            max_wait_ms=float(os.getenv("TTS_MAX_WAIT_MS", "10")),
+            concurrency=self.max_workers,
+        )
+        self.flight = SingleFlight("tts")
+        # Transport codec for /audio/{key}: wav (16-bit PCM), ulaw (8-bit) or opus (needs soundfile)
+        self.audio_format = os.getenv("TTS_AUDIO_FORMAT", "wav")
+        if self.audio_format == "opus" and not opus_available():
+            print("Warning: Opus encoding needs soundfile with libsndfile >= 1.1; using ulaw")
+            self.audio_format = "ulaw"
+        self.audio_rate = int(os.getenv("TTS_AUDIO_RATE", "0"))  # 0 = model rate
+        # Sentence lists behind each clip URL; shared by workers with STORAGE_BACKEND=sqlite
+        self.clips = create_store("audio_clips", max_size=int(os.getenv("TTS_CLIP_MAX_COUNT", "5000")))
+        self.clip_ttl = 86400
+        # Legacy transport: base64 WAV inside the JSON / SSE payload instead of a URL
+        self.inline_audio = os.getenv("TTS_AUDIO_INLINE", "false").lower() == "true"
         
+    def _load_blocked(self) -> bool:
+        """Failed and still cooling down: batches must not each attempt a full load"""
+        return self.model_status == "failed" and (self._retry_at is None or time.monotonic() < self._retry_at)
+
     def _load_model(self):
-        if self.model is None:
-            print(f"Loading TTS model: {self.model_name}...")
-            try:
-                self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
-                self.model = VitsModel.from_pretrained(self.model_name)
-                self.model.to(self.device)
-                print("TTS model loaded successfully.")
-            except Exception as e:
-                print(f"Error loading TTS model: {e}")
-                self.model = None
+        if self.model is not None or self._load_blocked():
+            return
+        # Executor threads may race to load on the first requests
+        with self._load_lock:
+            if self.model is None and not self._load_blocked():
+                print(f"Loading TTS model: {self.model_name}...")
+                self.model_status = "loading"
+                try:
+                    import torch
+                    from transformers import VitsModel, AutoTokenizer
+                    if self.torch_threads:
+                        torch.set_num_threads(self.torch_threads)
+                    self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+                    model = VitsModel.from_pretrained(self.model_name)
+                    model.to(self.device)
+                    model.eval()
+                    if self.quantize == "int8":
+                        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+                    if model.config.sampling_rate != self.sample_rate:
+                        print(f"Warning: TTS_SAMPLE_RATE={self.sample_rate} but model emits {model.config.sampling_rate} Hz")
+                        self.sample_rate = model.config.sampling_rate
+                    self.model = model
+                    self.model_status = "ready"
+                    print(f"TTS model loaded successfully ({self.model_variant}, {torch.get_num_threads()} threads).")
+                except Exception as e:
+                    self.model = None
+                    self.model_status = "failed"
+                    if isinstance(e, ImportError):
+                        self._retry_at = None  # cannot succeed until the dependencies are installed
+                        print(f"Error loading TTS model: {e}; voice stays disabled")
+                    else:
+                        self._retry_at = time.monotonic() + self.load_retry_seconds
+                        print(f"Error loading TTS model: {e}; retrying in {self.load_retry_seconds:.0f}s")
 
-    def generate_audio(self, text: str) -> str:
+    def start_preload(self) -> Future:
+        """Load the model on a TTS worker thread so the first voice request does not wait for it"""
+        if self._preload is None:
+            self._preload = self.executor.submit(self._load_model)
+        return self._preload
+
+    def _cache_key(self, text: str) -> str:
+        return audio_cache_key(text, self.model_variant, self.sample_rate)
+
+    def _to_pcm(self, audio_data: np.ndarray) -> bytes:
+        """Normalize a float waveform to raw 16-bit PCM bytes"""
+        peak = np.max(np.abs(audio_data)) if audio_data.size else 0
+        if peak > 0:
+            audio_data = audio_data / peak
+        return (audio_data * 32767).astype(np.int16).tobytes()
+
+    def _join(self, segments: List[Optional[bytes]]) -> Optional[bytes]:
+        """Join sentence PCM with short silences"""
+        segments = [pcm for pcm in segments if pcm]
+        if not segments:
+            return None
+        gap = bytes(2 * (self.sample_rate * self.sentence_gap_ms // 1000))
+        return gap.join(segments)
+
+    def _assemble(self, segments: List[Optional[bytes]]) -> Optional[str]:
+        """Join sentences and encode once as base64 16-bit WAV (inline transport)"""
+        pcm = self._join(segments)
+        if pcm is None:
+            return None
+        with metrics.stage("encoding"):
+            wav, _ = encode_audio(pcm, self.sample_rate, "wav")
+            return base64.b64encode(wav).decode('utf-8')
+
+    @property
+    def model_variant(self) -> str:
+        """Model plus anything that changes its output; part of every audio cache key"""
+        return self.model_name if self.quantize == "none" else f"{self.model_name}+{self.quantize}"
+
+    def _infer(self, texts: List[str]) -> List[np.ndarray]:
         """
-        Generates audio from text and returns base64 encoded WAV string.
-        Uses in-memory cache to speed up repeated requests.
+        One padded forward pass; float waveforms cut back to each sequence's true length
+        (the model must be loaded)
         """
-        # Check cache first
-        if text in self.audio_cache:
-            # print(f"[TTS CACHE HIT] {text[:30]}...") # Removed to prevent encoding errors
-            return self.audio_cache[text]
+        import torch  # already loaded with the model
+
+        inputs = self.tokenizer(texts, return_tensors="pt", padding=True)
+        inputs = inputs.to(self.device)
+
+        # inference_mode also skips autograd version tracking, unlike no_grad
+        with torch.inference_mode():
+            output = self.model(**inputs)
 
+        waveforms = output.waveform.cpu().numpy()
+        lengths = output.sequence_lengths.cpu().numpy() if output.sequence_lengths is not None \
+            else [waveforms.shape[-1]] * len(texts)
+        return [waveform[:int(length)] for waveform, length in zip(waveforms, lengths)]
+
+    def _synthesize_batch(self, texts: List[str]) -> List[Optional[bytes]]:
+        """
+        Synthesize several sentences in one padded forward pass.
+        Runs on the executor; returns raw PCM, cached per sentence.
+        """
         self._load_model()
         if not self.model or not self.tokenizer:
-            return None
+            return [None] * len(texts)
 
         try:
-            inputs = self.tokenizer(text, return_tensors="pt")
-            inputs = inputs.to(self.device)
-
-            with torch.no_grad():
-                output = self.model(**inputs).waveform
-
-            # Convert to numpy
-            audio_data = output.cpu().numpy().squeeze()
-            
-            # Normalize audio
-            audio_data = audio_data / np.max(np.abs(audio_data))
-            
-            # Convert to 16-bit PCM
-            audio_data_int16 = (audio_data * 32767).astype(np.int16)
-            
-            # Save to in-memory buffer
-            buffer = io.BytesIO()
-            scipy.io.wavfile.write(buffer, rate=self.model.config.sampling_rate, data=audio_data_int16)
-            
-            # Encode to base64
-            audio_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
-            
-            # Store in cache (limit size if needed, but for now keep simple)
-            self.audio_cache[text] = audio_base64
-            
-            return audio_base64
-            
+            results = []
+            for text, waveform in zip(texts, self._infer(texts)):
+                pcm = self._to_pcm(waveform)
+                self.audio_cache.set(self._cache_key(text), pcm)
+                results.append(pcm)
+            return results
+
         except Exception as e:
             print(f"Error generating audio: {e}")
+            return [None] * len(texts)
+
+    def generate_audio(self, text: str) -> str:
+        """
+        Generates audio from text and returns base64 encoded WAV string.
+        Text is voiced sentence by sentence so each sentence is cached on its
+        own and shared phrasing across different answers is never re-synthesized.
+        One-at-a-time path; the request path goes through synthesize().
+        """
+        sentences = split_sentences(text) or [text]
+        segments = [self.audio_cache.get(self._cache_key(s)) for s in sentences]
+        missing = [s for s, pcm in zip(sentences, segments) if pcm is None]
+        if missing:
+            fresh = iter(self._synthesize_batch(missing))
+            segments = [pcm if pcm is not None else next(fresh) for pcm in segments]
+        return self._assemble(segments)
+
+    async def _synthesize_sentence(self, sentence: str) -> Optional[bytes]:
+        key = self._cache_key(sentence)
+        pcm = self.audio_cache.get(key)
+        if pcm is not None:
+            return pcm
+        # Requests speaking the same sentence concurrently share one synthesis
+        with metrics.stage("tts_synthesis"):  # includes batching wait and executor queueing
+            return await self.flight.do(key, lambda: self.scheduler.submit(sentence))
+
+    async def synthesize(self, text: str) -> str:
+        """
+        Async entry point for the request path.
+        Cached sentences are reused; the rest are micro-batched with other
+        in-flight requests and run on the bounded executor.
+        """
+        sentences = split_sentences(text) or [text]
+        segments = await asyncio.gather(*(self._synthesize_sentence(s) for s in sentences))
+        return self._assemble(segments)
+
+    def _clip_key(self, sentences: List[str]) -> str:
+        """Content address of a clip in the configured transport format"""
+        payload = "|".join([self.model_variant, self.audio_format, str(self.audio_rate or self.sample_rate),
+                            *(normalize_tts_text(s) for s in sentences)])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def synthesize_clip(self, text: str, wait: bool = False) -> Optional[str]:
+        """
+        Register text as a clip served by /audio/{key} and return the key.
+        Synthesis starts right away; with wait=False the caller can hand the
+        URL to the client before it finishes (the GET joins the in-flight work);
+        with wait=True returns None if no audio could be produced.
+        """
+        sentences = split_sentences(text) or [text]
+        key = self._clip_key(sentences)
+        self.clips.set(key, {"sentences": sentences}, ttl=self.clip_ttl)
+        work = asyncio.gather(*(self._synthesize_sentence(s) for s in sentences))
+        if wait:
+            if not any(await work):
+                return None
+        else:
+            # Failures surface when the client fetches the clip
+            work.add_done_callback(lambda done: done.cancelled() or done.exception())
+        return key
+
+    async def render_clip(self, key: str) -> Optional[Tuple[bytes, str]]:
+        """Encoded audio and media type for a registered clip, or None if unknown/failed"""
+        clip = self.clips.get(key)
+        if clip is None:
+            return None
+        segments = await asyncio.gather(*(self._synthesize_sentence(s) for s in clip["sentences"]))
+        pcm = self._join(segments)
+        if pcm is None:
             return None
+        with metrics.stage("encoding"):
+            return await asyncio.get_running_loop().run_in_executor(
+                None, encode_audio, pcm, self.sample_rate, self.audio_format, self.audio_rate
+            )
 
 tts_service = TTSService()
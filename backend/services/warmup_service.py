@@ -0,0 +1,139 @@
+import asyncio
+import os
+import re
+import time
+from typing import Dict, List, Optional
+from services.chat_service import chat_service
+from services.rag_service import rag_service
+from services.tts_service import tts_service
+from services.fact_store import fact_store
+from services.transliteration import transliterate_to_cyrillic
+
+class WarmupService:
+    """
+    Cache-warming job run at startup (or from the CLI)
+    Embeds the knowledge base, loads the TTS model, then answers a FAQ list
+    through the normal RAG + LLM path and pre-synthesizes Assistant 2 audio
+    for those answers and for every fact fast-path answer, so the first
+    real users hit warm caches. Readiness flips once it finishes.
+    Time Complexity: O(q / c) LLM round trips for q questions at concurrency c
+    """
+    def __init__(self, faq_path: Optional[str] = None, max_questions: int = 20,
+                 concurrency: int = 4, synthesize_audio: bool = True):
+        self.faq_path = faq_path
+        self.max_questions = max_questions
+        self.concurrency = concurrency
+        self.synthesize_audio = synthesize_audio
+        self.status = "pending"  # pending -> warming -> ready
+        self.progress = {
+            "total": 0,
+            "answered": 0,
+            "audio": 0,
+            "fact_audio": 0,
+            "failed": 0
+        }
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.status == "ready"
+
+    def faq_questions(self) -> List[str]:
+        """
+        Questions from WARMUP_FAQ_PATH (one per line), else derived from the
+        knowledge base: each section title and each "Field: value" line
+        """
+        if self.faq_path and os.path.exists(self.faq_path):
+            with open(self.faq_path, "r", encoding="utf-8") as f:
+                questions = [line.strip() for line in f if line.strip()]
+            return questions[:self.max_questions]
+
+        questions = []
+        for chunk in rag_service.chunks:
+            lines = chunk.splitlines()
+            title = re.sub(r"\(.*?\)", "", lines[0]).strip().rstrip(":").strip()
+            if lines[0].rstrip().endswith(":") and title:
+                questions.append(f"{title}?")
+            for line in lines[1:]:
+                field = line.split(":", 1)[0].strip()
+                if ":" in line and 0 < len(field) <= 30 and not field[0].isdigit():
+                    questions.append(f"ATMU {field[0].lower()}{field[1:]}?")
+        return list(dict.fromkeys(questions))[:self.max_questions]
+
+    async def _warm_question(self, question: str, semaphore: asyncio.Semaphore):
+        async with semaphore:
+            try:
+                _, cyrillic, _ = await chat_service.answer(question, version=2 if self.synthesize_audio else 1)
+                self.progress["answered"] += 1
+                if cyrillic:
+                    if await tts_service.synthesize(cyrillic):
+                        self.progress["audio"] += 1
+            except Exception as e:
+                self.progress["failed"] += 1
+                print(f"Warm-up failed for '{question}': {e}")
+            done = self.progress["answered"] + self.progress["failed"]
+            print(f"[WARMUP] {done}/{self.progress['total']} {question}")
+
+    async def _warm_fact(self, answer: str, semaphore: asyncio.Semaphore):
+        async with semaphore:
+            try:
+                if await tts_service.synthesize(transliterate_to_cyrillic(answer)):
+                    self.progress["fact_audio"] += 1
+            except Exception as e:
+                print(f"Fact audio warm-up failed: {e}")
+
+    async def run(self):
+        """Warm embeddings, the TTS model and the FAQ answers; always ends ready"""
+        self.status = "warming"
+        self.started_at = time.time()
+        try:
+            await rag_service.initialize_embeddings()
+            if self.synthesize_audio:
+                await asyncio.wrap_future(tts_service.start_preload())
+                if tts_service.model is None:
+                    self.synthesize_audio = False
+                    print("TTS model unavailable, warming text answers only")
+
+            questions = self.faq_questions()
+            self.progress["total"] = len(questions)
+            semaphore = asyncio.Semaphore(self.concurrency)
+            await asyncio.gather(*(self._warm_question(q, semaphore) for q in questions))
+            if self.synthesize_audio:
+                await asyncio.gather(*(self._warm_fact(a, semaphore) for a in fact_store.answers.values()))
+        except Exception as e:
+            print(f"Warm-up aborted: {e}")
+        finally:
+            # A degraded warm-up must not keep the pod out of rotation forever
+            self.status = "ready"
+            self.finished_at = time.time()
+            print(f"[WARMUP] done in {self.finished_at - self.started_at:.1f}s: {self.progress}")
+
+    def start(self):
+        """Run the warm-up in the background on the running event loop"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    def skip(self):
+        """Mark ready without warming (warm-up disabled)"""
+        self.status = "ready"
+
+    def get_stats(self) -> Dict:
+        elapsed = None
+        if self.started_at:
+            elapsed = round((self.finished_at or time.time()) - self.started_at, 2)
+        return {
+            "status": self.status,
+            "ready": self.ready,
+            "tts_model": tts_service.model_status,
+            **self.progress,
+            "elapsed_seconds": elapsed
+        }
+
+warmup_service = WarmupService(
+    faq_path=os.getenv("WARMUP_FAQ_PATH") or None,
+    max_questions=int(os.getenv("WARMUP_MAX_QUESTIONS", "20")),
+    concurrency=int(os.getenv("WARMUP_CONCURRENCY", "4")),
+    synthesize_audio=os.getenv("WARMUP_AUDIO", "true").lower() == "true",
+)
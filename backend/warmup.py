@@ -0,0 +1,14 @@
+"""
+Warm the answer and TTS caches from the command line, e.g. before a deploy
+with STORAGE_BACKEND=sqlite and TTS_CACHE_PATH so the results persist.
+
+Usage (from backend/):
+    python warmup.py
+"""
+import asyncio
+from dotenv import load_dotenv
+load_dotenv()
+from services.warmup_service import warmup_service
+
+if __name__ == "__main__":
+    asyncio.run(warmup_service.run())
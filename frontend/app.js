@@ -101,6 +101,9 @@ if (window.speechSynthesis) {
 }
 // Global audio object for Assistant 2
 let currentAudio = null;
+// Queue of per-sentence audio elements streamed for Assistant 2
+let audioQueue = [];
+let speechGeneration = 0; // Bumped on interruption so late chunks are dropped
 
 function stopSpeaking() {
     // Stop Browser TTS (Assistant 1)
@@ -114,17 +117,69 @@ function stopSpeaking() {
         currentAudio.currentTime = 0;
         currentAudio = null;
     }
+    audioQueue = [];
+    speechGeneration++;
 
     isAISpeaking = false;
     console.log('Speech interrupted by user');
 }
 
+function playNextChunk() {
+    if (currentAudio || audioQueue.length === 0) return;
+    const audio = audioQueue.shift();
+    currentAudio = audio;
+    isAISpeaking = true;
+    // Ended, failed to load (expired /audio URL) or refused by autoplay policy: move on
+    const advance = () => {
+        if (currentAudio !== audio) return; // already advanced, or interrupted
+        currentAudio = null;
+        if (audioQueue.length === 0) isAISpeaking = false;
+        playNextChunk();
+    };
+    audio.onended = advance;
+    audio.onerror = () => {
+        console.warn('Audio chunk failed to load, skipping');
+        advance();
+    };
+    audio.play().catch((error) => {
+        console.warn('Audio chunk could not play:', error);
+        advance();
+    });
+}
+
+function enqueueAudio(event) {
+    // Cacheable /audio URL, or inline base64 WAV when the server is configured for it
+    const audio = new Audio(event.audio_url || "data:audio/wav;base64," + event.audio);
+    audio.preload = 'auto'; // fetch now so chunks play back-to-back
+    audioQueue.push(audio);
+    playNextChunk();
+}
+
+// Read a Server-Sent Events body and call onEvent for every JSON frame
+async function readEventStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let sep;
+        while ((sep = buffer.indexOf('\n\n')) !== -1) {
+            const frame = buffer.slice(0, sep);
+            buffer = buffer.slice(sep + 2);
+            if (frame.startsWith('data: ')) onEvent(JSON.parse(frame.slice(6)));
+        }
+    }
+}
+
 async function sendMessage() {
     const text = userInput.value.trim();
     if (!text) return;
 
     // Stop any ongoing AI speech immediately
     stopSpeaking();
+    const generation = speechGeneration;
 
     addMessage(text, 'user');
     userInput.value = '';
@@ -134,14 +189,14 @@ async function sendMessage() {
     sendBtn.disabled = true;
 
     // Show loading
-    const loadingMsg = addLoadingMessage();
+    let loadingMsg = addLoadingMessage();
     statusText.textContent = "Javob yozilmoqda...";
 
     // Get selected version
     const version = document.querySelector('input[name="assistant"]:checked').value;
 
     try {
-        const response = await fetch('/chat', {
+        const response = await fetch('/chat/stream', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({
@@ -151,37 +206,50 @@ async function sendMessage() {
             })
         });
 
+        if (response.status === 429 || response.status === 503) {
+            // Rate limited or overloaded: ask the user to retry shortly
+            if (loadingMsg) loadingMsg.remove();
+            loadingMsg = null;
+            addMessage("Hozir so'rovlar juda ko'p. Iltimos, birozdan so'ng qayta urinib ko'ring.", 'ai');
+            return;
+        }
         if (!response.ok) throw new Error('Network error');
 
-        const data = await response.json();
-        loadingMsg.remove();
-
-        // Always display Latin text
-        addMessage(data.response, 'ai');
-
-        if (version == 1) {
-            // Browser TTS
-            speak(data.response);
-        } else {
-            // Backend TTS (Assistant 2)
-            if (data.audio) {
-                currentAudio = new Audio("data:audio/wav;base64," + data.audio);
-                isAISpeaking = true;
-                currentAudio.onended = () => {
-                    isAISpeaking = false;
-                    currentAudio = null;
-                };
-                currentAudio.play();
-            } else {
-                console.warn("No audio received for Assistant 2");
+        let bubble = null;
+        let audioEvents = 0;
+        await readEventStream(response, (event) => {
+            if (event.type === 'text') {
+                // Always display Latin text, growing as sentences arrive
+                if (!bubble) {
+                    loadingMsg.remove();
+                    loadingMsg = null;
+                    bubble = addMessage('', 'ai');
+                }
+                bubble.textContent += event.delta;
+                chatBox.scrollTop = chatBox.scrollHeight;
+            } else if (event.type === 'audio') {
+                // Backend TTS (Assistant 2): play chunks back-to-back
+                audioEvents++;
+                if (generation === speechGeneration) enqueueAudio(event);
+            } else if (event.type === 'done') {
+                if (!bubble) {
+                    if (loadingMsg) loadingMsg.remove();
+                    loadingMsg = null;
+                    bubble = addMessage('', 'ai');
+                }
+                bubble.textContent = event.response;
+                if (audioEvents === 0 && generation === speechGeneration) {
+                    // Browser TTS: Assistant 1, and Assistant 2 whenever no audio came
+                    // (skipped under load, or synthesis failed)
+                    speak(event.response);
+                }
+                if (event.cached) console.log('✅ Cache hit!');
             }
-        }
-
-        if (data.cached) console.log('✅ Cache hit!');
+        });
 
     } catch (error) {
         console.error('Error:', error);
-        loadingMsg.remove();
+        if (loadingMsg) loadingMsg.remove();
         addMessage("Uzr, xatolik yuz berdi. Qayta urinib ko'ring.", 'ai');
     } finally {
         statusText.textContent = "";
@@ -220,6 +288,7 @@ function addMessage(text, sender) {
     msgDiv.appendChild(bubble);
     chatBox.appendChild(msgDiv);
     chatBox.scrollTop = chatBox.scrollHeight;
+    return bubble;
 }
 function addLoadingMessage() {
     const msgDiv = document.createElement('div');
@@ -255,77 +324,3 @@ chatBox.parentNode.insertBefore(toggleContainer, chatBox);
 const oldToggle = document.getElementById('toggle-version');
 if (oldToggle) oldToggle.remove();
 
-async function sendMessage() {
-    const text = userInput.value.trim();
-    if (!text) return;
-
-    // Stop any ongoing AI speech immediately
-    stopSpeaking();
-
-    addMessage(text, 'user');
-    userInput.value = '';
-
-    // Disable input during processing
-    userInput.disabled = true;
-    sendBtn.disabled = true;
-
-    // Show loading
-    const loadingMsg = addLoadingMessage();
-    statusText.textContent = "Javob yozilmoqda...";
-
-    // Get selected version
-    const version = document.querySelector('input[name="assistant"]:checked').value;
-
-    try {
-        const response = await fetch('/chat', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({
-                message: text,
-                session_id: sessionId,
-                version: parseInt(version)
-            })
-        });
-
-        if (!response.ok) throw new Error('Network error');
-
-        const data = await response.json();
-        loadingMsg.remove();
-
-        // Always display Latin text
-        addMessage(data.response, 'ai');
-
-        if (version == 1) {
-            // Browser TTS
-            speak(data.response);
-        } else {
-            // Backend TTS (Assistant 2)
-            if (data.audio) {
-                const audio = new Audio("data:audio/wav;base64," + data.audio);
-                isAISpeaking = true;
-                audio.onended = () => { isAISpeaking = false; };
-                audio.play();
-            } else {
-                console.warn("No audio received for Assistant 2");
-            }
-        }
-
-        if (data.cached) console.log('✅ Cache hit!');
-
-    } catch (error) {
-        console.error('Error:', error);
-        loadingMsg.remove();
-        addMessage("Uzr, xatolik yuz berdi. Qayta urinib ko'ring.", 'ai');
-    } finally {
-        statusText.textContent = "";
-        userInput.disabled = false;
-        sendBtn.disabled = false;
-        userInput.focus();
-    }
-}
-
-// Event Listeners
-sendBtn.addEventListener('click', sendMessage);
-userInput.addEventListener('keypress', (e) => { if (e.key === 'Enter') sendMessage(); });
-userInput.addEventListener('input', () => { if (isAISpeaking) stopSpeaking(); });
-micBtn.addEventListener('click', () => { if (recognition) { stopSpeaking(); recognition.start(); } });